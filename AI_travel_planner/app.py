@@ -6,19 +6,35 @@ import os
 import json
 from gevent.queue import Queue
 import textwrap
-from typing import Optional
+from typing import Iterator, Optional
 
-import requests
 from dotenv import load_dotenv
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 from flask_sock import Sock
 
+from src.deepseek_client import DeepSeekClient
+from src.nlu import TripInfoExtractor
+from src.response_cache import create_cache, trip_cache_key
+from src.singleflight import SingleFlight
 from src.speech_recognition import ASRClient
 
 # ... (build_prompt 和 call_deepseek_api 函数保持不变)
 
 load_dotenv()
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
+# DeepSeek 接口地址，可指向本地模拟服务（tools/deepseek_stub.py）
+DEEPSEEK_API_BASE = (os.getenv("DEEPSEEK_API_BASE") or "https://api.deepseek.com/v1").strip().rstrip("/")
+# 每个 worker 进程到 DeepSeek 的最大连接数
+DEEPSEEK_POOL_SIZE = int(os.getenv("DEEPSEEK_POOL_SIZE") or 10)
+# 连接池满时等待空闲连接的最长秒数
+DEEPSEEK_POOL_TIMEOUT = float(os.getenv("DEEPSEEK_POOL_TIMEOUT") or 60)
+# 旅行计划缓存：memory（默认）、sqlite:///路径、redis://地址 或 off
+PLAN_CACHE = (os.getenv("PLAN_CACHE") or "memory").strip()
+PLAN_CACHE_TTL = int(os.getenv("PLAN_CACHE_TTL") or 24 * 3600)
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE") or 1000)
+PLAN_MODEL = "deepseek-chat"
+# 设置后，同一台机器上的 worker 进程之间也合并相同的计划请求（锁文件路径）
+PLAN_SINGLEFLIGHT_LOCK = (os.getenv("PLAN_SINGLEFLIGHT_LOCK") or "").strip()
 # 科大讯飞 API 密钥
 XF_APPID = (os.getenv("XF_APPID") or "").strip()
 XF_API_KEY = (os.getenv("XF_API_KEY") or "").strip()
@@ -31,46 +47,20 @@ SUPABASE_ANON_KEY = (os.getenv("SUPABASE_ANON_KEY") or "").strip()
 
 app = Flask(__name__, template_folder='templates', static_folder='static')
 sock = Sock(app)
+deepseek = DeepSeekClient(DEEPSEEK_API_KEY, DEEPSEEK_API_BASE, pool_size=DEEPSEEK_POOL_SIZE,
+                          pool_timeout=DEEPSEEK_POOL_TIMEOUT)
+plan_cache = create_cache(PLAN_CACHE, max_entries=PLAN_CACHE_SIZE, ttl=PLAN_CACHE_TTL)
+plan_flights = SingleFlight(lock_file=PLAN_SINGLEFLIGHT_LOCK or None)
+# 语音/文字输入的参数提取：常见说法本地解析，其余调用 LLM
+nlu = TripInfoExtractor(lambda prompt: call_deepseek_api(prompt, model=PLAN_MODEL))
 
 # ... (build_prompt 和 call_deepseek_api 函数保持不变)
 
 def extract_travel_info_from_text(text: str) -> dict:
     """
-    使用 LLM 从文本中提取旅行计划的关键信息。
+    从文本中提取旅行计划的关键信息（见 src/nlu.py 的 TripInfoExtractor）。
     """
-    prompt = f"""
-    从以下文本中提取旅行计划的关键信息。文本是：“{text}”。
-
-    你需要提取以下信息：
-    - city (目的地城市)
-    - days (旅行天数)
-    - budget (预算)
-    - interests (兴趣爱好)
-    - people (人数)
-    - dietary (饮食偏好)
-
-    请严格以 JSON 格式返回提取的信息。如果某个信息在文本中没有提到，请将其值设为 null。
-    JSON对象应只包含这些键。
-    例如:
-    {{
-        "city": "巴黎",
-        "days": 5,
-        "budget": "2000元",
-        "interests": "历史, 美食",
-        "people": null,
-        "dietary": null
-    }}
-    """
-    try:
-        response_text = call_deepseek_api(prompt, model="deepseek-chat")
-        # AI 的返回可能包含在 Markdown 代码块中
-        if "```json" in response_text:
-            response_text = response_text.split("```json")[1].split("```")[0]
-        extracted_info = json.loads(response_text)
-        return extracted_info
-    except Exception as e:
-        print(f"Error during NLU extraction: {e}")
-        return {}
+    return nlu.extract(text)
 
 @sock.route('/ws/audio')
 def audio_socket(ws):
@@ -116,23 +106,10 @@ def audio_socket(ws):
         print("WebSocket connection closed.")
 
 @app.route("/process-speech-text", methods=["POST"])
-def process_speech_text():
-    data = request.get_json()
-    text = data.get("text")
-    if not text:
-        return jsonify({"error": "No text provided."}), 400
-
-    extracted_info = extract_travel_info_from_text(text)
-
-    if extracted_info:
-        return jsonify({"extracted_info": extracted_info})
-    else:
-        return jsonify({"error": "Could not extract information from the text."}), 500
-
-
 @app.route("/extract-info", methods=["POST"])
 def extract_info():
-    data = request.get_json()
+    """从语音识别结果或文字输入中提取旅行参数，用于填充表单。"""
+    data = request.get_json(silent=True) or {}
     text = data.get("text")
     if not text:
         return jsonify({"error": "No text provided."}), 400
@@ -188,36 +165,80 @@ def build_prompt(
 
 def call_deepseek_api(prompt: str, model: Optional[str] = None) -> str:
     """直接调用DeepSeek API并返回文本。"""
-    if not DEEPSEEK_API_KEY:
-        raise RuntimeError("缺少 DEEPSEEK_API_KEY。请将其添加到 .env 文件中。")
+    return deepseek.complete(prompt, model=model)
 
-    url = "https://api.deepseek.com/v1/chat/completions"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {DEEPSEEK_API_KEY}"
-    }
-    data = {
-        "model": model or "deepseek-chat",
-        "messages": [
-            {"role": "user", "content": prompt}
-        ]
-    }
 
+def stream_deepseek_api(prompt: str, model: Optional[str] = None) -> Iterator[str]:
+    """以流式方式调用DeepSeek API，逐段返回生成的文本（见 DeepSeekClient.stream）。"""
+    return deepseek.stream(prompt, model=model)
+
+
+def lookup_cached_plan(cache_key: str) -> Optional[str]:
+    return plan_cache.get(cache_key) if plan_cache else None
+
+
+def generate_plan(trip: dict, cache_key: str) -> str:
+    """调用 DeepSeek 生成计划并写入缓存。"""
+    plan = call_deepseek_api(build_prompt(**trip), model=PLAN_MODEL)
+    if plan_cache:
+        plan_cache.set(cache_key, plan)
+    return plan
+
+
+def stream_plan(trip: dict, cache_key: str) -> Iterator[str]:
+    """以流式方式生成计划，完整生成后写入缓存。"""
+    chunks = stream_deepseek_api(build_prompt(**trip), model=PLAN_MODEL)
+    parts = []
     try:
-        response = requests.post(url, headers=headers, data=json.dumps(data), timeout=180)
-        response.raise_for_status()  # 如果请求失败 (状态码 4xx or 5xx), 则会抛出异常
-        completion = response.json()
-        content = completion['choices'][0]['message']['content'] if completion.get('choices') else ""
-        content = (content or "").strip()
-        if not content:
-            raise RuntimeError("DeepSeek API响应中没有消息内容。")
-        return content
-    except requests.exceptions.RequestException as e:
-        # 处理网络层面的错误，例如超时、连接错误等
-        raise RuntimeError(f"调用 DeepSeek API 时发生网络错误: {e}")
-    except (KeyError, IndexError) as e:
-        # 处理解析响应时的错误
-        raise RuntimeError(f"解析 DeepSeek API 响应时出错: {e}")
+        for content in chunks:
+            parts.append(content)
+            yield content
+    finally:
+        chunks.close()
+    if plan_cache and parts:
+        plan_cache.set(cache_key, "".join(parts).strip())
+
+
+def parse_trip_form(form) -> dict:
+    """读取表单中的旅行参数，作为 build_prompt 的关键字参数返回；没有填写城市时抛出 ValueError。"""
+    city = (form.get("city") or "").strip()
+    days_raw = (form.get("days") or "").strip()
+    budget = (form.get("budget") or "").strip()
+    interests = (form.get("interests") or "").strip()
+    people_raw = (form.get("people") or "").strip()
+    dietary = (form.get("dietary") or "").strip()
+
+    if not city:
+        raise ValueError('请输入一个城市。')
+
+    try:
+        days = max(1, int(days_raw))
+    except (ValueError, TypeError):
+        days = 3
+    try:
+        people = max(1, int(people_raw)) if people_raw else 1
+    except (ValueError, TypeError):
+        people = 1
+
+    return {"city": city, "days": days, "budget": budget, "interests": interests,
+            "people": people, "dietary": dietary}
+
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """把一条消息编码为 Server-Sent Events 格式。"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """当前 worker 进程的运行指标（DeepSeek 连接复用情况等）。"""
+    return jsonify({
+        'deepseek': deepseek.metrics(),
+        'plan_cache': plan_cache.metrics() if plan_cache else None,
+        'plan_singleflight': plan_flights.metrics(),
+        'nlu': nlu.metrics(),
+    })
 
 
 @app.route("/", methods=["GET"])
@@ -234,36 +255,73 @@ def index():
 
 @app.route("/generate", methods=["POST"])
 def generate():
-    city = (request.form.get("city") or "").strip()
-    days_raw = (request.form.get("days") or "").strip()
-    budget = (request.form.get("budget") or "").strip()
-    interests = (request.form.get("interests") or "").strip()
-    people_raw = (request.form.get("people") or "").strip()
-    dietary = (request.form.get("dietary") or "").strip()
-
-    if not city:
-        return jsonify({'error': '请输入一个城市。'}), 400
-
     try:
-        days = max(1, int(days_raw))
-    except (ValueError, TypeError):
-        days = 3
-    try:
-        people = max(1, int(people_raw)) if people_raw else 1
-    except (ValueError, TypeError):
-        people = 1
+        trip = parse_trip_form(request.form)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    prompt = build_prompt(city, days, budget, interests, people=people, dietary=dietary)
+    cache_key = trip_cache_key(PLAN_MODEL, **trip)
+    cached = lookup_cached_plan(cache_key)
+    if cached is not None:
+        return jsonify({'plan': cached, 'cached': True})
 
     try:
         if DEEPSEEK_API_KEY:
-            result_text = call_deepseek_api(prompt, model="deepseek-chat")
+            # 同时到达的相同请求只调用一次 DeepSeek，共享同一个结果
+            result_text = plan_flights.do(cache_key, lambda: generate_plan(trip, cache_key),
+                                          lookup=lambda: lookup_cached_plan(cache_key))
             return jsonify({'plan': result_text})
         else:
             return jsonify({'error': '未找到API密钥。请将 DEEPSEEK_API_KEY 添加到您的 .env 文件中。'}), 500
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+
+@app.route("/generate-stream", methods=["POST"])
+def generate_stream():
+    """与 /generate 相同，但以 Server-Sent Events 边生成边返回计划。
+
+    事件格式：`data: {"delta": "..."}` 为一段新文本；`event: done` 表示生成完毕；
+    `event: error` 带 `{"error": "..."}`。参数错误时仍像 /generate 一样返回 JSON。
+    缓存命中时整份计划作为一段 delta 立即返回；完整生成的计划写入缓存。
+    相同参数的并发请求共用一个上游流，后加入的请求先收到已生成的部分。
+    """
+    try:
+        trip = parse_trip_form(request.form)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    cache_key = trip_cache_key(PLAN_MODEL, **trip)
+    cached = lookup_cached_plan(cache_key)
+    if cached is None and not DEEPSEEK_API_KEY:
+        return jsonify({'error': '未找到API密钥。请将 DEEPSEEK_API_KEY 添加到您的 .env 文件中。'}), 500
+
+    def cached_events():
+        yield sse_event({'delta': cached})
+        yield sse_event({'cached': True}, event="done")
+
+    def events():
+        # 先发一条注释，让浏览器立刻收到响应头和首字节
+        yield ": stream opened\n\n"
+        chunks = plan_flights.stream(cache_key, lambda: stream_plan(trip, cache_key),
+                                     lookup=lambda: lookup_cached_plan(cache_key))
+        try:
+            for content in chunks:
+                yield sse_event({'delta': content})
+            yield sse_event({}, event="done")
+        except Exception as e:
+            yield sse_event({'error': str(e)}, event="error")
+        finally:
+            chunks.close()  # 浏览器断开时退订；所有请求都断开后关闭上游连接
+
+    headers = {
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # 让 nginx 等反向代理不要缓冲
+    }
+    stream = cached_events() if cached is not None else events()
+    return Response(stream, mimetype="text/event-stream", headers=headers)
+
+
 if __name__ == '__main__':
     from gevent import pywsgi
     server = pywsgi.WSGIServer(('127.0.0.1', 8080), app)
@@ -0,0 +1,174 @@
+import json
+import threading
+from typing import Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import EmptyPoolError
+from urllib3.util.retry import Retry
+
+
+def _with_pool_timeout(pool_class, pool_timeout):
+    """返回 pool_class 的子类：连接池满时最多等待 pool_timeout 秒，超时抛出 EmptyPoolError。
+
+    requests 不会把 pool_timeout 传给 urllib3，pool_block=True 时默认会无限等待。
+    """
+    class Pool(pool_class):
+        def _get_conn(self, timeout=None):
+            return super()._get_conn(pool_timeout if timeout is None else timeout)
+
+    return Pool
+
+
+class _PoolTimeoutAdapter(HTTPAdapter):
+    def __init__(self, pool_timeout: float, **kwargs):
+        self.pool_timeout = pool_timeout  # HTTPAdapter.__init__ 会调用 init_poolmanager，需先设置
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _with_pool_timeout(HTTPConnectionPool, self.pool_timeout),
+            "https": _with_pool_timeout(HTTPSConnectionPool, self.pool_timeout),
+        }
+
+
+class DeepSeekClient:
+    """带连接池的 DeepSeek chat-completions 客户端，每个 worker 进程共用一个实例。
+
+    所有请求共用一个 requests.Session：连接在请求之间保持（HTTP keep-alive），
+    不必每次都重新进行 TCP 和 TLS 握手。连接池大小为 pool_size，且 pool_block=True，
+    池满时新的请求会等待空闲连接，而不是再打开新连接，因此并发再高也不会耗尽临时端口。
+    在 gevent monkey patch 之后，这种等待只会让出当前 greenlet；等待超过 pool_timeout 秒时报错，
+    不会一直挂起。
+    """
+
+    def __init__(self, api_key: Optional[str], api_base: str, pool_size: int = 10, timeout=(10, 180),
+                 pool_timeout: float = 60):
+        self.api_key = api_key
+        self.url = f"{api_base.rstrip('/')}/chat/completions"
+        self.pool_size = pool_size
+        self.timeout = timeout  # (连接超时, 两次读取之间的超时)
+        self.pool_timeout = pool_timeout  # 等待空闲连接的最长时间
+
+        # 只重试建立连接失败的请求：此时请求还没有发出，重试 POST 是安全的
+        retries = Retry(total=2, connect=2, read=0, status=0, redirect=0, backoff_factor=0.2)
+        self._adapter = _PoolTimeoutAdapter(pool_timeout, pool_connections=1, pool_maxsize=pool_size,
+                                            pool_block=True, max_retries=retries)
+        self.session = requests.Session()
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._errors = 0
+
+    def _headers(self, stream: bool) -> dict:
+        if not self.api_key:
+            raise RuntimeError("缺少 DEEPSEEK_API_KEY。请将其添加到 .env 文件中。")
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        if stream:
+            headers["Accept"] = "text/event-stream"
+        return headers
+
+    def _post(self, prompt: str, model: Optional[str], stream: bool) -> requests.Response:
+        headers = self._headers(stream)
+        data = {
+            "model": model or "deepseek-chat",
+            "messages": [
+                {"role": "user", "content": prompt}
+            ]
+        }
+        if stream:
+            data["stream"] = True
+
+        with self._lock:
+            self._requests += 1
+        response = None
+        try:
+            response = self.session.post(self.url, headers=headers, data=json.dumps(data), stream=stream,
+                                         timeout=self.timeout)
+            response.raise_for_status()  # 如果请求失败 (状态码 4xx or 5xx), 则会抛出异常
+            return response
+        except (requests.exceptions.RequestException, EmptyPoolError) as e:
+            with self._lock:
+                self._errors += 1
+            if response is not None:
+                # 流式请求的错误响应体没有读取，必须关闭，否则这条连接永远不会归还连接池
+                response.close()
+            if isinstance(e, EmptyPoolError):
+                raise RuntimeError(f"等待 DeepSeek 空闲连接超过 {self.pool_timeout} 秒，请稍后重试。")
+            # 处理网络层面的错误，例如超时、连接错误等
+            raise RuntimeError(f"调用 DeepSeek API 时发生网络错误: {e}")
+
+    def complete(self, prompt: str, model: Optional[str] = None) -> str:
+        """调用 DeepSeek API 并返回完整的回复文本。"""
+        response = self._post(prompt, model, stream=False)
+        try:
+            completion = response.json()  # 读完响应体后连接自动归还连接池
+            content = completion['choices'][0]['message']['content'] if completion.get('choices') else ""
+        except (ValueError, KeyError, IndexError) as e:
+            # 处理解析响应时的错误
+            raise RuntimeError(f"解析 DeepSeek API 响应时出错: {e}")
+        content = (content or "").strip()
+        if not content:
+            raise RuntimeError("DeepSeek API响应中没有消息内容。")
+        return content
+
+    def stream(self, prompt: str, model: Optional[str] = None) -> Iterator[str]:
+        """以流式方式（stream: true）调用 DeepSeek API，逐段返回生成的文本。
+
+        接口返回 Server-Sent Events，每行 `data: {...}` 带一段增量内容，以 `data: [DONE]` 结束；
+        没有收到 `[DONE]` 就结束时抛出 RuntimeError。
+        正常结束时会把响应读到末尾，连接随之归还连接池；生成器被提前关闭（例如浏览器断开）时
+        直接关闭这条连接，DeepSeek 随之停止生成。
+        """
+        response = self._post(prompt, model, stream=True)
+        response.encoding = "utf-8"
+        finished = False
+        try:
+            # chunk_size=None：收到一个分块就处理一个分块，不等缓冲区填满
+            for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                if finished or not line.startswith("data:"):
+                    continue  # 空行、": keep-alive" 注释，以及 [DONE] 之后的内容
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    finished = True
+                    continue
+                choices = json.loads(payload).get("choices") or []
+                content = (choices[0].get("delta") or {}).get("content") if choices else None
+                if content:
+                    yield content
+            if not finished:
+                # 连接被断开或响应被截断：已生成的部分不完整，不能当作成功结果缓存或返回
+                raise RuntimeError("DeepSeek API 的流式响应在 [DONE] 之前中断。")
+        except requests.exceptions.RequestException as e:
+            raise RuntimeError(f"调用 DeepSeek API 时发生网络错误: {e}")
+        except (ValueError, KeyError, IndexError, AttributeError) as e:
+            raise RuntimeError(f"解析 DeepSeek API 响应时出错: {e}")
+        finally:
+            response.close()  # 已读完则归还连接，否则关闭连接
+
+    def metrics(self) -> dict:
+        """连接复用情况：请求数、新建连接数、复用次数和复用率。"""
+        opened = served = 0
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                opened += pool.num_connections   # urllib3 为该主机新建的连接数
+                served += pool.num_requests      # 经过该连接池发出的请求数（含重试）
+        with self._lock:
+            requests_sent, errors = self._requests, self._errors
+        return {
+            "requests": requests_sent,
+            "errors": errors,
+            "connections_opened": opened,
+            "connections_reused": max(served - opened, 0),
+            "reuse_ratio": round(max(served - opened, 0) / served, 3) if served else 0.0,
+            "pool_size": self.pool_size,
+        }
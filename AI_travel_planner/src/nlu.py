@@ -0,0 +1,312 @@
+import json
+import re
+import textwrap
+import threading
+import time
+import unicodedata
+from typing import Callable, Optional
+
+from src.response_cache import MemoryCache
+
+FIELDS = ("city", "days", "budget", "interests", "people", "dietary")
+
+_NUMBER = r"\d+(?:\.\d+)?|[零〇一二两三四五六七八九十百千万]+"
+_DIGITS = {"零": 0, "〇": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4,
+           "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+_UNITS = {"十": 10, "百": 100, "千": 1000}
+
+CITIES = (
+    "北京", "上海", "天津", "重庆", "广州", "深圳", "杭州", "南京", "苏州", "无锡", "扬州", "成都",
+    "西安", "武汉", "长沙", "郑州", "洛阳", "开封", "济南", "青岛", "烟台", "威海", "大连", "沈阳",
+    "哈尔滨", "长春", "呼和浩特", "太原", "平遥", "大同", "石家庄", "承德", "秦皇岛", "合肥", "黄山",
+    "南昌", "景德镇", "福州", "厦门", "泉州", "宁波", "绍兴", "舟山", "嘉兴", "乌镇", "南宁", "桂林",
+    "阳朔", "北海", "海口", "三亚", "贵阳", "遵义", "昆明", "大理", "丽江", "西双版纳", "香格里拉",
+    "拉萨", "林芝", "兰州", "敦煌", "嘉峪关", "西宁", "银川", "乌鲁木齐", "喀什", "伊犁", "张家界",
+    "凤凰", "珠海", "佛山", "汕头", "潮州", "香港", "澳门", "台北", "高雄", "东京", "大阪", "京都",
+    "奈良", "北海道", "札幌", "冲绳", "首尔", "釜山", "济州岛", "曼谷", "清迈", "普吉岛", "新加坡",
+    "吉隆坡", "巴厘岛", "河内", "胡志明市", "岘港", "马尼拉", "迪拜", "伦敦", "巴黎", "罗马",
+    "米兰", "威尼斯", "佛罗伦萨", "巴塞罗那", "马德里", "柏林", "慕尼黑", "阿姆斯特丹", "布拉格",
+    "维也纳", "苏黎世", "伊斯坦布尔", "纽约", "洛杉矶", "旧金山", "拉斯维加斯", "西雅图", "温哥华",
+    "多伦多", "悉尼", "墨尔本", "奥克兰",
+)
+
+# 标准写法 -> 口语中的说法
+INTERESTS = {
+    "美食": ("美食", "小吃", "吃货", "好吃的"),
+    "历史": ("历史", "古迹", "古建筑", "古镇"),
+    "文化": ("文化", "人文"),
+    "博物馆": ("博物馆",),
+    "自然风光": ("自然", "风景", "山水", "看山", "看海"),
+    "徒步": ("徒步", "爬山", "登山"),
+    "购物": ("购物", "逛街", "买买买"),
+    "夜景": ("夜景",),
+    "海滩": ("海滩", "沙滩", "海边"),
+    "摄影": ("摄影", "拍照"),
+    "亲子": ("亲子", "带孩子", "带小孩"),
+    "主题乐园": ("主题乐园", "游乐园", "迪士尼", "环球影城"),
+    "温泉": ("温泉",),
+    "艺术": ("艺术", "展览", "美术馆"),
+    "夜生活": ("夜生活", "酒吧"),
+}
+DIETARY = {
+    "不吃辣": ("不吃辣", "不能吃辣", "怕辣"),
+    "吃辣": ("爱吃辣", "能吃辣", "喜欢吃辣", "无辣不欢"),
+    "素食": ("素食", "吃素"),
+    "清真": ("清真",),
+    "清淡": ("清淡",),
+    "甜": ("爱吃甜", "喜欢甜", "喜欢吃甜"),
+}
+
+# 出现这些词却没有识别出对应字段时，说明本地规则理解不了，交给 LLM
+_PREFERENCE_CUES = re.compile(r"喜欢|爱好|偏好|感兴趣|兴趣|想看|想吃|想玩|不吃|不能吃|忌口|过敏")
+_BUDGET_CUES = re.compile(r"预算|花费|经费|块钱|元")
+# 外币或人均的预算不能直接当作总的人民币金额，交给 LLM
+_FOREIGN_CURRENCY = re.compile(r"日元|日币|美元|美金|欧元|韩元|韩币|港币|港元|澳门元|澳元|台币|泰铢|英镑|卢布"
+                               r"|新加坡元|新币|加元|加币|瑞郎|林吉特|越南盾|[$€£₩]|usd|eur|jpy|gbp|hkd|krw",
+                               re.IGNORECASE)
+_PER_PERSON = re.compile(r"每人|人均|每个人|每位")
+
+
+def _alternation(words) -> re.Pattern:
+    # 长词在前，保证“不吃辣”优先于“吃辣”、“西双版纳”不会被拆开
+    return re.compile("|".join(re.escape(word) for word in sorted(words, key=len, reverse=True)))
+
+
+_CITY_PATTERN = _alternation(CITIES)
+_INTEREST_WORDS = {word: name for name, words in INTERESTS.items() for word in words}
+_INTEREST_PATTERN = _alternation(_INTEREST_WORDS)
+_DIETARY_WORDS = {word: name for name, words in DIETARY.items() for word in words}
+_DIETARY_PATTERN = _alternation(_DIETARY_WORDS)
+
+_DAYS = re.compile(rf"({_NUMBER})\s*(?:个)?(天|日|晚|夜|星期|礼拜|周)")
+_PEOPLE = re.compile(rf"({_NUMBER})\s*(?:个)?(?:人|位|口人)(?![民均])")
+_FAMILY = re.compile(rf"一家({_NUMBER})口")
+# 单位后紧跟的一位数是下一级单位：“1万5”= 15000，“3k5”= 3500
+_UNIT_TAIL = r"(万|千|k|w)?(?:([\d一二两三四五六七八九])(?![\d.天日晚夜周个人位]))?"
+_BUDGET = re.compile(rf"(?:预算|花费|经费)[^\d零〇一二两三四五六七八九十]{{0,4}}({_NUMBER})\s*{_UNIT_TAIL}"
+                     rf"|({_NUMBER})\s*{_UNIT_TAIL}\s*(?:元|块|人民币|rmb)", re.IGNORECASE)
+# 范围（“3千到5千”“1500-2000元”）和约数（“两千多”“5000左右”）交给 LLM
+_RANGE = r"(?:到|至|-|~|—)"
+_BUDGET_AFTER = re.compile(rf"\s*(?:元|块钱?|人民币|rmb)?\s*(?:{_RANGE}|多|左右|上下|来)", re.IGNORECASE)
+_BUDGET_BEFORE = re.compile(rf"(?:{_NUMBER})\s*(?:万|千|k|w)?\s*{_RANGE}\s*$", re.IGNORECASE)
+
+
+def parse_number(text: str) -> Optional[float]:
+    """把“3”“2.5”“十五”“两万”“三千五百”“一万五”这类数字转成数值，无法识别时返回 None。
+
+    “三四千”这种连着两个数字的约数也返回 None。
+    """
+    if re.fullmatch(r"\d+(?:\.\d+)?", text):
+        return float(text)
+    total = section = digit = 0
+    unit = 0  # 上一个单位；“零”之后的数字是个位
+    for ch in text:
+        if ch in _DIGITS:
+            if digit:
+                return None
+            digit = _DIGITS[ch]
+            if not digit:
+                unit = 0
+        elif ch == "万":
+            total += (section + digit) * 10000
+            section = digit = 0
+            unit = 10000
+        elif ch in _UNITS:
+            section += (digit or 1) * _UNITS[ch]  # “十五”中的“十”前面省略了“一”
+            digit = 0
+            unit = _UNITS[ch]
+        else:
+            return None
+    if unit >= 100:
+        digit *= unit // 10  # 末尾省略了单位：“一万五”是 15000，“三千五”是 3500
+    return total + section + digit
+
+
+def normalize_utterance(text: str) -> str:
+    """缓存键：统一全角/半角和大小写，去掉空白和句末标点。"""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    return re.sub(r"\s+", "", text).rstrip("。.!！?？~～")
+
+
+class LatencyHistogram:
+    """按固定区间（毫秒）统计耗时分布。"""
+
+    BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.BUCKETS) + 1)  # 最后一格为超过 10 秒
+        self._total = 0.0
+        self._max = 0.0
+
+    def observe(self, ms: float):
+        index = next((i for i, bound in enumerate(self.BUCKETS) if ms <= bound), len(self.BUCKETS))
+        with self._lock:
+            self._counts[index] += 1
+            self._total += ms
+            self._max = max(self._max, ms)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            counts, total, longest = list(self._counts), self._total, self._max
+        count = sum(counts)
+        labels = [f"le_{bound}ms" for bound in self.BUCKETS] + ["gt_10000ms"]
+        return {
+            "count": count,
+            "avg_ms": round(total / count, 2) if count else 0.0,
+            "max_ms": round(longest, 2),
+            "buckets": dict(zip(labels, counts)),
+        }
+
+
+class TripInfoExtractor:
+    """从一句话（语音识别结果或文字输入）中提取旅行参数。
+
+    先用本地规则（城市词典、天数/人数/预算的正则、兴趣和饮食关键词）解析，能确定目的地和天数、
+    且没有规则理解不了的偏好或预算描述时直接返回，不调用 LLM；否则再调用 LLM，用本地结果补上
+    LLM 没有给出的字段。结果按规范化后的文本缓存。每条路径（cache、local、llm）各有一个耗时直方图。
+    """
+
+    def __init__(self, llm: Callable[[str], str], cache_size: int = 1000, cache_ttl: float = 86400):
+        self._llm = llm
+        self._cache = MemoryCache(cache_size, cache_ttl)
+        self._latency = {path: LatencyHistogram() for path in ("cache", "local", "llm")}
+
+    def extract(self, text: str) -> dict:
+        """返回包含 FIELDS 各键的字典（未提到的为 None）；什么也没识别出时返回空字典。"""
+        started = time.perf_counter()
+        key = normalize_utterance(text)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._observe("cache", started)
+            return json.loads(cached)
+
+        info, confident = self.parse_locally(text)
+        path, cacheable = "local", True
+        if not confident:
+            path = "llm"
+            llm_info = self._extract_with_llm(text)
+            cacheable = bool(llm_info)  # LLM 失败时返回本地的部分结果，但不缓存，下次再试
+            for field in FIELDS:
+                if llm_info.get(field) is not None:
+                    info[field] = llm_info[field]
+
+        result = info if any(value is not None for value in info.values()) else {}
+        if result and cacheable:
+            self._cache.set(key, json.dumps(result, ensure_ascii=False))
+        self._observe(path, started)
+        return result
+
+    def _observe(self, path: str, started: float):
+        self._latency[path].observe((time.perf_counter() - started) * 1000)
+
+    @staticmethod
+    def parse_locally(text: str):
+        """本地规则解析，返回 (字段字典, 是否足够确定)。"""
+        text = unicodedata.normalize("NFKC", text or "")
+        info = dict.fromkeys(FIELDS)
+
+        cities = list(dict.fromkeys(match.group() for match in _CITY_PATTERN.finditer(text)))
+        if len(cities) == 1:
+            info["city"] = cities[0]
+
+        days = []
+        for match in _DAYS.finditer(text):
+            if match.group(2) == "日" and text[max(match.start() - 1, 0)] == "月":
+                continue  # “5月3日”是日期，不是天数
+            if text[max(match.start() - 1, 0)] == "第" or re.match(r"[以之]?后", text[match.end():]):
+                continue  # “第一天”“两周后”不是旅行天数
+            value = parse_number(match.group(1))
+            if value is None:
+                continue
+            if match.group(2) in ("星期", "礼拜", "周"):
+                value *= 7
+            elif match.group(2) in ("晚", "夜"):
+                value += 1  # “三天两晚”中天数已在前面匹配；只说“两晚”时按三天算
+            if 1 <= value <= 60 and value == int(value) and int(value) not in days:
+                days.append(int(value))
+        if days:
+            info["days"] = days[0]
+        elif "周末" in text:
+            info["days"] = 2
+
+        family = _FAMILY.search(text)
+        people = family or _PEOPLE.search(text)
+        if people:
+            value = parse_number(people.group(1))
+            if value and value == int(value) and value <= 50:
+                info["people"] = int(value)
+        elif re.search(r"我们俩|我俩|两口子|情侣|夫妻", text):
+            info["people"] = 2
+
+        budget = _BUDGET.search(text)
+        budget_unclear = bool(_FOREIGN_CURRENCY.search(text) or _PER_PERSON.search(text)) or bool(
+            budget and (_BUDGET_AFTER.match(text, budget.end()) or _BUDGET_BEFORE.search(text[:budget.start()])))
+        if budget and not budget_unclear:
+            number, unit, tail = budget.group(1, 2, 3) if budget.group(1) else budget.group(4, 5, 6)
+            amount = parse_number(number)
+            scale = {"万": 10000, "w": 10000, "千": 1000, "k": 1000}.get((unit or "").lower(), 1)
+            if amount is not None:
+                amount *= scale
+                if tail and scale > 1:
+                    amount += parse_number(tail) * scale // 10
+                info["budget"] = f"{int(amount) if amount == int(amount) else amount}元"
+
+        interests = list(dict.fromkeys(_INTEREST_WORDS[m.group()] for m in _INTEREST_PATTERN.finditer(text)))
+        if interests:
+            info["interests"] = ", ".join(interests)
+        dietary = list(dict.fromkeys(_DIETARY_WORDS[m.group()] for m in _DIETARY_PATTERN.finditer(text)))
+        if dietary:
+            info["dietary"] = ", ".join(dietary)
+
+        confident = (
+            info["city"] is not None
+            and info["days"] is not None
+            and len(days) <= 1  # 说了两个不同的天数
+            and (info["budget"] is not None or not _BUDGET_CUES.search(text))
+            and not budget_unclear
+            and (info["interests"] is not None or info["dietary"] is not None
+                 or not _PREFERENCE_CUES.search(text))
+        )
+        return info, confident
+
+    def _extract_with_llm(self, text: str) -> dict:
+        prompt = f"""
+        从以下文本中提取旅行计划的关键信息。文本是：“{text}”。
+
+        你需要提取以下信息：
+        - city (目的地城市)
+        - days (旅行天数)
+        - budget (预算)
+        - interests (兴趣爱好)
+        - people (人数)
+        - dietary (饮食偏好)
+
+        请严格以 JSON 格式返回提取的信息。如果某个信息在文本中没有提到，请将其值设为 null。
+        JSON对象应只包含这些键。
+        例如:
+        {{
+            "city": "巴黎",
+            "days": 5,
+            "budget": "2000元",
+            "interests": "历史, 美食",
+            "people": null,
+            "dietary": null
+        }}
+        """
+        try:
+            response_text = self._llm(textwrap.dedent(prompt).strip())
+            # AI 的返回可能包含在 Markdown 代码块中
+            if "```json" in response_text:
+                response_text = response_text.split("```json")[1].split("```")[0]
+            extracted = json.loads(response_text)
+            return extracted if isinstance(extracted, dict) else {}
+        except Exception as e:
+            print(f"Error during NLU extraction: {e}")
+            return {}
+
+    def metrics(self) -> dict:
+        return {
+            "cache": self._cache.metrics(),
+            "latency": {path: histogram.metrics() for path, histogram in self._latency.items()},
+        }
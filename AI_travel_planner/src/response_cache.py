@@ -0,0 +1,286 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Optional
+
+try:
+    from gevent.monkey import get_original, is_module_patched
+except ImportError:  # 不在 gevent 下运行时使用标准库
+    get_original = is_module_patched = None
+
+# 修改 prompt 模板后递增，使旧的缓存条目全部失效
+CACHE_VERSION = 1
+
+_SEPARATORS = re.compile(r"[\s,，、;；/]+")
+
+
+def _normalize_text(value) -> str:
+    """统一全角/半角、大小写和空白，例如“ Paris ”与“paris”视为相同。"""
+    text = unicodedata.normalize("NFKC", str(value or "")).casefold()
+    return " ".join(text.split())
+
+
+def trip_cache_key(model: str, city: str, days: int, budget: str, interests: str,
+                   people: Optional[int] = None, dietary: Optional[str] = None) -> str:
+    """根据规范化后的旅行参数和模型生成缓存键。
+
+    兴趣爱好按分隔符拆开、去重并排序，所以“美食，历史”和“历史, 美食”命中同一条缓存。
+    """
+    interest_set = sorted({item for item in _SEPARATORS.split(_normalize_text(interests)) if item})
+    params = {
+        "version": CACHE_VERSION,
+        "model": model,
+        "city": _normalize_text(city),
+        "days": days,
+        "budget": _normalize_text(budget),
+        "interests": interest_set,
+        "people": people or 1,
+        "dietary": _normalize_text(dietary),
+    }
+    encoded = json.dumps(params, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class ResponseCache:
+    """缓存后端的公共部分：命中/未命中计数。子类实现 _get、_set 和 _size。"""
+
+    backend = ""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "sets": 0, "evictions": 0, "errors": 0}
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def get(self, key: str) -> Optional[str]:
+        """返回未过期的缓存内容，没有时返回 None。后端出错时按未命中处理。"""
+        try:
+            value = self._get(key)
+        except Exception as e:
+            print(f"Plan cache read failed: {e}")
+            self._count("errors")
+            value = None
+        self._count("hits" if value is not None else "misses")
+        return value
+
+    def set(self, key: str, value: str):
+        try:
+            self._count("evictions", self._set(key, value))
+            self._count("sets")
+        except Exception as e:
+            print(f"Plan cache write failed: {e}")
+            self._count("errors")
+
+    def metrics(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters["hits"] + counters["misses"]
+        try:
+            size = self._size()
+        except Exception:
+            size = None
+        return {
+            "backend": self.backend,
+            **counters,
+            "hit_ratio": round(counters["hits"] / lookups, 3) if lookups else 0.0,
+            "entries": size,
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+        }
+
+    def _get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def _set(self, key: str, value: str) -> int:
+        """写入并返回因容量上限被淘汰的条目数。"""
+        raise NotImplementedError
+
+    def _size(self) -> int:
+        raise NotImplementedError
+
+
+class MemoryCache(ResponseCache):
+    """进程内 LRU 缓存，每个 gunicorn worker 各有一份。"""
+
+    backend = "memory"
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 86400):
+        super().__init__(max_entries, ttl)
+        self._entries = OrderedDict()  # key -> (过期时间, 内容)，最近使用的在末尾
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def _set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def _size(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteCache(ResponseCache):
+    """存放在本地 SQLite 文件中的 LRU 缓存，同一台机器上的所有 worker 共用。
+
+    每个进程只用一个连接（fork 出的 worker 各自重新连接），由锁保证同一时间只有一个查询。
+    在 gevent 下查询放到 hub 的线程池里执行，等待磁盘或其他进程的写锁时不会阻塞事件循环。
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, path: str, max_entries: int = 1000, ttl: float = 86400):
+        super().__init__(max_entries, ttl)
+        self.path = path
+        # 查询在线程池的原生线程里执行，所以要用未被 monkey patch 的锁
+        self._db_lock = get_original("threading", "Lock")() if get_original else threading.Lock()
+        self._db = None
+        self._pid = None
+        self._execute(self._create_table)
+
+    @staticmethod
+    def _create_table(db: sqlite3.Connection):
+        with db:
+            db.execute("CREATE TABLE IF NOT EXISTS plan_cache ("
+                       "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, used REAL NOT NULL)")
+            db.execute("CREATE INDEX IF NOT EXISTS plan_cache_used ON plan_cache (used)")
+
+    def _execute(self, query: Callable[[sqlite3.Connection], object]):
+        """在本进程的连接上执行 query(db)。"""
+        if is_module_patched and is_module_patched("threading"):
+            import gevent
+
+            return gevent.get_hub().threadpool.apply(self._run, (query,))
+        return self._run(query)
+
+    def _run(self, query):
+        with self._db_lock:
+            if self._db is None or self._pid != os.getpid():
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                # 连接会在线程池的不同线程中使用，由 _db_lock 保证同一时间只有一个线程访问
+                db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+                db.execute("PRAGMA journal_mode=WAL")  # 读写互不阻塞
+                db.execute("PRAGMA synchronous=NORMAL")
+                self._db, self._pid = db, os.getpid()
+            return query(self._db)
+
+    def _get(self, key):
+        now = time.time()
+
+        def query(db):
+            with db:
+                row = db.execute("SELECT value FROM plan_cache WHERE key = ? AND expires > ?",
+                                 (key, now)).fetchone()
+                if row is not None:
+                    db.execute("UPDATE plan_cache SET used = ? WHERE key = ?", (now, key))
+            return row[0] if row else None
+
+        return self._execute(query)
+
+    def _set(self, key, value):
+        now = time.time()
+
+        def query(db):
+            with db:
+                db.execute("INSERT OR REPLACE INTO plan_cache (key, value, expires, used) VALUES (?, ?, ?, ?)",
+                           (key, value, now + self.ttl, now))
+                db.execute("DELETE FROM plan_cache WHERE expires <= ?", (now,))
+                return db.execute(
+                    "DELETE FROM plan_cache WHERE key IN "
+                    "(SELECT key FROM plan_cache ORDER BY used DESC LIMIT -1 OFFSET ?)", (self.max_entries,)
+                ).rowcount
+
+        return self._execute(query)
+
+    def _size(self):
+        return self._execute(lambda db: db.execute("SELECT COUNT(*) FROM plan_cache WHERE expires > ?",
+                                                   (time.time(),)).fetchone()[0])
+
+
+class RedisCache(ResponseCache):
+    """Redis（或兼容 Redis 协议的服务）中的缓存，可在多台机器之间共用。需要安装 redis 包。
+
+    条目用 SETEX 设置过期时间；另用一个有序集合记录最近使用时间，超出容量时淘汰最久未用的条目。
+    """
+
+    backend = "redis"
+
+    def __init__(self, url: str, max_entries: int = 1000, ttl: float = 86400, prefix: str = "plan_cache:"):
+        super().__init__(max_entries, ttl)
+        try:
+            import redis  # 可选依赖，只有使用 Redis 后端时才需要
+        except ImportError as e:
+            raise ImportError("使用 Redis 缓存需要先安装 redis 包（pip install redis）。") from e
+
+        self._redis = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+        self._prefix = prefix
+        self._index = prefix + "lru"
+
+    def _get(self, key):
+        value = self._redis.get(self._prefix + key)
+        if value is None:
+            return None
+        self._redis.zadd(self._index, {key: time.time()})
+        return value.decode("utf-8")
+
+    def _set(self, key, value):
+        pipe = self._redis.pipeline()
+        pipe.setex(self._prefix + key, int(self.ttl), value.encode("utf-8"))
+        pipe.zadd(self._index, {key: time.time()})
+        # 过期的键也从索引里清掉
+        pipe.zremrangebyscore(self._index, "-inf", time.time() - self.ttl)
+        pipe.zcard(self._index)
+        size = pipe.execute()[-1]
+        if size <= self.max_entries:
+            return 0
+        oldest = [member for member, _ in self._redis.zpopmin(self._index, size - self.max_entries)]
+        if oldest:
+            self._redis.delete(*[self._prefix + member.decode("utf-8") for member in oldest])
+        return len(oldest)
+
+    def _size(self):
+        return self._redis.zcard(self._index)
+
+
+def create_cache(spec: str, max_entries: int = 1000, ttl: float = 86400) -> Optional[ResponseCache]:
+    """根据配置创建缓存后端：
+
+    - "memory"（默认）：进程内缓存；
+    - "sqlite:///路径/plans.db"：本地 SQLite 文件，多个 worker 共用；
+    - "redis://主机:端口/库"：Redis 或兼容服务；
+    - "off"：不缓存，返回 None。
+    """
+    spec = (spec or "memory").strip()
+    if spec == "off":
+        return None
+    if spec == "memory":
+        return MemoryCache(max_entries, ttl)
+    if spec.startswith("sqlite:///"):
+        return SQLiteCache(spec[len("sqlite:///"):], max_entries, ttl)
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCache(spec, max_entries, ttl)
+    raise ValueError(f"不支持的缓存配置: {spec}")
@@ -0,0 +1,227 @@
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+import gevent
+from gevent.event import AsyncResult
+from gevent.queue import Queue
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+class _StreamFlight:
+    """一次进行中的流式调用：已收到的文本段加上所有订阅者的队列。"""
+
+    def __init__(self):
+        self.chunks = []
+        self.subscribers = set()
+        self.finished = False
+        self.final = None  # 结束时放入各队列的 _DONE 或 _Failure
+
+    def subscribe(self) -> Queue:
+        queue = Queue()
+        for chunk in self.chunks:  # 后加入的订阅者先补上已生成的部分
+            queue.put(chunk)
+        if self.finished:
+            queue.put(self.final)
+        self.subscribers.add(queue)
+        return queue
+
+    def publish(self, item):
+        if item is _DONE or isinstance(item, _Failure):
+            self.finished, self.final = True, item
+        else:
+            self.chunks.append(item)
+        for queue in list(self.subscribers):
+            queue.put(item)
+
+
+class _LockFile:
+    """跨 worker 进程的按键互斥：在同一个锁文件上，每个键对应一个字节的 POSIX 记录锁。
+
+    只用一个文件，不会为每个键留下锁文件；进程退出时锁由系统自动释放。
+    记录锁属于进程，同一进程内的互斥由 SingleFlight 自己保证。
+    """
+
+    _SLOTS = 1 << 20
+
+    def __init__(self, path: str, timeout: float):
+        import fcntl  # 只在 Linux/macOS 上可用
+
+        self._fcntl = fcntl
+        self.path = path
+        self.timeout = timeout
+        self._fd = None
+        self._pid = None
+
+    def _file(self) -> int:
+        # fork 出的 worker 各自打开；关闭这个文件的任何描述符都会释放本进程的全部锁，所以一直保持打开
+        if self._fd is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        return self._fd
+
+    @contextmanager
+    def hold(self, key: str):
+        """获得 key 的锁后进入；返回值表示是否等待过其他进程。超时后不再等待，直接进入。"""
+        fd = self._file()
+        offset = int(hashlib.sha1(key.encode("utf-8")).hexdigest()[:8], 16) % self._SLOTS
+        deadline = time.monotonic() + self.timeout
+        waited = locked = False
+        while True:
+            try:
+                self._fcntl.lockf(fd, self._fcntl.LOCK_EX | self._fcntl.LOCK_NB, 1, offset)
+                locked = True
+                break
+            except OSError:
+                waited = True
+                if time.monotonic() >= deadline:
+                    break
+                gevent.sleep(0.05)  # 轮询而不是阻塞，等待期间其他 greenlet 照常运行
+        try:
+            yield waited
+        finally:
+            if locked:
+                self._fcntl.lockf(fd, self._fcntl.LOCK_UN, 1, offset)
+
+
+class SingleFlight:
+    """合并相同键的并发调用（single-flight）。
+
+    同一 worker 内，相同键的并发请求只有第一个（leader）真正调用上游，其余请求等待并拿到同一个
+    结果；流式调用由一个独立的 greenlet 读取上游，并把每段文本广播给所有订阅者，后加入的订阅者
+    先收到已生成的部分。leader 的客户端断开不影响其他订阅者；所有订阅者都离开后才关闭上游。
+
+    设置 lock_file 后，多个 worker 进程之间也只有一个调用上游：其他进程的 leader 等待锁释放后先
+    调用 lookup()（例如查询共享的 SQLite/Redis 计划缓存），查不到时才自己调用上游。
+    """
+
+    def __init__(self, lock_file: Optional[str] = None, lock_timeout: float = 200):
+        self._calls = {}
+        self._streams = {}
+        self._lock_file = _LockFile(lock_file, lock_timeout) if lock_file else None
+        self._stats_lock = threading.Lock()
+        self._counters = {"leaders": 0, "followers": 0, "cross_worker_waits": 0, "cross_worker_hits": 0}
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._counters[name] += 1
+
+    @contextmanager
+    def _cross_worker(self, key: str, lookup: Optional[Callable[[], Optional[str]]]):
+        """在跨进程锁内执行；若等待过其他进程且 lookup() 已有结果，返回该结果。"""
+        if self._lock_file is None:
+            yield None
+            return
+        with self._lock_file.hold(key) as waited:
+            found = None
+            if waited:
+                self._count("cross_worker_waits")
+                found = lookup() if lookup else None
+                if found is not None:
+                    self._count("cross_worker_hits")
+            yield found
+
+    def do(self, key: str, fn: Callable[[], str], lookup: Optional[Callable[[], Optional[str]]] = None) -> str:
+        """调用 fn() 并返回结果；相同 key 的并发调用共享一次 fn() 的结果或异常。
+
+        若相同 key 的流式调用正在进行，直接等它生成完毕并返回完整文本。
+        """
+        call = self._calls.get(key)
+        if call is not None:
+            self._count("followers")
+            return call.get()  # 结果或 leader 抛出的异常
+        flight = self._streams.get(key)
+        if flight is not None:
+            self._count("followers")
+            return "".join(self._receive(flight, flight.subscribe())).strip()
+
+        call = AsyncResult()
+        self._calls[key] = call
+        self._count("leaders")
+        try:
+            with self._cross_worker(key, lookup) as found:
+                value = found if found is not None else fn()
+            call.set(value)
+            return value
+        except Exception as e:
+            call.set_exception(e)
+            raise
+        finally:
+            del self._calls[key]
+
+    def stream(self, key: str, start: Callable[[], Iterator[str]],
+               lookup: Optional[Callable[[], Optional[str]]] = None) -> Iterator[str]:
+        """返回 start() 产生的文本段；相同 key 的并发流共享同一个上游流。
+
+        若相同 key 的非流式调用正在进行，等它完成后把结果作为一段返回。
+        """
+        call = self._calls.get(key)
+        if call is not None:
+            self._count("followers")
+            return self._await(call)
+        flight = self._streams.get(key)
+        if flight is None:
+            flight = _StreamFlight()
+            self._streams[key] = flight
+            self._count("leaders")
+            queue = flight.subscribe()
+            gevent.spawn(self._pump, key, flight, start, lookup)
+        else:
+            self._count("followers")
+            queue = flight.subscribe()
+        return self._receive(flight, queue)
+
+    def _pump(self, key: str, flight: _StreamFlight, start, lookup):
+        try:
+            with self._cross_worker(key, lookup) as found:
+                if found is not None:
+                    flight.publish(found)
+                    flight.publish(_DONE)
+                    return
+                chunks = start()
+                try:
+                    for chunk in chunks:
+                        if not flight.subscribers:
+                            break  # 没有人在听了，停止上游生成
+                        flight.publish(chunk)
+                finally:
+                    chunks.close()
+            flight.publish(_DONE)
+        except Exception as e:
+            flight.publish(_Failure(e))
+        finally:
+            if self._streams.get(key) is flight:
+                del self._streams[key]
+
+    @staticmethod
+    def _await(call: AsyncResult) -> Iterator[str]:
+        yield call.get()
+
+    @staticmethod
+    def _receive(flight: _StreamFlight, queue: Queue) -> Iterator[str]:
+        try:
+            while True:
+                item = queue.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.error
+                yield item
+        finally:
+            flight.subscribers.discard(queue)
+
+    def metrics(self) -> dict:
+        with self._stats_lock:
+            counters = dict(self._counters)
+        return {**counters, "in_flight": len(self._calls) + len(self._streams),
+                "cross_worker": self._lock_file is not None}
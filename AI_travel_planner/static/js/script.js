@@ -21,25 +21,7 @@ document.addEventListener('DOMContentLoaded', function () {
 
             const formData = new FormData(planForm);
 
-            fetch('/generate', {
-                method: 'POST',
-                body: formData
-            })
-            .then(response => response.json())
-            .then(data => {
-                if (!resultText) return;
-
-                if (data.error) {
-                    resultText.innerHTML = `<p style="color: red;">生成计划失败: ${data.error}</p>`;
-                    if (savePlanBtn) savePlanBtn.disabled = true; // Keep disabled on error
-                } else {
-                    const converter = new showdown.Converter();
-                    const html = converter.makeHtml(data.plan);
-                    resultText.innerHTML = html;
-                    // Always enable the save button on success, as the click handler will check for auth
-                    if (savePlanBtn) savePlanBtn.disabled = false; 
-                }
-            })
+            generatePlanStream(formData)
             .catch(error => {
                 if (resultText) {
                     resultText.innerHTML = '<p style="color: red;">发生未知错误，请稍后重试。</p>';
@@ -50,6 +32,120 @@ document.addEventListener('DOMContentLoaded', function () {
         });
     }
 
+    function showPlan(markdown) {
+        if (!resultText) return;
+        const converter = new showdown.Converter();
+        resultText.innerHTML = converter.makeHtml(markdown);
+    }
+
+    function showError(message) {
+        if (resultText) {
+            resultText.innerHTML = `<p style="color: red;">生成计划失败: ${message}</p>`;
+        }
+        if (savePlanBtn) savePlanBtn.disabled = true; // Keep disabled on error
+    }
+
+    function showResult(data) {
+        if (data.error) {
+            showError(data.error);
+        } else {
+            showPlan(data.plan);
+            // Always enable the save button on success, as the click handler will check for auth
+            if (savePlanBtn) savePlanBtn.disabled = false;
+        }
+    }
+
+    // Fallback: wait for the whole plan from /generate.
+    function generatePlan(formData) {
+        return fetch('/generate', {
+            method: 'POST',
+            body: formData
+        })
+        .then(response => response.json())
+        .then(showResult);
+    }
+
+    // Streams the plan from /generate-stream (Server-Sent Events over a POST,
+    // which EventSource cannot send) and renders it as it arrives.
+    async function generatePlanStream(formData) {
+        if (!window.ReadableStream || !window.TextDecoder) {
+            return generatePlan(formData);
+        }
+        const response = await fetch('/generate-stream', {
+            method: 'POST',
+            body: formData
+        });
+        const contentType = response.headers.get('Content-Type') || '';
+        if (!contentType.startsWith('text/event-stream')) {
+            // Validation errors come back as JSON, like /generate.
+            return showResult(await response.json());
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let plan = '';
+        let renderFrame = null;
+        let finished = false;
+
+        // Re-render at most once per frame however fast tokens arrive.
+        const scheduleRender = () => {
+            if (renderFrame !== null) return;
+            renderFrame = requestAnimationFrame(() => {
+                renderFrame = null;
+                showPlan(plan);
+            });
+        };
+
+        // A frame still pending at the end would overwrite the final result or error.
+        const finish = () => {
+            finished = true;
+            if (renderFrame !== null) {
+                cancelAnimationFrame(renderFrame);
+                renderFrame = null;
+            }
+        };
+
+        const handleEvent = (block) => {
+            let event = 'message';
+            const dataLines = [];
+            for (const line of block.split('\n')) {
+                if (line.startsWith('event:')) {
+                    event = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    dataLines.push(line.slice(5).trimStart());
+                }
+            }
+            if (!dataLines.length) return; // comment or keep-alive
+            const data = JSON.parse(dataLines.join('\n'));
+            if (event === 'error') {
+                finish();
+                showError(data.error);
+            } else if (event === 'done') {
+                finish();
+                showResult({ plan: plan });
+            } else if (data.delta) {
+                plan += data.delta;
+                scheduleRender();
+            }
+        };
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true }).replace(/\r\n/g, '\n');
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                handleEvent(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+            }
+        }
+        if (!finished) {
+            finish();
+            showError('连接中断，计划可能不完整。');
+        }
+    }
+
     if (closeBtn) {
         closeBtn.addEventListener('click', function () {
             if (resultModal) {
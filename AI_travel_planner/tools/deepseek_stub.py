@@ -0,0 +1,86 @@
+"""本地 DeepSeek 模拟服务，用于在没有 API 密钥和网络时调试 /generate 与 /generate-stream。
+
+模拟 POST /v1/chat/completions：
+- 普通请求返回完整的 JSON 响应；
+- "stream": true 时按 DeepSeek 的格式返回 Server-Sent Events，每段之间间隔 STUB_DELAY 秒。
+
+用法：
+    python tools/deepseek_stub.py                 # 监听 127.0.0.1:8001
+    DEEPSEEK_API_BASE=http://127.0.0.1:8001/v1 DEEPSEEK_API_KEY=stub python app.py
+"""
+from gevent import monkey
+monkey.patch_all()
+
+import json
+import os
+import time
+
+import gevent
+from flask import Flask, Response, jsonify, request
+
+STUB_DELAY = float(os.getenv("STUB_DELAY", "0.05"))
+STUB_PORT = int(os.getenv("STUB_PORT", "8001"))
+
+PLAN = """## 行程概览
+这是一份由本地模拟服务生成的示例计划。
+
+- **城市:** 示例城市
+- **天数:** 2
+
+### 第一天
+| 时间 | 活动 | 区域 | 餐饮推荐 | 交通 | 大致费用 |
+| --- | --- | --- | --- | --- | --- |
+| 上午 | **老城区** | 市中心 | 本地早餐 | 步行 | 50元 |
+| 下午 | **博物馆** | 文化区 | 茶点 | 地铁 | 80元 |
+
+### 第二天
+| 时间 | 活动 | 区域 | 餐饮推荐 | 交通 | 大致费用 |
+| --- | --- | --- | --- | --- | --- |
+| 全天 | **湖边徒步** | 郊区 | 农家菜 | 公交 | 120元 |
+
+## 安全与省钱技巧
+1. 提前预订门票。
+2. 使用公共交通。
+3. 保管好随身物品。
+"""
+
+app = Flask(__name__)
+
+
+def completion_chunks(text, size=8):
+    """把文本切成若干小段，模拟逐个 token 生成。"""
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+@app.route("/v1/chat/completions", methods=["POST"])
+def chat_completions():
+    body = request.get_json(force=True)
+    model = body.get("model", "deepseek-chat")
+    created = int(time.time())
+
+    if not body.get("stream"):
+        gevent.sleep(STUB_DELAY * len(PLAN) / 8)
+        return jsonify({
+            "id": "stub", "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": PLAN}, "finish_reason": "stop"}],
+        })
+
+    def events():
+        for piece in completion_chunks(PLAN):
+            gevent.sleep(STUB_DELAY)
+            chunk = {
+                "id": "stub", "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return Response(events(), mimetype="text/event-stream")
+
+
+if __name__ == "__main__":
+    from gevent import pywsgi
+    server = pywsgi.WSGIServer(("127.0.0.1", STUB_PORT), app)
+    print(f"DeepSeek stub listening on http://127.0.0.1:{STUB_PORT}/v1")
+    server.serve_forever()
@@ -0,0 +1,108 @@
+"""Output size and encode time per format, encoder backend and setting.
+
+Usage:
+    python benchmarks/bench_encoders.py <folder or images...> [--formats jpeg,webp,avif]
+        [--qualities 75,85,95] [--subsamplings 444,420] [--backends opencv,pillow,simplejpeg]
+
+Every image is decoded once, then encoded in memory with each combination of
+backend, format, quality, chroma subsampling and progressive mode (the last
+two for JPEG only) through watermark_core.encoders, the same code the CLI and
+the desktop app write with. Combinations a backend cannot encode, or a
+backend that is not installed, are listed once and skipped. Times are the
+mean over the images; MP/s is megapixels encoded per second.
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from watermark_core.encoders import BACKENDS, EncodeOptions, available_backends, encode
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+
+
+def image_paths(inputs):
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths += sorted(os.path.join(item, f) for f in os.listdir(item) if f.lower().endswith(IMAGE_EXTENSIONS))
+        else:
+            paths.append(item)
+    return paths
+
+
+def settings(formats, qualities, subsamplings, backends):
+    for backend, fmt in itertools.product(backends, formats):
+        if fmt == 'jpeg':
+            for quality, subsampling, progressive in itertools.product(qualities, subsamplings, (False, True)):
+                yield EncodeOptions(fmt, quality, progressive, subsampling, backend=backend)
+        elif fmt in ('webp', 'avif'):
+            for quality in qualities:
+                yield EncodeOptions(fmt, quality, backend=backend)
+        else:
+            yield EncodeOptions(fmt, backend=backend)
+
+
+def measure(images, options):
+    """Returns (mean encode seconds, mean bytes) over ``images``, after one untimed warm-up encode."""
+    encode(images[0], options.format, options)
+    total_time = 0.0
+    total_bytes = 0
+    for pixels in images:
+        start = time.perf_counter()
+        data = encode(pixels, options.format, options)
+        total_time += time.perf_counter() - start
+        total_bytes += len(data)
+    return total_time / len(images), total_bytes / len(images)
+
+
+def csv_list(value):
+    return [item for item in value.split(',') if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('inputs', nargs='+', help="image files or folders")
+    parser.add_argument('--formats', type=csv_list, default=['jpeg', 'webp', 'avif'])
+    parser.add_argument('--qualities', type=lambda v: [int(q) for q in csv_list(v)], default=[75, 85, 95])
+    parser.add_argument('--subsamplings', type=csv_list, default=['444', '420'], help="JPEG only")
+    parser.add_argument('--backends', type=csv_list, default=BACKENDS)
+    args = parser.parse_args()
+
+    images = [img for img in (cv2.imread(path) for path in image_paths(args.inputs)) if img is not None]
+    if not images:
+        print("No images found.")
+        return
+    megapixels = sum(img.shape[0] * img.shape[1] for img in images) / len(images) / 1e6
+
+    installed = available_backends()
+    for backend in args.backends:
+        if backend not in installed:
+            print(f"skipped: backend {backend} is not installed")
+    backends = [backend for backend in args.backends if backend in installed]
+
+    print(f"{len(images)} image(s), {megapixels:.1f} MP on average\n")
+    print(f"{'backend':<11} {'format':<5} {'q':>3} {'sub':>4} {'prog':>4} {'ms/image':>9} {'KB/image':>9} {'MP/s':>7}")
+    skipped = set()
+    for options in settings(args.formats, args.qualities, args.subsamplings, backends):
+        key = (options.backend, options.format)
+        if key in skipped:
+            continue
+        try:
+            seconds, size = measure(images, options)
+        except ValueError as e:
+            skipped.add(key)
+            print(f"skipped: {options.backend} {options.format}: {e}")
+            continue
+        quality = options.quality if options.quality is not None else '-'
+        print(f"{options.backend:<11} {options.format:<5} {quality:>3} {options.subsampling or '-':>4} "
+              f"{'yes' if options.progressive else 'no':>4} {seconds * 1000:>9.1f} {size / 1024:>9.1f} "
+              f"{megapixels / seconds:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Per-image wall time of the old two-decode path vs. the single-read loader.
+
+Usage:
+    python benchmarks/bench_single_decode.py <folder> [--repeat 3]
+
+"before" is what the CLI used to do: PIL opens the file and builds the EXIF
+tag dict, then cv2.imread opens and decodes it again. "after" is
+watermark_core.loader.load_image, which maps the file once and decodes from
+that buffer. Run it twice and keep the second result if you want the OS
+file cache warm for both variants.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import cv2
+from PIL import Image
+from PIL.ExifTags import TAGS
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from watermark_core.loader import load_image
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
+
+
+def load_before(path):
+    date = None
+    exif_data = Image.open(path)._getexif()
+    if exif_data:
+        for tag, value in exif_data.items():
+            if TAGS.get(tag, tag) == 'DateTimeOriginal':
+                date = value
+    return cv2.imread(path), date
+
+
+def load_after(path):
+    loaded = load_image(path)
+    return loaded.pixels, loaded.exif_date
+
+
+def time_per_image(paths, load, repeat):
+    timings = []
+    for path in paths:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            load(path)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings.append(best)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('folder')
+    parser.add_argument('--repeat', type=int, default=3, help="runs per image, the fastest is kept")
+    args = parser.parse_args()
+
+    paths = sorted(os.path.join(args.folder, f) for f in os.listdir(args.folder)
+                   if f.lower().endswith(IMAGE_EXTENSIONS))
+    if not paths:
+        print("No images found.")
+        return
+
+    print(f"{len(paths)} image(s), best of {args.repeat} run(s) each\n")
+    print(f"{'variant':<8} {'mean ms':>9} {'median ms':>10} {'max ms':>8}")
+    results = {}
+    for name, load in (('before', load_before), ('after', load_after)):
+        timings = [t * 1000 for t in time_per_image(paths, load, args.repeat)]
+        results[name] = statistics.mean(timings)
+        print(f"{name:<8} {results[name]:>9.1f} {statistics.median(timings):>10.1f} {max(timings):>8.1f}")
+    print(f"\nspeed-up: {results['before'] / results['after']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Time and memory of full-resolution vs. reduced-resolution thumbnail decoding.
+
+Usage:
+    python benchmarks/bench_thumbnails.py <folder of large JPEGs> [--size 64]
+
+"full" decodes every image at full resolution and resizes it, which is what
+the GUI list did with QPixmap(file_path).scaled(...). "reduced" is
+watermark_core.loader.load_thumbnail (EXIF thumbnail or DCT-scaled decode).
+Peak memory is the highest per-image peak reported by tracemalloc,
+which sees the NumPy buffers OpenCV decodes into.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from watermark_core.loader import fit_size, load_thumbnail
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg')
+
+
+def thumbnail_full(path, size):
+    img = cv2.imread(path)
+    return cv2.resize(img, fit_size(img.shape[1], img.shape[0], size, size), interpolation=cv2.INTER_AREA)
+
+
+def thumbnail_reduced(path, size):
+    return load_thumbnail(path, size, size)
+
+
+def measure(paths, make_thumbnail, size):
+    total_time = 0.0
+    peak = 0
+    for path in paths:
+        tracemalloc.start()
+        start = time.perf_counter()
+        make_thumbnail(path, size)
+        total_time += time.perf_counter() - start
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return total_time, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('folder')
+    parser.add_argument('--size', type=int, default=64, help="thumbnail box in pixels (default: 64)")
+    args = parser.parse_args()
+
+    paths = sorted(os.path.join(args.folder, f) for f in os.listdir(args.folder)
+                   if f.lower().endswith(IMAGE_EXTENSIONS))
+    if not paths:
+        print("No JPEG files found.")
+        return
+
+    print(f"{len(paths)} JPEG(s), {args.size}x{args.size} thumbnails\n")
+    print(f"{'variant':<8} {'total s':>8} {'ms/image':>9} {'peak MB':>8}")
+    results = {}
+    for name, make_thumbnail in (('full', thumbnail_full), ('reduced', thumbnail_reduced)):
+        total_time, peak = measure(paths, make_thumbnail, args.size)
+        results[name] = (total_time, peak)
+        print(f"{name:<8} {total_time:>8.2f} {total_time / len(paths) * 1000:>9.1f} {peak / 2**20:>8.1f}")
+
+    (full_time, full_peak), (reduced_time, reduced_peak) = results['full'], results['reduced']
+    print(f"\ntime: {full_time / reduced_time:.1f}x faster, peak memory: {full_peak / max(reduced_peak, 1):.1f}x lower")
+
+
+if __name__ == "__main__":
+    main()
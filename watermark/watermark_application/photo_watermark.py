@@ -1,14 +1,31 @@
 import sys
 import os
+import threading
+import time
 from PyQt5.QtWidgets import (
-    QApplication, QMainWindow, QFileDialog, QListWidgetItem, QMessageBox, QProgressDialog
+    QApplication, QMainWindow, QFileDialog, QLabel, QListWidgetItem, QMessageBox, QProgressDialog, QShortcut
 )
 from PyQt5.QtGui import (
-    QPixmap, QPainter, QColor, QFont, QPen, QIcon, QFontMetrics, QTransform, QMouseEvent
+    QPixmap, QColor, QFont, QIcon, QFontMetrics, QKeySequence, QMouseEvent
 )
-from PyQt5.QtCore import Qt, QSettings, QPoint, QSize
+from PyQt5.QtCore import Qt, QSettings, QPoint, QRect, QSize, QStandardPaths, QThread, QThreadPool, QTimer
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from watermark_core.encoders import FORMATS, EncodeOptions, available_backends
+from watermark_core.engine import CANCELLED, QT_BACKEND, WatermarkTemplate, watermark_box
+from watermark_core.manifest import ExportManifest, fingerprint
+from watermark_core.thumbnail_cache import ThumbnailCache
+
+from preview import PreviewRenderer, PreviewScheduler
 from ui import Ui_MainWindow
+from workers import (
+    SKIPPED, ExportSignals, ExportTask, FolderScanSignals, FolderScanTask, ThumbnailSignals, ThumbnailTask
+)
+
+THUMBNAIL_SIZE = 64
+THUMBNAIL_PREFETCH_ROWS = 20
+# Set to show preview render timings on start (F12 toggles them at any time).
+DEBUG_ENV_VAR = "PHOTO_WATERMARK_DEBUG"
 
 
 class PhotoWatermarkApp(QMainWindow):
@@ -22,6 +39,11 @@ class PhotoWatermarkApp(QMainWindow):
         # Image and Watermark Attributes
         self.current_image_path = None
         self.original_pixmap = None
+        self.preview = PreviewRenderer()
+        self.preview_scheduler = PreviewScheduler(self.update_preview, self)
+        self.preview_stats_label = QLabel(self.ui.image_preview_label)
+        self.preview_stats_label.setStyleSheet("background: rgba(0, 0, 0, 160); color: white; padding: 2px;")
+        self.preview_stats_label.setVisible(bool(os.environ.get(DEBUG_ENV_VAR)))
         self.modified_images = set()
         self.added_files = set()
         self.watermark_text = "你的水印"
@@ -32,6 +54,8 @@ class PhotoWatermarkApp(QMainWindow):
         self.watermark_pos = QPoint(0, 0)
         self.watermark_position_mode = "预设位置"
         self.watermark_rotation = 0
+        self.watermark_logo = ""
+        self.watermark_logo_scale = 0.2
         
         # Dragging
         self.dragging = False
@@ -43,6 +67,44 @@ class PhotoWatermarkApp(QMainWindow):
         self.output_folder = ""
         self.settings = QSettings("VibeCoding", "PhotoWatermark2")
 
+        # Thumbnails survive restarts, so re-adding a folder only decodes new or changed files.
+        cache_dir = os.path.join(QStandardPaths.writableLocation(QStandardPaths.CacheLocation), "thumbnails")
+        cache_mb = int(self.settings.value("thumbnail_cache_mb", 200))
+        self.thumbnail_cache = ThumbnailCache(cache_dir, cache_mb * 1024 * 1024)
+
+        # Background import: folder scanning and thumbnail decoding run off the UI thread.
+        self.items_by_path = {}
+        self.thumbnails_requested = set()
+        self.import_cancel_event = threading.Event()
+        self.scan_pool = QThreadPool(self)
+        self.scan_pool.setMaxThreadCount(1)
+        self.thumbnail_pool = QThreadPool(self)
+        self.scan_signals = FolderScanSignals(self)
+        self.thumbnail_signals = ThumbnailSignals(self)
+        self.thumbnail_cancel_event = threading.Event()
+        self.imported_count = 0
+        self.visible_thumbnails_timer = QTimer(self)
+        self.visible_thumbnails_timer.setSingleShot(True)
+        self.visible_thumbnails_timer.setInterval(0)
+
+        # Export runs on its own pool; at most two jobs per worker are queued at a time.
+        self.export_pool = QThreadPool(self)
+        self.export_signals = ExportSignals(self)
+        self.export_cancel_event = threading.Event()
+        self.export_queue = []
+        self.export_in_flight = 0
+        self.export_done = 0
+        self.export_skipped = 0
+        self.export_failures = []
+        self.export_started_at = 0.0
+        self.export_manifest = None
+        self.export_settings = None
+        self.export_encode_options = None
+        self.ui.encoder_combo.addItem("Qt", QT_BACKEND)
+        for backend in available_backends():
+            self.ui.encoder_combo.addItem({"opencv": "OpenCV", "pillow": "Pillow"}.get(backend, backend), backend)
+        self.export_progress_dialog = None
+
         self.connect_signals()
         self.load_settings()
         self.update_all_ui_from_settings()
@@ -50,10 +112,22 @@ class PhotoWatermarkApp(QMainWindow):
     def connect_signals(self):
         self.ui.add_files_button.clicked.connect(self.add_files)
         self.ui.add_folder_button.clicked.connect(self.add_folder)
+        self.ui.cancel_import_button.clicked.connect(self.cancel_import)
+        self.scan_signals.found.connect(self.on_import_found)
+        self.scan_signals.finished.connect(self.on_import_finished)
+        self.thumbnail_signals.loaded.connect(self.on_thumbnail_loaded)
+        self.export_signals.finished.connect(self.on_export_finished)
+        self.preview_scheduler.rendered.connect(self.update_preview_stats)
+        QShortcut(QKeySequence(Qt.Key_F12), self, self.toggle_preview_stats)
+        self.visible_thumbnails_timer.timeout.connect(self.request_visible_thumbnails)
+        self.ui.image_list_widget.verticalScrollBar().valueChanged.connect(self.visible_thumbnails_timer.start)
         self.ui.image_list_widget.currentItemChanged.connect(self.on_image_list_selection_changed)
         self.ui.watermark_text_input.textChanged.connect(self.on_watermark_text_changed)
         self.ui.font_button.clicked.connect(self.select_font)
         self.ui.color_button.clicked.connect(self.select_color)
+        self.ui.logo_button.clicked.connect(self.select_logo)
+        self.ui.clear_logo_button.clicked.connect(lambda: self.set_watermark_logo(""))
+        self.ui.logo_scale_spin.valueChanged.connect(self.on_logo_scale_changed)
         self.ui.opacity_slider.valueChanged.connect(self.on_opacity_changed)
         self.ui.rotation_slider.valueChanged.connect(self.on_rotation_changed)
 
@@ -71,48 +145,85 @@ class PhotoWatermarkApp(QMainWindow):
         files, _ = QFileDialog.getOpenFileNames(self, "选择图片", "", "图片文件 (*.png *.jpg *.jpeg)")
         if files:
             for file_path in files:
-                if file_path not in self.added_files:
-                    self.added_files.add(file_path)
-                    item = QListWidgetItem()
-
-                    pixmap = QPixmap(file_path)
-                    if not pixmap.isNull():
-                        thumbnail = pixmap.scaled(64, 64, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-                        item.setIcon(QIcon(thumbnail))
-                    
-                    display_text = os.path.basename(file_path)
-                    if len(display_text) > 20:
-                        display_text = display_text[:20] + "..."
-                    
-                    item.setText(display_text)
-                    item.setToolTip(file_path)
-                    item.setData(Qt.UserRole, file_path)
-                    self.ui.image_list_widget.addItem(item)
+                self._add_image_item(file_path)
+            self.visible_thumbnails_timer.start()
 
     def add_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "选择文件夹")
         if folder:
-            for root, _, files in os.walk(folder):
-                for file_name in files:
-                    if file_name.lower().endswith(('.png', '.jpg', '.jpeg')):
-                        file_path = os.path.join(root, file_name)
-                        if file_path not in self.added_files:
-                            self.added_files.add(file_path)
-                            item = QListWidgetItem()
-
-                            pixmap = QPixmap(file_path)
-                            if not pixmap.isNull():
-                                thumbnail = pixmap.scaled(64, 64, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-                                item.setIcon(QIcon(thumbnail))
-
-                            display_text = os.path.basename(file_name)
-                            if len(display_text) > 20:
-                                display_text = display_text[:20] + "..."
-
-                            item.setText(display_text)
-                            item.setToolTip(file_path)
-                            item.setData(Qt.UserRole, file_path)
-                            self.ui.image_list_widget.addItem(item)
+            # A new import replaces one that is still running.
+            self.import_cancel_event.set()
+            self.import_cancel_event = threading.Event()
+            self.imported_count = 0
+            self.ui.import_status_label.setText("正在导入...")
+            self.ui.import_status_label.show()
+            self.ui.cancel_import_button.show()
+            self.scan_pool.start(FolderScanTask(folder, self.import_cancel_event, self.scan_signals))
+
+    def cancel_import(self):
+        self.import_cancel_event.set()
+
+    def on_import_found(self, cancel_event, file_paths):
+        if cancel_event is not self.import_cancel_event or cancel_event.is_set():
+            return
+        for file_path in file_paths:
+            if self._add_image_item(file_path):
+                self.imported_count += 1
+        self.ui.import_status_label.setText(f"正在导入... 已添加 {self.imported_count} 张图片")
+        self.visible_thumbnails_timer.start()
+
+    def on_import_finished(self, cancel_event, cancelled):
+        if cancel_event is not self.import_cancel_event:
+            return  # an older scan finished after a new one was started
+        self.ui.cancel_import_button.hide()
+        if cancelled:
+            self.ui.import_status_label.setText(f"已取消导入，已添加 {self.imported_count} 张图片")
+        else:
+            self.ui.import_status_label.setText(f"导入完成，已添加 {self.imported_count} 张图片")
+
+    def request_visible_thumbnails(self):
+        """Queues thumbnail loads for the rows in view (plus a few below), skipping ones already requested."""
+        list_widget = self.ui.image_list_widget
+        count = list_widget.count()
+        if count == 0:
+            return
+        viewport = list_widget.viewport()
+        first_index = list_widget.indexAt(QPoint(0, 0))
+        last_index = list_widget.indexAt(QPoint(0, viewport.height() - 1))
+        first = first_index.row() if first_index.isValid() else 0
+        last = last_index.row() if last_index.isValid() else count - 1
+        last = min(count - 1, last + THUMBNAIL_PREFETCH_ROWS)
+
+        for row in range(first, last + 1):
+            file_path = list_widget.item(row).data(Qt.UserRole)
+            if file_path not in self.thumbnails_requested:
+                self.thumbnails_requested.add(file_path)
+                self.thumbnail_pool.start(ThumbnailTask(
+                    self.thumbnail_cache, file_path, THUMBNAIL_SIZE, self.thumbnail_cancel_event,
+                    self.thumbnail_signals))
+
+    def on_thumbnail_loaded(self, file_path, image):
+        item = self.items_by_path.get(file_path)
+        if item is not None:
+            item.setIcon(QIcon(QPixmap.fromImage(image)))
+
+    def _add_image_item(self, file_path):
+        """Adds a list entry without a thumbnail; the icon is filled in once the row becomes visible."""
+        if file_path in self.added_files:
+            return False
+        self.added_files.add(file_path)
+        item = QListWidgetItem()
+
+        display_text = os.path.basename(file_path)
+        if len(display_text) > 20:
+            display_text = display_text[:20] + "..."
+
+        item.setText(display_text)
+        item.setToolTip(file_path)
+        item.setData(Qt.UserRole, file_path)
+        self.ui.image_list_widget.addItem(item)
+        self.items_by_path[file_path] = item
+        return True
 
     def _mark_current_image_as_modified(self):
         if self.current_image_path:
@@ -123,7 +234,7 @@ class PhotoWatermarkApp(QMainWindow):
         if not current_item:
             self.current_image_path = None
             self.original_pixmap = None
-            self.update_preview()
+            self.preview_scheduler.render_now()
             return
 
         self.current_image_path = current_item.data(Qt.UserRole)
@@ -133,8 +244,10 @@ class PhotoWatermarkApp(QMainWindow):
             QMessageBox.warning(self, "错误", f"无法加载图片: {self.current_image_path}")
             self.current_image_path = None
             self.original_pixmap = None
-        
-        self.update_preview()
+        else:
+            self.preview.set_image(self.original_pixmap)
+
+        self.preview_scheduler.render_now()
 
     def on_watermark_text_changed(self, text):
         self.watermark_text = text
@@ -165,6 +278,22 @@ class PhotoWatermarkApp(QMainWindow):
             self.update_watermark()
             self._mark_current_image_as_modified()
 
+    def select_logo(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "选择Logo", "", "图片文件 (*.png *.jpg *.jpeg *.bmp)")
+        if file_path:
+            self.set_watermark_logo(file_path)
+
+    def set_watermark_logo(self, path):
+        self.watermark_logo = path
+        self.ui.logo_label.setText(os.path.basename(path) if path else "未选择Logo（使用文字水印）")
+        self.update_watermark()
+        self._mark_current_image_as_modified()
+
+    def on_logo_scale_changed(self, percent):
+        self.watermark_logo_scale = percent / 100.0
+        self.update_watermark()
+        self._mark_current_image_as_modified()
+
     def set_watermark_position(self, position_text):
         self.watermark_position = position_text
         self.update_watermark()
@@ -179,94 +308,148 @@ class PhotoWatermarkApp(QMainWindow):
             QMessageBox.warning(self, "提示", "请先选择输出文件夹。")
             return
 
+        if self.export_progress_dialog is not None:
+            return  # an export is already running
+
         prefix = self.ui.prefix_input.text()
         suffix = self.ui.suffix_input.text()
+        template = self.current_template()
+        encode_options = self.current_encode_options()
+
+        self.export_queue = []
+        for i in range(self.ui.image_list_widget.count()):
+            original_path = self.ui.image_list_widget.item(i).data(Qt.UserRole)
+            name, ext = os.path.splitext(os.path.basename(original_path))
+            ext = FORMATS.get(encode_options.format, ext)
+            new_path = os.path.join(self.output_folder, f"{prefix}{name}{suffix}{ext}")
+            self.export_queue.append((original_path, new_path, template))
+        self.export_queue.reverse()  # popped from the end
+
+        count = len(self.export_queue)
+        workers = self.ui.export_workers_spin.value()
+        self.export_pool.setMaxThreadCount(workers)
+        self.export_cancel_event = threading.Event()
+        self.export_in_flight = 0
+        self.export_done = 0
+        self.export_skipped = 0
+        self.export_failures = []
+        self.export_started_at = time.monotonic()
+        # The manifest in the output folder lets a re-export skip images that have not changed.
+        self.export_manifest = ExportManifest(self.output_folder) if self.ui.skip_unchanged_checkbox.isChecked() else None
+        # Default Qt encoding keeps the fingerprint of exports made before encoder options existed.
+        default_encoding = encode_options.as_dict() == EncodeOptions(backend=QT_BACKEND).as_dict()
+        self.export_settings = fingerprint(template.as_dict(), *([] if default_encoding else [encode_options.as_dict()]))
+        self.export_encode_options = encode_options
 
-        count = self.ui.image_list_widget.count()
         progress_dialog = QProgressDialog("正在保存图片...", "取消", 0, count, self)
         progress_dialog.setWindowModality(Qt.WindowModal)
+        progress_dialog.setAutoClose(False)
+        progress_dialog.setAutoReset(False)
+        progress_dialog.canceled.connect(self.cancel_export)
         progress_dialog.show()
+        self.export_progress_dialog = progress_dialog
 
-        for i in range(count):
-            progress_dialog.setValue(i)
-            if progress_dialog.wasCanceled():
-                break
-
-            item = self.ui.image_list_widget.item(i)
-            original_path = item.data(Qt.UserRole)
-
-            pixmap = QPixmap(original_path)
-            painter = QPainter(pixmap)
-            painter.setRenderHint(QPainter.Antialiasing)
-            
-            self.draw_watermark_on_pixmap(painter, pixmap)
-            painter.end()
-
-            base_name = os.path.basename(original_path)
-            name, ext = os.path.splitext(base_name)
-            new_name = f"{prefix}{name}{suffix}{ext}"
-            new_path = os.path.join(self.output_folder, new_name)
-            
-            if not pixmap.save(new_path):
-                 QMessageBox.warning(self, "保存失败", f"无法保存文件: {new_path}")
-
-        progress_dialog.setValue(count)
-        QMessageBox.information(self, "完成", "所有图片已成功保存。")
-
-    def draw_watermark_on_pixmap(self, painter, pixmap):
-        painter.setOpacity(self.watermark_opacity)
-        font_metrics = QFontMetrics(self.watermark_font)
-        text_width = font_metrics.width(self.watermark_text)
-        text_height = font_metrics.height()
+        for _ in range(workers * 2):
+            self._submit_next_export()
 
-        if self.watermark_position_mode == "manual":
-            x = self.watermark_pos.x()
-            y = self.watermark_pos.y()
+    def _submit_next_export(self):
+        if self.export_cancel_event.is_set() or not self.export_queue:
+            return
+        source, destination, template = self.export_queue.pop()
+        self.export_in_flight += 1
+        self.export_pool.start(ExportTask(source, destination, template, self.export_cancel_event,
+                                          self.export_signals, self.export_manifest, self.export_settings,
+                                          self.export_encode_options))
+
+    def cancel_export(self):
+        # Queued jobs are dropped; running ones stop at their next checkpoint.
+        self.export_cancel_event.set()
+        self.export_queue = []
+        if self.export_progress_dialog is not None:
+            self.export_progress_dialog.setLabelText("正在取消...")
+
+    def on_export_finished(self, source, destination, error):
+        self.export_in_flight -= 1
+        if error == CANCELLED:
+            pass
+        elif error == SKIPPED:
+            self.export_skipped += 1
+        elif error:
+            self.export_failures.append(f"{destination}: {error}")
         else:
-            positions = {
-                "左上": (10, font_metrics.ascent() + 10),
-                "右上": (pixmap.width() - text_width - 10, font_metrics.ascent() + 10),
-                "左下": (10, pixmap.height() - font_metrics.descent() - 10),
-                "右下": (pixmap.width() - text_width - 10, pixmap.height() - font_metrics.descent() - 10),
-                "中": ((pixmap.width() - text_width) / 2, (pixmap.height() + text_height) / 2 - font_metrics.descent()),
-                "中上": ((pixmap.width() - text_width) / 2, font_metrics.ascent() + 10),
-                "左中": (10, (pixmap.height() + text_height) / 2 - font_metrics.descent()),
-                "右中": (pixmap.width() - text_width - 10, (pixmap.height() + text_height) / 2 - font_metrics.descent()),
-                "中下": ((pixmap.width() - text_width) / 2, pixmap.height() - font_metrics.descent() - 10)
-            }
-            x, y = positions.get(self.watermark_position, (10, 10)) # Default to top-left
-            self.watermark_pos = QPoint(int(x), int(y))
-
-        if self.watermark_rotation != 0:
-            transform = QTransform()
-            center_x = self.watermark_pos.x() + text_width / 2
-            center_y = self.watermark_pos.y() - text_height / 2
-            transform.translate(center_x, center_y)
-            transform.rotate(self.watermark_rotation)
-            transform.translate(-center_x, -center_y)
-            painter.setTransform(transform)
-
-        painter.setFont(self.watermark_font)
-        painter.setPen(QPen(self.watermark_color))
-        painter.drawText(self.watermark_pos, self.watermark_text)
+            self.export_done += 1
+
+        total = self.export_progress_dialog.maximum()
+        processed = self.export_done + self.export_skipped + len(self.export_failures)
+        if not self.export_cancel_event.is_set():
+            elapsed = time.monotonic() - self.export_started_at
+            remaining = (total - processed) * elapsed / processed if processed else 0
+            minutes, seconds = divmod(int(remaining + 0.5), 60)
+            self.export_progress_dialog.setLabelText(
+                f"正在保存图片... {processed}/{total}\n预计剩余时间 {minutes:02d}:{seconds:02d}")
+            self.export_progress_dialog.setValue(processed)
+            self._submit_next_export()
+
+        if self.export_in_flight == 0:
+            self._finish_export()
+
+    def _finish_export(self):
+        progress_dialog = self.export_progress_dialog
+        self.export_progress_dialog = None
+        progress_dialog.canceled.disconnect(self.cancel_export)
+        progress_dialog.close()
+        if self.export_manifest is not None:
+            self.export_manifest.close()
+            self.export_manifest = None
+
+        if self.export_failures:
+            details = "\n".join(self.export_failures[:10])
+            if len(self.export_failures) > 10:
+                details += f"\n... 另有 {len(self.export_failures) - 10} 个"
+            QMessageBox.warning(self, "保存失败", f"以下文件保存失败:\n{details}")
+        if self.export_cancel_event.is_set():
+            QMessageBox.information(self, "已取消", f"导出已取消，已保存 {self.export_done} 张图片。")
+        elif not self.export_failures:
+            if self.export_skipped:
+                QMessageBox.information(self, "完成", f"所有图片已成功保存，其中 {self.export_skipped} 张未更改，已跳过。")
+            else:
+                QMessageBox.information(self, "完成", "所有图片已成功保存。")
+
+    def current_template(self):
+        """Snapshot of the current watermark settings for rendering outside the widget."""
+        return WatermarkTemplate(
+            text=self.watermark_text,
+            font=self.watermark_font.toString(),
+            color=self.watermark_color.name(QColor.HexArgb),
+            opacity=self.watermark_opacity,
+            rotation=self.watermark_rotation,
+            position=self.watermark_position,
+            position_mode="manual" if self.watermark_position_mode == "manual" else "preset",
+            pos=(self.watermark_pos.x(), self.watermark_pos.y()),
+            logo=self.watermark_logo,
+            logo_scale=self.watermark_logo_scale,
+        )
+
+    def current_encode_options(self):
+        """The output format and encoder chosen in the export settings."""
+        return EncodeOptions(
+            format=self.ui.format_combo.currentData() or None,
+            quality=self.ui.quality_spin.value() or None,
+            progressive=self.ui.progressive_checkbox.isChecked(),
+            subsampling=self.ui.subsampling_combo.currentData() or None,
+            backend=self.ui.encoder_combo.currentData() or QT_BACKEND,
+        )
 
     def update_watermark(self):
-        self.update_preview()
+        self.preview_scheduler.request()
 
     def update_preview(self):
         if not self.current_image_path or not self.original_pixmap:
             self.ui.image_preview_label.clear()
             return
 
-        pixmap = self.original_pixmap.copy()
-        painter = QPainter(pixmap)
-        painter.setRenderHint(QPainter.Antialiasing)
-
-        self.draw_watermark_on_pixmap(painter, pixmap)
-
-        painter.end()
-
-        scaled_pixmap = pixmap.scaled(self.ui.image_preview_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        scaled_pixmap, self.watermark_pos = self.preview.render(
+            self.ui.image_preview_label.size(), self.current_template())
         self.ui.image_preview_label.setPixmap(scaled_pixmap)
 
         label_size = self.ui.image_preview_label.size()
@@ -277,6 +460,18 @@ class PhotoWatermarkApp(QMainWindow):
         else:
             self.pixmap_scale = 1.0
 
+    def update_preview_stats(self):
+        if self.preview_stats_label.isVisible():
+            self.preview_stats_label.setText(
+                f"p50 {self.preview_scheduler.percentile(50):.1f} ms  "
+                f"p99 {self.preview_scheduler.percentile(99):.1f} ms  "
+                f"({self.preview_scheduler.render_count} 次渲染 / {self.preview_scheduler.request_count} 次请求)")
+            self.preview_stats_label.adjustSize()
+
+    def toggle_preview_stats(self):
+        self.preview_stats_label.setVisible(not self.preview_stats_label.isVisible())
+        self.update_preview_stats()
+
     def _get_original_pos(self, event_pos):
         if not self.original_pixmap or self.original_pixmap.isNull():
             return None
@@ -299,9 +494,14 @@ class PhotoWatermarkApp(QMainWindow):
         if original_pos is None:
             return
 
-        font_metrics = QFontMetrics(self.watermark_font)
-        text_rect = font_metrics.boundingRect(self.watermark_text)
-        text_rect.translate(self.watermark_pos)
+        if self.watermark_logo:
+            x0, y0, x1, y1 = watermark_box(self.original_pixmap.width(), self.original_pixmap.height(),
+                                           self.current_template(), margin=0)
+            text_rect = QRect(x0, y0, x1 - x0, y1 - y0)
+        else:
+            font_metrics = QFontMetrics(self.watermark_font)
+            text_rect = font_metrics.boundingRect(self.watermark_text)
+            text_rect.translate(self.watermark_pos)
 
         if text_rect.contains(original_pos):
             self.dragging = True
@@ -317,7 +517,7 @@ class PhotoWatermarkApp(QMainWindow):
             return
 
         self.watermark_pos = original_pos - self.drag_start_position
-        self.update_preview()
+        self.preview_scheduler.request()
 
     def mouseReleaseEvent(self, event: QMouseEvent):
         if self.dragging:
@@ -343,6 +543,9 @@ class PhotoWatermarkApp(QMainWindow):
         self.ui.watermark_text_input.setText(self.watermark_text)
         self.ui.opacity_slider.setValue(int(self.watermark_opacity * 255))
         self.ui.rotation_slider.setValue(self.watermark_rotation)
+        self.ui.logo_scale_spin.setValue(round(self.watermark_logo_scale * 100))
+        self.ui.logo_label.setText(
+            os.path.basename(self.watermark_logo) if self.watermark_logo else "未选择Logo（使用文字水印）")
 
         if self.watermark_position_mode == "preset":
             self.ui.preset_pos_radio.setChecked(True)
@@ -359,7 +562,7 @@ class PhotoWatermarkApp(QMainWindow):
         suffix = self.settings.value("file_naming_suffix", "")
         self.ui.prefix_input.setText(prefix)
         self.ui.suffix_input.setText(suffix)
-        self.update_preview()
+        self.preview_scheduler.render_now()
 
     def save_template(self):
         file_path, _ = QFileDialog.getSaveFileName(self, "保存模板", "", "模板文件 (*.ini)")
@@ -387,9 +590,18 @@ class PhotoWatermarkApp(QMainWindow):
         settings.setValue("watermark_pos_x", self.watermark_pos.x())
         settings.setValue("watermark_pos_y", self.watermark_pos.y())
         settings.setValue("watermark_rotation", self.watermark_rotation)
+        settings.setValue("watermark_logo", self.watermark_logo)
+        settings.setValue("watermark_logo_scale", self.watermark_logo_scale)
         settings.setValue("output_folder", self.output_folder)
         settings.setValue("file_naming_prefix", self.ui.prefix_input.text())
         settings.setValue("file_naming_suffix", self.ui.suffix_input.text())
+        settings.setValue("export_workers", self.ui.export_workers_spin.value())
+        settings.setValue("export_skip_unchanged", self.ui.skip_unchanged_checkbox.isChecked())
+        settings.setValue("export_format", self.ui.format_combo.currentData())
+        settings.setValue("export_quality", self.ui.quality_spin.value())
+        settings.setValue("export_progressive", self.ui.progressive_checkbox.isChecked())
+        settings.setValue("export_subsampling", self.ui.subsampling_combo.currentData())
+        settings.setValue("export_encoder", self.ui.encoder_combo.currentData())
 
     def load_settings(self, settings=None):
         if settings is None:
@@ -411,15 +623,35 @@ class PhotoWatermarkApp(QMainWindow):
             int(settings.value("watermark_pos_y", 0))
         )
         self.watermark_rotation = int(settings.value("watermark_rotation", 0))
+        self.watermark_logo = settings.value("watermark_logo", "") or ""
+        self.watermark_logo_scale = float(settings.value("watermark_logo_scale", 0.2))
         self.output_folder = settings.value("output_folder", "")
+        self.ui.export_workers_spin.setValue(int(settings.value("export_workers", QThread.idealThreadCount())))
+        self.ui.skip_unchanged_checkbox.setChecked(settings.value("export_skip_unchanged", True, type=bool))
+        for combo, key, default in [(self.ui.format_combo, "export_format", ""),
+                                    (self.ui.subsampling_combo, "export_subsampling", ""),
+                                    (self.ui.encoder_combo, "export_encoder", QT_BACKEND)]:
+            index = combo.findData(settings.value(key, default) or default)
+            combo.setCurrentIndex(max(index, 0))  # e.g. an encoder that is no longer installed
+        self.ui.quality_spin.setValue(int(settings.value("export_quality", 0)))
+        self.ui.progressive_checkbox.setChecked(settings.value("export_progressive", False, type=bool))
 
     def closeEvent(self, event):
+        self.export_cancel_event.set()
+        self.export_queue = []
+        self.import_cancel_event.set()
+        self.thumbnail_cancel_event.set()
+        self.thumbnail_pool.clear()
         self.save_settings()
+        if os.environ.get(DEBUG_ENV_VAR):
+            print(self.preview_scheduler.format_stats())
         event.accept()
 
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
+    app.setOrganizationName("VibeCoding")
+    app.setApplicationName("PhotoWatermark2")
     main_win = PhotoWatermarkApp()
     main_win.show()
     sys.exit(app.exec_())
\ No newline at end of file
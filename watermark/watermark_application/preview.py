@@ -0,0 +1,123 @@
+import time
+from collections import deque
+
+from PyQt5.QtCore import QObject, QRectF, QSize, Qt, QTimer, pyqtSignal
+from PyQt5.QtGui import QFontMetrics, QPainter
+
+from watermark_core.engine import paint_watermark, text_stamp, watermark_origin, watermark_transform
+
+
+class PreviewRenderer:
+    """Builds the preview pixmap without touching the full-resolution photo on every change.
+
+    Two layers are cached: the photo scaled to the preview label, rebuilt when
+    the photo or the label size changes, and the text stamp at preview scale,
+    rebuilt when the text, font or color changes. Opacity, rotation and
+    position changes only draw the cached stamp onto a copy of the scaled photo.
+    The tiled layout and logos keep their own caches (see ``tile_image`` and
+    ``logo_image``) and are drawn by the engine's ``paint_watermark``.
+    """
+
+    def __init__(self):
+        self.original = None
+        self._base = None
+        self._base_size = QSize()
+        self._stamp = None
+        self._stamp_key = None
+
+    def set_image(self, pixmap):
+        self.original = pixmap
+        self._base = None
+
+    def render(self, size, template):
+        """Returns ``(pixmap, origin)``: the preview fitted into ``size`` and the
+        watermark's baseline origin in full-resolution coordinates."""
+        if self._base is None or self._base_size != size:
+            self._base = self.original.scaled(size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            self._base_size = QSize(size)
+
+        width, height = self.original.width(), self.original.height()
+        scale = self._base.width() / width if width else 1.0
+        if template.tiled or template.logo:
+            pixmap = self._base.copy()
+            painter = QPainter(pixmap)
+            painter.setRenderHint(QPainter.SmoothPixmapTransform)
+            painter.scale(scale, scale)
+            origin = paint_watermark(painter, width, height, template)
+            painter.end()
+            return pixmap, origin
+
+        stamp_key = (template.text, template.font, template.color, scale)
+        if stamp_key != self._stamp_key:
+            self._stamp = text_stamp(template, scale)
+            self._stamp_key = stamp_key
+        stamp, stamp_rect = self._stamp
+
+        font_metrics = QFontMetrics(template.qfont())
+        origin = watermark_origin(width, height, template, font_metrics)
+
+        pixmap = self._base.copy()
+        painter = QPainter(pixmap)
+        painter.setRenderHint(QPainter.SmoothPixmapTransform)
+        painter.scale(scale, scale)
+        painter.setOpacity(template.opacity)
+        if template.rotation != 0:
+            painter.setTransform(watermark_transform(origin, font_metrics, template), True)
+        painter.drawImage(QRectF(stamp_rect.translated(origin)), stamp)
+        painter.end()
+        return pixmap, origin
+
+
+class PreviewScheduler(QObject):
+    """Coalesces preview render requests into at most one render per frame.
+
+    ``request()`` only arms a timer, so a burst of slider or drag events ends
+    up as a single render of the latest state once the frame interval has
+    passed; requests that arrive in between are simply dropped. The duration
+    of every render is kept for the debug overlay and ``format_stats()``.
+    """
+
+    rendered = pyqtSignal(float)  # duration of the render in ms
+
+    FRAME_INTERVAL = 16  # ms, about 60 renders per second at most
+    HISTORY = 500        # renders kept for the percentiles
+
+    def __init__(self, render, parent=None):
+        super().__init__(parent)
+        self._render = render
+        self._last_render = 0.0
+        self.timings = deque(maxlen=self.HISTORY)  # ms per render, newest last
+        self.request_count = 0
+        self.render_count = 0
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.render_now)
+
+    def request(self):
+        self.request_count += 1
+        if self._timer.isActive():
+            return
+        since_last = (time.perf_counter() - self._last_render) * 1000
+        self._timer.start(max(0, int(self.FRAME_INTERVAL - since_last)))
+
+    def render_now(self):
+        """Renders immediately and drops any pending request."""
+        self._timer.stop()
+        start = time.perf_counter()
+        self._render()
+        self._last_render = time.perf_counter()
+        elapsed = (self._last_render - start) * 1000
+        self.timings.append(elapsed)
+        self.render_count += 1
+        self.rendered.emit(elapsed)
+
+    def percentile(self, p):
+        if not self.timings:
+            return 0.0
+        ordered = sorted(self.timings)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    def format_stats(self):
+        return (f"preview: {self.render_count} renders for {self.request_count} requests, "
+                f"p50 {self.percentile(50):.1f} ms, p99 {self.percentile(99):.1f} ms, "
+                f"max {max(self.timings, default=0.0):.1f} ms")
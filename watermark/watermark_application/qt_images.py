@@ -0,0 +1,17 @@
+import cv2
+import numpy as np
+from PyQt5.QtGui import QImage
+
+
+def ndarray_to_qimage(img):
+    """Converts a uint8 grayscale, BGR or BGRA ndarray into a QImage that owns its pixels."""
+    h, w = img.shape[:2]
+    if img.ndim == 2:
+        fmt = QImage.Format_Grayscale8
+    elif img.shape[2] == 4:
+        fmt = QImage.Format_ARGB32  # B, G, R, A in memory on little-endian machines
+    else:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        fmt = QImage.Format_RGB888
+    img = np.ascontiguousarray(img)
+    return QImage(img.data, w, h, img.strides[0], fmt).copy()
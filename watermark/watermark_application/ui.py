@@ -1,4 +1,4 @@
-from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QListWidget, QSlider, QLineEdit, QGridLayout, QRadioButton, QButtonGroup, QComboBox, QFrame)
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QListWidget, QSlider, QLineEdit, QGridLayout, QRadioButton, QButtonGroup, QComboBox, QFrame, QSpinBox, QCheckBox)
 from PyQt5.QtCore import Qt, QSize
 
 class Ui_MainWindow(object):
@@ -15,6 +15,7 @@ class Ui_MainWindow(object):
         self.image_list_widget = QListWidget()
         self.image_list_widget.setFixedWidth(350)
         self.image_list_widget.setIconSize(QSize(80, 80))
+        self.image_list_widget.setUniformItemSizes(True)  # keeps layout cheap with thousands of rows
         left_panel.addWidget(self.image_list_widget)
         
         import_buttons_layout = QHBoxLayout()
@@ -24,6 +25,15 @@ class Ui_MainWindow(object):
         import_buttons_layout.addWidget(self.add_folder_button)
         left_panel.addLayout(import_buttons_layout)
 
+        import_status_layout = QHBoxLayout()
+        self.import_status_label = QLabel("")
+        self.import_status_label.hide()
+        self.cancel_import_button = QPushButton("取消导入")
+        self.cancel_import_button.hide()
+        import_status_layout.addWidget(self.import_status_label, 1)
+        import_status_layout.addWidget(self.cancel_import_button)
+        left_panel.addLayout(import_status_layout)
+
         # Center panel for image preview
         center_panel = QVBoxLayout()
         self.image_preview_label = QLabel("请拖放图片到此处，或使用按钮添加文件。")
@@ -62,6 +72,23 @@ class Ui_MainWindow(object):
         font_color_layout.addWidget(self.color_button)
         watermark_layout.addLayout(font_color_layout)
 
+        # Image watermark: replaces the text while a logo is selected
+        logo_layout = QHBoxLayout()
+        self.logo_button = QPushButton("选择Logo")
+        self.clear_logo_button = QPushButton("清除Logo")
+        logo_layout.addWidget(self.logo_button)
+        logo_layout.addWidget(self.clear_logo_button)
+        watermark_layout.addLayout(logo_layout)
+        self.logo_label = QLabel("未选择Logo（使用文字水印）")
+        watermark_layout.addWidget(self.logo_label)
+        logo_scale_layout = QHBoxLayout()
+        logo_scale_layout.addWidget(QLabel("Logo宽度（占图片宽度%）"))
+        self.logo_scale_spin = QSpinBox()
+        self.logo_scale_spin.setRange(1, 100)
+        self.logo_scale_spin.setValue(20)
+        logo_scale_layout.addWidget(self.logo_scale_spin)
+        watermark_layout.addLayout(logo_scale_layout)
+
         # Layout settings
         label_layout_style = QLabel("布局与样式")
         label_layout_style.setStyleSheet("font-weight: bold; margin-top: 10px;")
@@ -80,7 +107,7 @@ class Ui_MainWindow(object):
         self.position_combo = QComboBox()
         positions = ["左上", "中上", "右上",
                      "左中", "中", "右中",
-                     "左下", "中下", "右下"]
+                     "左下", "中下", "右下", "平铺"]
         self.position_combo.addItems(positions)
         watermark_layout.addWidget(self.position_combo)
 
@@ -132,6 +159,46 @@ class Ui_MainWindow(object):
         naming_layout.addWidget(QLabel(".jpg"))
         export_layout.addLayout(naming_layout)
 
+        format_layout = QHBoxLayout()
+        format_layout.addWidget(QLabel("格式"))
+        self.format_combo = QComboBox()
+        for text, value in [("原格式", ""), ("JPEG", "jpeg"), ("PNG", "png"), ("WebP", "webp"), ("AVIF", "avif")]:
+            self.format_combo.addItem(text, value)
+        format_layout.addWidget(self.format_combo)
+        format_layout.addWidget(QLabel("质量"))
+        self.quality_spin = QSpinBox()
+        self.quality_spin.setRange(0, 100)
+        self.quality_spin.setSpecialValueText("默认")
+        format_layout.addWidget(self.quality_spin)
+        export_layout.addLayout(format_layout)
+
+        jpeg_layout = QHBoxLayout()
+        self.progressive_checkbox = QCheckBox("渐进式JPEG")
+        jpeg_layout.addWidget(self.progressive_checkbox)
+        jpeg_layout.addWidget(QLabel("色度采样"))
+        self.subsampling_combo = QComboBox()
+        for text, value in [("默认", ""), ("4:4:4", "444"), ("4:2:2", "422"), ("4:2:0", "420")]:
+            self.subsampling_combo.addItem(text, value)
+        jpeg_layout.addWidget(self.subsampling_combo)
+        export_layout.addLayout(jpeg_layout)
+
+        encoder_layout = QHBoxLayout()
+        encoder_layout.addWidget(QLabel("编码器"))
+        self.encoder_combo = QComboBox()  # filled with the installed backends by the app
+        encoder_layout.addWidget(self.encoder_combo)
+        export_layout.addLayout(encoder_layout)
+
+        workers_layout = QHBoxLayout()
+        workers_layout.addWidget(QLabel("导出线程数"))
+        self.export_workers_spin = QSpinBox()
+        self.export_workers_spin.setRange(1, 64)
+        workers_layout.addWidget(self.export_workers_spin)
+        export_layout.addLayout(workers_layout)
+
+        self.skip_unchanged_checkbox = QCheckBox("跳过未更改的图片")
+        self.skip_unchanged_checkbox.setToolTip("源图片和水印设置都没有变化时不再重新导出")
+        export_layout.addWidget(self.skip_unchanged_checkbox)
+
         self.export_button = QPushButton("全部导出")
         export_layout.addWidget(self.export_button)
         
@@ -0,0 +1,112 @@
+import os
+import time
+
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+from PyQt5.QtGui import QImage
+
+from qt_images import ndarray_to_qimage
+from watermark_core.engine import export_file_with_digest
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+SKIPPED = "skipped"  # ExportTask result when the manifest says the output is up to date
+
+
+class FolderScanSignals(QObject):
+    # Both carry the scan's cancel event, which identifies the scan they belong to.
+    found = pyqtSignal(object, list)      # a batch of image paths
+    finished = pyqtSignal(object, bool)   # True if the scan was cancelled
+
+
+class FolderScanTask(QRunnable):
+    """Walks a folder off the UI thread and reports image paths in small batches."""
+
+    BATCH_SIZE = 64
+    BATCH_INTERVAL = 0.1  # seconds; keeps the list filling up even in slow directories
+
+    def __init__(self, folder, cancel_event, signals):
+        super().__init__()
+        self.folder = folder
+        self.cancel_event = cancel_event
+        self.signals = signals
+
+    def run(self):
+        batch = []
+        last_emit = time.monotonic()
+        for root, dirs, files in os.walk(self.folder):
+            if self.cancel_event.is_set():
+                break
+            dirs.sort()
+            for file_name in sorted(files):
+                if file_name.lower().endswith(IMAGE_EXTENSIONS):
+                    batch.append(os.path.join(root, file_name))
+                if batch and (len(batch) >= self.BATCH_SIZE or time.monotonic() - last_emit >= self.BATCH_INTERVAL):
+                    self.signals.found.emit(self.cancel_event, batch)
+                    batch = []
+                    last_emit = time.monotonic()
+        if batch and not self.cancel_event.is_set():
+            self.signals.found.emit(self.cancel_event, batch)
+        self.signals.finished.emit(self.cancel_event, self.cancel_event.is_set())
+
+
+class ThumbnailSignals(QObject):
+    loaded = pyqtSignal(str, QImage)
+
+
+class ThumbnailTask(QRunnable):
+    """Loads one list thumbnail through the thumbnail cache, off the UI thread."""
+
+    def __init__(self, cache, file_path, size, cancel_event, signals):
+        super().__init__()
+        self.cache = cache
+        self.file_path = file_path
+        self.size = size
+        self.cancel_event = cancel_event
+        self.signals = signals
+
+    def run(self):
+        if self.cancel_event.is_set():
+            return
+        try:
+            thumbnail = self.cache.load(self.file_path, self.size, self.size)
+        except OSError:
+            thumbnail = None
+        if thumbnail is not None and not self.cancel_event.is_set():
+            # QImage (unlike QPixmap) may be created outside the GUI thread.
+            self.signals.loaded.emit(self.file_path, ndarray_to_qimage(thumbnail))
+
+
+class ExportSignals(QObject):
+    finished = pyqtSignal(str, str, str)  # source, destination, error ("" on success)
+
+
+class ExportTask(QRunnable):
+    """Renders and saves one watermarked image with the shared export engine.
+
+    With a manifest the task first checks whether the output is still up to
+    date and records the export once the file is written.
+    """
+
+    def __init__(self, source, destination, template, cancel_event, signals, manifest=None, settings=None,
+                 encode_options=None):
+        super().__init__()
+        self.source = source
+        self.destination = destination
+        self.template = template
+        self.cancel_event = cancel_event
+        self.signals = signals
+        self.manifest = manifest
+        self.settings = settings
+        self.encode_options = encode_options
+
+    def run(self):
+        if self.manifest is not None and self.manifest.is_current(self.source, self.settings, self.destination):
+            error = SKIPPED
+        else:
+            error, sha1 = export_file_with_digest(self.source, self.destination, self.template, self.cancel_event,
+                                                  encode_options=self.encode_options)
+            if not error and self.manifest is not None:
+                try:
+                    self.manifest.record(self.source, self.destination, self.settings, sha1)
+                except OSError:
+                    pass  # the image itself was saved; it is just exported again next time
+        self.signals.finished.emit(self.source, self.destination, error)
@@ -0,0 +1,113 @@
+"""Applies a watermark template saved by the desktop app to many images.
+
+Example:
+    python apply_template.py brand.ini photos/ "shots/**/*.jpg" -o out/ --workers 8
+
+The template is an .ini written by "保存模板" in Photo Watermark 2. Images are
+rendered by the same engine as the app's export, in a process pool and
+without a display. Output names follow the template's prefix and suffix like
+the app does; ``--format``, ``--quality`` and the other encoder options work
+as in batch.py. As in the app, a manifest in the output folder makes re-runs
+skip images whose source, template and output did not change (``--force``
+renders them anyway). Progress goes to stdout as one JSON object per line:
+
+    {"event": "start", "total": 120, "skipped": 80, "workers": 8, ...}
+    {"event": "file", "index": 1, "source": ..., "destination": ..., "ok": true, "error": null}
+    {"event": "summary", "ok": 39, "failed": 1, "skipped": 80, "elapsed": 12.3, "images_per_second": 3.3}
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from PyQt5.QtCore import QSettings
+
+from batch import add_encoder_arguments, encode_options_from_args, iter_image_paths
+from watermark_core.encoders import FORMATS
+from watermark_core.engine import WatermarkTemplate, ensure_app, export_files
+from watermark_core.manifest import ExportManifest, fingerprint
+
+
+def output_path(image_path, output_dir, prefix, suffix, reserved, ext=None):
+    """Names the output like the app's export; (N) is appended if two inputs would collide."""
+    name, source_ext = os.path.splitext(os.path.basename(image_path))
+    ext = ext or source_ext
+    path = os.path.join(output_dir, f"{prefix}{name}{suffix}{ext}")
+    counter = 1
+    while path in reserved:
+        path = os.path.join(output_dir, f"{prefix}{name}{suffix}({counter}){ext}")
+        counter += 1
+    reserved.add(path)
+    return path
+
+
+def emit(event, **fields):
+    print(json.dumps({"event": event, **fields}, ensure_ascii=False), flush=True)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Watermark many images with a template saved by the desktop app.")
+    parser.add_argument('template', help="template .ini saved by Photo Watermark 2")
+    parser.add_argument('inputs', nargs='+', help="image files, directories or glob patterns (quote them)")
+    parser.add_argument('-o', '--output', required=True, help="output folder")
+    parser.add_argument('--prefix', default=None, help="file name prefix (default: the template's)")
+    parser.add_argument('--suffix', default=None, help="file name suffix (default: the template's)")
+    parser.add_argument('--force', action='store_true', help="re-render images the manifest lists as unchanged")
+    add_encoder_arguments(parser)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes (default: CPU count)")
+    parser.add_argument('--max-in-flight', type=int, default=None,
+                        help="maximum jobs queued to the pool at once (default: 2 x workers)")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not os.path.isfile(args.template):
+        parser.error(f"template not found: {args.template}")
+
+    ensure_app()  # QSettings needs QtGui to read the stored font and color
+    settings = QSettings(args.template, QSettings.IniFormat)
+    template = WatermarkTemplate.from_settings(settings)
+    prefix = args.prefix if args.prefix is not None else settings.value("file_naming_prefix", "")
+    suffix = args.suffix if args.suffix is not None else settings.value("file_naming_suffix", "")
+
+    image_paths = list(iter_image_paths(args.inputs))
+    os.makedirs(args.output, exist_ok=True)
+    manifest = ExportManifest(args.output)
+    encode_options = encode_options_from_args(parser, args)
+    template_key = fingerprint(template.as_dict(), *([encode_options.as_dict()] if encode_options else []))
+    reserved = set()
+    jobs = []
+    skipped = 0
+    for path in image_paths:
+        destination = output_path(path, args.output, prefix, suffix, reserved, FORMATS.get(args.format))
+        if not args.force and manifest.is_current(path, template_key, destination):
+            skipped += 1
+        else:
+            jobs.append((path, destination, template, None, encode_options))
+
+    emit("start", template=args.template, total=len(jobs), skipped=skipped, workers=args.workers,
+         output=args.output)
+    start = time.perf_counter()
+    succeeded = failed = 0
+    for index, (job, error, sha1) in enumerate(export_files(jobs, args.workers, args.max_in_flight), 1):
+        if error:
+            failed += 1
+        else:
+            succeeded += 1
+            manifest.record(job[0], job[1], template_key, sha1)
+        emit("file", index=index, total=len(jobs), source=job[0], destination=job[1],
+             ok=not error, error=error or None)
+    manifest.close()
+
+    elapsed = time.perf_counter() - start
+    emit("summary", ok=succeeded, failed=failed, skipped=skipped, elapsed=round(elapsed, 3),
+         images_per_second=round(len(jobs) / elapsed, 2) if elapsed > 0 else None)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,331 @@
+"""Non-interactive batch mode for watermark.py.
+
+Example:
+    python batch.py photos/ "shots/**/*.jpg" --font-size 30 --position center --workers 8
+
+Every input gets the same font size, color and position, or the same PNG
+logo with ``--logo`` (sized relative to each image). ``--format``,
+``--quality``, ``--progressive``, ``--subsampling`` and ``--encoder`` control
+the output encoding (see watermark_core.encoders). Files are written to
+the ``save/`` folder next to each source image, using the same ``name(N).ext``
+naming as the interactive mode. A manifest in each ``save/`` folder records
+finished exports; images that did not change since are skipped on the next
+run (``--force`` renders them anyway) and changed ones overwrite their old
+output.
+"""
+import argparse
+import glob
+import os
+import time
+from datetime import datetime
+
+from watermark import (
+    LOGO_SCALE, POSITIONS, add_watermark, add_watermark_region, exif_value_to_date, get_output_path
+)
+from watermark_core.encoders import BACKENDS, FORMATS, SUBSAMPLINGS, EncodeOptions, available_backends, format_for
+from watermark_core.exif import read_exif_date
+from watermark_core.loader import load_image
+from watermark_core.manifest import ExportManifest, file_digest, fingerprint
+from watermark_core.pool import run_jobs
+from watermark_core.streaming import estimate_decoded_bytes
+
+JPEG_MODES = ['full', 'lossless-region']
+RENDERERS = ['opencv', 'qt']
+# --renderer qt draws with the desktop app's engine, which names positions in Chinese.
+QT_POSITIONS = {'top-left': '左上', 'center': '中', 'bottom-right': '右下', 'tile': '平铺'}
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
+
+
+def iter_image_paths(patterns):
+    """Expands directories and glob patterns into image paths, without duplicates.
+
+    Directories are walked recursively. Files inside ``save`` folders are skipped
+    (unless named explicitly) so a run never watermarks its own output.
+    """
+    seen = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            candidates = []
+            for root, dirs, files in os.walk(pattern):
+                dirs[:] = sorted(d for d in dirs if d != 'save')
+                candidates.extend(os.path.join(root, f) for f in sorted(files))
+        elif glob.has_magic(pattern):
+            candidates = [p for p in sorted(glob.glob(pattern, recursive=True))
+                          if os.path.basename(os.path.dirname(p)) != 'save']
+        else:
+            candidates = [pattern]
+
+        for path in candidates:
+            if not path.lower().endswith(IMAGE_EXTENSIONS) or not os.path.isfile(path):
+                continue
+            key = os.path.abspath(path)
+            if key not in seen:
+                seen.add(key)
+                yield path
+
+
+def today():
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def watermark_text(exif_date):
+    return exif_value_to_date(exif_date) if exif_date else today()
+
+
+def qt_template(text, font_size, color, position, opacity=1.0, rotation=0, logo=None, logo_scale=LOGO_SCALE):
+    """Builds the desktop app's watermark template; ``font_size`` is taken as a point size."""
+    from PyQt5.QtGui import QFont
+    from watermark_core.engine import WatermarkTemplate
+
+    blue, green, red = color
+    return WatermarkTemplate(text=text, font=QFont("Arial", font_size).toString(),
+                             color=f"#ff{red:02x}{green:02x}{blue:02x}", opacity=opacity, rotation=rotation,
+                             position=QT_POSITIONS[position], logo=logo or "", logo_scale=logo_scale)
+
+
+def process_image(image_path, output_path, font_size, color, position, jpeg_mode='full', renderer='opencv',
+                  opacity=1.0, rotation=0, logo=None, logo_scale=LOGO_SCALE, encode_options=None,
+                  memory_budget=None):
+    """Worker entry point: loads the file once, then writes one watermarked file.
+
+    With ``jpeg_mode='lossless-region'`` JPEGs are first tried through
+    add_watermark_region, which never decodes the full frame. With
+    ``renderer='qt'`` the file is drawn by watermark_core.engine instead, so it
+    looks exactly like an export from the desktop app. ``encode_options``
+    apply to full re-encodes; the region path keeps the source's encoding.
+    Either way the source's EXIF, XMP and ICC metadata are kept.
+
+    Images whose full decode would take more than ``memory_budget`` bytes
+    always go through the region path (JPEG, uncompressed TIFF) and fail if
+    it does not apply, rather than being decoded.
+
+    Returns ``(ok, seconds, EXIF bytes read, source SHA-1, fallback date)``.
+    The hash comes from the bytes the worker already read, for the export
+    manifest. The fallback date is the text drawn when the image has no EXIF
+    date (today's date), else None.
+    """
+    start = time.perf_counter()
+    if renderer == 'qt':
+        from watermark_core.engine import ensure_app, export_file_with_digest
+
+        ensure_app()
+        exif_date, exif_bytes = read_exif_date(image_path)
+        text = watermark_text(exif_date)
+        template = qt_template(text, font_size, color, position, opacity, rotation, logo, logo_scale)
+        error, sha1 = export_file_with_digest(image_path, output_path, template, memory_budget=memory_budget,
+                                              encode_options=encode_options)
+        if error:
+            raise ValueError(error)
+        return True, time.perf_counter() - start, exif_bytes, sha1, None if exif_date else text
+
+    decoded_bytes = estimate_decoded_bytes(image_path) if memory_budget else None
+    over_budget = decoded_bytes is not None and decoded_bytes > memory_budget
+    if over_budget or (jpeg_mode == 'lossless-region' and image_path.lower().endswith(('.jpg', '.jpeg'))):
+        exif_date, exif_bytes = read_exif_date(image_path)
+        text = watermark_text(exif_date)
+        if add_watermark_region(image_path, output_path, text, font_size, color, position,
+                                verbose=False, opacity=opacity, rotation=rotation, logo=logo, logo_scale=logo_scale):
+            # The region path reads only part of the file, so hash it here rather than in the parent.
+            return (True, time.perf_counter() - start, exif_bytes, file_digest(image_path),
+                    None if exif_date else text)
+    if over_budget:
+        raise ValueError(f"decoding needs about {decoded_bytes / 2**20:.0f} MB, over the "
+                          f"{memory_budget / 2**20:.0f} MB memory budget, and the file cannot be streamed")
+
+    loaded = load_image(image_path, digest=True)
+    if loaded.pixels is None:
+        raise ValueError("could not decode image")
+    text = watermark_text(loaded.exif_date)
+    ok = add_watermark(image_path, output_path, text, font_size, color, position,
+                       verbose=False, img=loaded.pixels, opacity=opacity, rotation=rotation, logo=logo,
+                       logo_scale=logo_scale, encode_options=encode_options, metadata=loaded.metadata)
+    return ok, time.perf_counter() - start, loaded.exif_bytes_read, loaded.sha1, None if loaded.exif_date else text
+
+
+def parse_color(value):
+    try:
+        color = tuple(int(c) for c in value.split(','))
+    except ValueError:
+        color = ()
+    if len(color) != 3:
+        raise argparse.ArgumentTypeError("color must be three numbers B,G,R (e.g. 255,255,255)")
+    return color
+
+
+def parse_opacity(value):
+    try:
+        opacity = float(value)
+    except ValueError:
+        opacity = -1.0
+    if not 0.0 <= opacity <= 1.0:
+        raise argparse.ArgumentTypeError("opacity must be a number from 0 to 1")
+    return opacity
+
+
+def parse_quality(value):
+    try:
+        quality = int(value)
+    except ValueError:
+        quality = 0
+    if not 1 <= quality <= 100:
+        raise argparse.ArgumentTypeError("quality must be a whole number from 1 to 100")
+    return quality
+
+
+def add_encoder_arguments(parser):
+    """Adds the output encoding options shared by the batch front ends."""
+    parser.add_argument('--format', choices=list(FORMATS), default=None,
+                        help="output format (default: same as the input)")
+    parser.add_argument('--quality', type=parse_quality, default=None,
+                        help="JPEG/WebP/AVIF quality 1-100 (default: 95 for JPEG and AVIF, lossless WebP)")
+    parser.add_argument('--progressive', action='store_true', help="write progressive JPEGs")
+    parser.add_argument('--subsampling', choices=SUBSAMPLINGS, default=None,
+                        help="JPEG chroma subsampling (default: the encoder's)")
+    parser.add_argument('--optimize', action='store_true', help="optimize JPEG Huffman tables")
+    parser.add_argument('--encoder', choices=BACKENDS, default='opencv',
+                        help="encoding library; pillow and simplejpeg use libjpeg-turbo when installed with it "
+                             "(default: opencv)")
+
+
+def encode_options_from_args(parser, args):
+    """The EncodeOptions asked for on the command line, or None to keep the plain default encoding."""
+    if args.encoder not in available_backends():
+        parser.error(f"encoder not installed: {args.encoder}")
+    options = EncodeOptions(format=args.format, quality=args.quality, progressive=args.progressive,
+                            subsampling=args.subsampling, optimize=args.optimize, backend=args.encoder)
+    return None if options.as_dict() == EncodeOptions().as_dict() else options
+
+
+def job_memory(job):
+    """Scheduling cost of a ``process_image`` job: its estimated decoded size in bytes.
+
+    Images over the job's own budget are streamed or rejected without being
+    decoded, so they cost next to nothing; so do files whose header cannot be
+    read, which fail on load.
+    """
+    image_path, memory_budget = job[0], job[-1]
+    decoded_bytes = estimate_decoded_bytes(image_path)
+    if decoded_bytes is None or (memory_budget and decoded_bytes > memory_budget):
+        return 0
+    return decoded_bytes
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Watermark many images with their EXIF capture date.")
+    parser.add_argument('inputs', nargs='+', help="image files, directories or glob patterns (quote them)")
+    parser.add_argument('--font-size', type=int, default=20, help="font size (default: 20)")
+    parser.add_argument('--color', type=parse_color, default=(255, 255, 255), help="B,G,R (default: 255,255,255)")
+    parser.add_argument('--position', choices=POSITIONS, default='bottom-right')
+    parser.add_argument('--opacity', type=parse_opacity, default=1.0, help="0 (invisible) to 1 (opaque, default)")
+    parser.add_argument('--rotation', type=int, default=0, help="degrees clockwise (default: 0)")
+    parser.add_argument('--logo', default=None, metavar='PNG',
+                        help="stamp this image (e.g. a PNG with transparency) instead of the date text")
+    parser.add_argument('--logo-scale', type=float, default=LOGO_SCALE,
+                        help=f"logo width as a fraction of the image width (default: {LOGO_SCALE})")
+    add_encoder_arguments(parser)
+    parser.add_argument('--jpeg-mode', choices=JPEG_MODES, default='full',
+                        help="'lossless-region' re-encodes only the JPEG blocks under the watermark "
+                             "(needs jpegtran with -drop; other files fall back to 'full')")
+    parser.add_argument('--renderer', choices=RENDERERS, default='opencv',
+                        help="'qt' renders like the desktop app (needs PyQt5, no display; "
+                             "--font-size is then a point size and --jpeg-mode is ignored)")
+    parser.add_argument('--force', action='store_true',
+                        help="re-render images the save/ folder's manifest lists as unchanged")
+    parser.add_argument('--memory-budget', type=int, default=None, metavar='MB',
+                        help="total decoded size of the images being processed at once; larger images "
+                             "start first, and an image over the budget by itself is streamed (JPEG with "
+                             "jpegtran, uncompressed TIFF) or fails instead of being decoded (default: no limit)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes (default: CPU count)")
+    parser.add_argument('--max-in-flight', type=int, default=None,
+                        help="maximum jobs queued to the pool at once (default: 2 x workers)")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.logo and not os.path.isfile(args.logo):
+        parser.error(f"logo not found: {args.logo}")
+    if not 0 < args.logo_scale <= 1:
+        parser.error("--logo-scale must be greater than 0 and at most 1")
+    encode_options = encode_options_from_args(parser, args)
+
+    memory_budget = args.memory_budget * 2**20 if args.memory_budget else None
+    reserved = set()
+    # Each save/ folder keeps a manifest of finished exports, so unchanged images are skipped next time.
+    manifests = {}
+    # A replaced logo file invalidates earlier exports.
+    logo = [os.path.abspath(args.logo), file_digest(args.logo), args.logo_scale] if args.logo else None
+    settings = fingerprint(args.font_size, args.color, args.position, args.opacity, args.rotation, args.jpeg_mode,
+                           args.renderer, *([logo] if logo else []),
+                           *([encode_options.as_dict()] if encode_options else []))
+    # Images without an EXIF date are stamped with the day they are rendered, so their
+    # entries carry that date and go stale the next day.
+    today_settings = fingerprint(settings, today())
+    skipped = 0
+
+    def manifest_for(save_dir):
+        save_dir = os.path.abspath(save_dir)
+        if save_dir not in manifests:
+            manifests[save_dir] = ExportManifest(save_dir)
+        return manifests[save_dir]
+
+    def jobs():
+        nonlocal skipped
+        for image_path in iter_image_paths(args.inputs):
+            manifest = manifest_for(os.path.join(os.path.dirname(image_path), 'save'))
+            if not args.force and (manifest.is_current(image_path, settings)
+                                   or manifest.is_current(image_path, today_settings)):
+                skipped += 1
+                print(f"[skip]   {image_path} (unchanged)")
+                continue
+            # A changed image replaces its previous output instead of getting a new name(N),
+            # unless the output format changed.
+            output_format = args.format or format_for(image_path)
+            output_path = manifest.destination(image_path)
+            if output_path is None or format_for(output_path) != output_format:
+                output_path = get_output_path(image_path, reserved, FORMATS.get(args.format))
+            reserved.add(output_path)
+            yield (image_path, output_path, args.font_size, args.color, args.position, args.jpeg_mode,
+                   args.renderer, args.opacity, args.rotation, args.logo, args.logo_scale, encode_options,
+                   memory_budget)
+
+    start = time.perf_counter()
+    succeeded, failed = 0, []
+    input_bytes = exif_bytes_total = 0
+
+    for job, result, error in run_jobs(jobs(), process_image, args.workers, args.max_in_flight,
+                                       cost=job_memory, memory_budget=memory_budget):
+        image_path, output_path = job[0], job[1]
+        ok, elapsed, exif_bytes, sha1, fallback_date = result if result else (False, 0.0, 0, None, None)
+        if ok:
+            succeeded += 1
+            input_bytes += os.path.getsize(image_path)
+            exif_bytes_total += exif_bytes
+            entry_settings = fingerprint(settings, fallback_date) if fallback_date else settings
+            manifest_for(os.path.dirname(output_path)).record(image_path, output_path, entry_settings, sha1)
+            print(f"[ok]     {image_path} -> {output_path} ({elapsed * 1000:.0f} ms, EXIF {exif_bytes} B read)")
+        else:
+            failed.append((image_path, error))
+            print(f"[failed] {image_path}" + (f": {error}" if error else ""))
+    for manifest in manifests.values():
+        manifest.close()
+
+    total_time = time.perf_counter() - start
+    total = succeeded + len(failed)
+    print()
+    print(f"Processed {total} image(s) in {total_time:.2f} s with {args.workers} worker(s): "
+          f"{succeeded} ok, {len(failed)} failed, {skipped} skipped (unchanged).")
+    if total_time > 0 and total:
+        print(f"Throughput: {total / total_time:.2f} images/s, {input_bytes / total_time / 2**20:.2f} MB/s read.")
+    if succeeded:
+        print(f"EXIF header reads: {exif_bytes_total / succeeded:.0f} bytes per file on average.")
+    for image_path, error in failed:
+        print(f"  failed: {image_path}" + (f" ({error})" if error else ""))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,55 +1,179 @@
 import cv2
 import os
-from PIL import Image
-from PIL.ExifTags import TAGS
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from watermark_core.encoders import format_for, write_image
+from watermark_core.exif import read_exif_date
+from watermark_core.loader import load_image
+from watermark_core.stamp import composite, composite_tiled, logo_stamp, text_stamp
+from watermark_core.streaming import open_region_source
+
+POSITIONS = ['top-left', 'center', 'bottom-right', 'tile']
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+THICKNESS = 2
+# Default logo width as a fraction of the image width.
+LOGO_SCALE = 0.2
+
+def exif_value_to_date(value):
+    """Turns an EXIF "YYYY:MM:DD HH:MM:SS" value into "YYYY-MM-DD"."""
+    return value.split(' ')[0].replace(':', '-')
+
 def get_exif_date(image_path):
     """Extracts the capture date from the image's EXIF data."""
     try:
-        img = Image.open(image_path)
-        exif_data = img._getexif()
-        if exif_data:
-            for tag, value in exif_data.items():
-                tag_name = TAGS.get(tag, tag)
-                if tag_name == 'DateTimeOriginal':
-                    return value.split(' ')[0].replace(':', '-')
+        value, _ = read_exif_date(image_path)
+        if value:
+            return exif_value_to_date(value)
     except Exception as e:
         print(f"Error reading EXIF data: {e}")
     return None
 
-def add_watermark(image_path, output_path, text, font_size, color, position):
-    """Adds a text watermark to an image."""
+def get_text_layout(w, h, text, font_size, position):
+    """Returns the putText origin and the (x0, y0, x1, y1) box the text covers.
+
+    Returns None for an unknown position and for 'tile', which has no single origin.
+    """
+    text_size, baseline = cv2.getTextSize(text, FONT, font_size / 20.0, THICKNESS)
+    text_w, text_h = text_size
+
+    if position == 'top-left':
+        pos = (10, text_h + 10)
+    elif position == 'center':
+        pos = ((w - text_w) // 2, (h + text_h) // 2)
+    elif position == 'bottom-right':
+        pos = (w - text_w - 10, h - 10)
+    else:
+        return None
+
+    box = (pos[0] - THICKNESS, pos[1] - text_h - THICKNESS,
+           pos[0] + text_w + THICKNESS, pos[1] + baseline + THICKNESS)
+    return pos, box
+
+def get_stamp(text, font_size, color, opacity=1.0, rotation=0):
+    """The cached, pre-rendered watermark for these settings."""
+    return text_stamp(text, font_size / 20.0, tuple(color), opacity, rotation, FONT, THICKNESS)
+
+def get_logo_stamp(logo_path, image_width, logo_scale=LOGO_SCALE, opacity=1.0, rotation=0):
+    """The cached logo, ``logo_scale`` times as wide as the image."""
+    return logo_stamp(logo_path, max(1, round(image_width * logo_scale)), opacity, rotation)
+
+def get_logo_origin(w, h, stamp, position):
+    """Returns the top-left corner of a logo stamp, or None for an unknown position or 'tile'."""
+    logo_w, logo_h = stamp.size
+    if position == 'top-left':
+        return 10, 10
+    if position == 'center':
+        return (w - logo_w) // 2, (h - logo_h) // 2
+    if position == 'bottom-right':
+        return w - logo_w - 10, h - logo_h - 10
+    return None
+
+def get_watermark(w, h, text, font_size, color, position, opacity=1.0, rotation=0, logo=None,
+                  logo_scale=LOGO_SCALE):
+    """Returns ``(stamp, origin)`` for a ``w`` x ``h`` image: the logo if one is given, else the text.
+
+    ``origin`` is None for the 'tile' position and for unknown positions.
+    """
+    if logo:
+        stamp = get_logo_stamp(logo, w, logo_scale, opacity, rotation)
+        return stamp, get_logo_origin(w, h, stamp, position)
+    layout = get_text_layout(w, h, text, font_size, position)
+    return get_stamp(text, font_size, color, opacity, rotation), layout[0] if layout else None
+
+def add_watermark(image_path, output_path, text, font_size, color, position, verbose=True, img=None,
+                  opacity=1.0, rotation=0, logo=None, logo_scale=LOGO_SCALE, encode_options=None, metadata=None):
+    """Adds a text watermark to an image.
+
+    Pass the already decoded pixels as ``img`` to skip reading ``image_path`` again.
+    ``opacity`` (0-1) and ``rotation`` (degrees clockwise) default to plain opaque text.
+    Position 'tile' repeats the text over the whole image, ``font_size`` pixels apart.
+    With ``logo`` (a PNG path) that image is stamped instead of the text,
+    ``logo_scale`` times as wide as the image. ``encode_options`` (see
+    watermark_core.encoders) set the encoder; the format follows ``output_path``.
+    ``metadata`` (the loaded image's ImageMetadata) is copied into the output.
+    """
     try:
-        img = cv2.imread(image_path)
+        if img is None:
+            img = cv2.imread(image_path)
         if img is None:
             print(f"Error: Could not read image from {image_path}")
-            return
-
-        h, w, _ = img.shape
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        font_scale = font_size / 20.0
-        thickness = 2
-
-        text_size, _ = cv2.getTextSize(text, font, font_scale, thickness)
-        text_w, text_h = text_size
-
-        if position == 'top-left':
-            pos = (10, text_h + 10)
-        elif position == 'center':
-            pos = ((w - text_w) // 2, (h + text_h) // 2)
-        elif position == 'bottom-right':
-            pos = (w - text_w - 10, h - 10)
-        else:
+            return False
+
+        h, w = img.shape[:2]
+        stamp, pos = get_watermark(w, h, text, font_size, color, position, opacity, rotation, logo, logo_scale)
+        if position == 'tile':
+            composite_tiled(img, stamp, stamp.size[1] // 2 if logo else font_size)
+        elif pos is None:
             print("Error: Invalid position specified.")
-            return
+            return False
+        else:
+            composite(img, stamp, pos)
 
-        cv2.putText(img, text, pos, font, font_scale, color, thickness, cv2.LINE_AA)
-        
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        cv2.imwrite(output_path, img)
-        print(f"Watermarked image saved to {output_path}")
+        if not write_image(output_path, img, encode_options, metadata):
+            print(f"Error: Could not write image to {output_path}")
+            return False
+        if verbose:
+            print(f"Watermarked image saved to {output_path}")
+        return True
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+    return False
+
+def add_watermark_region(image_path, output_path, text, font_size, color, position, verbose=True,
+                         opacity=1.0, rotation=0, logo=None, logo_scale=LOGO_SCALE):
+    """Adds a text watermark by rewriting only the part of the file under the text.
+
+    JPEGs re-encode just the blocks under the text; uncompressed TIFFs are
+    copied and only the rows under the text are redrawn. Neither decodes the
+    full frame. Returns False without writing anything when this does not
+    apply (other formats, no jpegtran with -drop, rotated photo, the 'tile'
+    position, an output in another format, ...), so the
+    caller can fall back to add_watermark.
+    """
+    try:
+        if format_for(output_path) != format_for(image_path):
+            return False
+        source = open_region_source(image_path)
+        if source is None:
+            return False
+        stamp, pos = get_watermark(source.width, source.height, text, font_size, color, position, opacity,
+                                   rotation, logo, logo_scale)
+        if pos is None:
+            return False
+
+        def draw(patch, x0, y0):
+            composite(patch, stamp, (pos[0] - x0, pos[1] - y0))
+
+        if not source.rewrite(output_path, stamp.box(pos), draw):
+            return False
+        if verbose:
+            print(f"Watermarked image saved to {output_path}")
+        return True
 
     except Exception as e:
         print(f"An error occurred: {e}")
+    return False
+
+def get_output_path(image_path, reserved=None, ext=None):
+    """Returns a free path in the image's save/ folder, appending (N) on collisions.
+
+    Paths in ``reserved`` are treated as taken even if they do not exist yet,
+    so a batch can hand out names before any worker has written its file.
+    ``ext`` replaces the source's extension, e.g. when converting to WebP.
+    """
+    save_dir = os.path.join(os.path.dirname(image_path), 'save')
+    file_name_base, file_ext = os.path.splitext(os.path.basename(image_path))
+    file_ext = ext or file_ext
+    output_image_path = os.path.join(save_dir, f"{file_name_base}{file_ext}")
+
+    counter = 1
+    while os.path.exists(output_image_path) or (reserved is not None and output_image_path in reserved):
+        output_image_path = os.path.join(save_dir, f"{file_name_base}({counter}){file_ext}")
+        counter += 1
+    return output_image_path
 
 def main():
     # Get image path from user
@@ -82,36 +206,34 @@ def main():
             print("Invalid format. Please enter three numbers separated by commas (e.g., 255,0,0).")
 
     # Get position
-    positions = ['top-left', 'center', 'bottom-right']
     while True:
-        position = input(f"Enter position ({'/'.join(positions)}, default: bottom-right): ")
+        position = input(f"Enter position ({'/'.join(POSITIONS)}, default: bottom-right): ")
         if not position:
             position = 'bottom-right'
             break
-        if position in positions:
+        if position in POSITIONS:
             break
         else:
-            print(f"Invalid position. Please choose one of: {', '.join(positions)}")
+            print(f"Invalid position. Please choose one of: {', '.join(POSITIONS)}")
 
+    try:
+        loaded = load_image(image_path)
+    except OSError as e:
+        print(f"Error: Could not read image from {image_path}: {e}")
+        return
+    if loaded.pixels is None:
+        print(f"Error: Could not read image from {image_path}")
+        return
 
-    image_dir = os.path.dirname(image_path)
-    save_dir = os.path.join(image_dir, 'save')
-
-    watermark_text = get_exif_date(image_path)
+    watermark_text = exif_value_to_date(loaded.exif_date) if loaded.exif_date else None
     if not watermark_text:
         print("Could not find date information in EXIF data. Using current date.")
         from datetime import datetime
         watermark_text = datetime.now().strftime("%Y-%m-%d")
 
-    file_name_base, file_ext = os.path.splitext(os.path.basename(image_path))
-    output_image_path = os.path.join(save_dir, f"{file_name_base}{file_ext}")
-    
-    counter = 1
-    while os.path.exists(output_image_path):
-        output_image_path = os.path.join(save_dir, f"{file_name_base}({counter}){file_ext}")
-        counter += 1
-    
-    add_watermark(image_path, output_image_path, watermark_text, font_size, color, position)
+    output_image_path = get_output_path(image_path)
+    add_watermark(image_path, output_image_path, watermark_text, font_size, color, position, img=loaded.pixels,
+                  metadata=loaded.metadata)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1 @@
+"""Image helpers shared by the watermark command line tool and the desktop app."""
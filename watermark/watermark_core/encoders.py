@@ -0,0 +1,170 @@
+"""Output encoding: format, encoder parameters and the library that encodes.
+
+Both front ends write files through :func:`write_image`. Without options it
+is exactly ``cv2.imwrite``. :class:`EncodeOptions` picks the format (JPEG,
+PNG, WebP, AVIF, TIFF, BMP), the quality, progressive JPEG and the chroma
+subsampling, and a backend:
+
+    - ``opencv``, always available,
+    - ``pillow``, which is faster for JPEG when built against libjpeg-turbo
+      (Pillow-SIMD even more so), and can write AVIF on Pillow 11.2+,
+    - ``simplejpeg``, a thin libjpeg-turbo binding, JPEG only.
+
+Options a backend cannot honour raise ValueError instead of being dropped.
+Source metadata (see watermark_core.metadata) is spliced into the encoded
+bytes before they are written.
+``benchmarks/bench_encoders.py`` compares size and encode time per setting.
+"""
+import functools
+import importlib.util
+import io
+import os
+
+import cv2
+import numpy as np
+
+from .metadata import EMBED_FORMATS, embed_metadata
+
+# Format name -> extension used for new output files.
+FORMATS = {'jpeg': '.jpg', 'png': '.png', 'webp': '.webp', 'avif': '.avif', 'tiff': '.tif', 'bmp': '.bmp'}
+_EXTENSIONS = {'.jpg': 'jpeg', '.jpeg': 'jpeg', '.png': 'png', '.webp': 'webp', '.avif': 'avif',
+               '.tif': 'tiff', '.tiff': 'tiff', '.bmp': 'bmp'}
+BACKENDS = ['opencv', 'pillow', 'simplejpeg']
+SUBSAMPLINGS = ['444', '422', '420']
+# Quality used when none is given, OpenCV's defaults. WebP without a quality is lossless.
+DEFAULT_QUALITY = {'jpeg': 95, 'avif': 95}
+_NO_ALPHA = ('jpeg', 'bmp')
+
+
+class EncodeOptions:
+    """How to encode an output file; ``None`` values mean the format's defaults."""
+
+    def __init__(self, format=None, quality=None, progressive=False, subsampling=None, optimize=False,
+                 backend='opencv'):
+        self.format = format                # one of FORMATS, or None to keep the destination's extension
+        self.quality = quality              # 1-100 for JPEG, WebP and AVIF
+        self.progressive = progressive      # JPEG only
+        self.subsampling = subsampling      # JPEG chroma subsampling, one of SUBSAMPLINGS
+        self.optimize = optimize            # JPEG Huffman table optimization
+        self.backend = backend              # one of BACKENDS
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def format_for(path):
+    """The format name for ``path``'s extension, or None."""
+    return _EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+def output_path(path, options):
+    """``path`` with the extension of the requested format, if it differs."""
+    if options is None or options.format is None or format_for(path) == options.format:
+        return path
+    return os.path.splitext(path)[0] + FORMATS[options.format]
+
+
+@functools.lru_cache(maxsize=None)
+def available_backends():
+    """The backends whose library is installed."""
+    modules = {'opencv': 'cv2', 'pillow': 'PIL', 'simplejpeg': 'simplejpeg'}
+    return tuple(name for name in BACKENDS if importlib.util.find_spec(modules[name]) is not None)
+
+
+def _encode_opencv(pixels, fmt, options):
+    params = []
+    quality = options.quality or DEFAULT_QUALITY.get(fmt)
+    if fmt == 'jpeg':
+        params += [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_JPEG_PROGRESSIVE, int(options.progressive),
+                   cv2.IMWRITE_JPEG_OPTIMIZE, int(options.optimize)]
+        if options.subsampling:
+            factor = getattr(cv2, f'IMWRITE_JPEG_SAMPLING_FACTOR_{options.subsampling}', None)
+            if factor is None:
+                raise ValueError("this OpenCV build cannot set JPEG chroma subsampling (needs 4.5.5+)")
+            params += [cv2.IMWRITE_JPEG_SAMPLING_FACTOR, factor]
+    elif fmt == 'webp' and options.quality:
+        params += [cv2.IMWRITE_WEBP_QUALITY, quality]
+    elif fmt == 'avif':
+        if not hasattr(cv2, 'IMWRITE_AVIF_QUALITY'):
+            raise ValueError("this OpenCV build cannot write AVIF (needs 4.9+ with libavif)")
+        params += [cv2.IMWRITE_AVIF_QUALITY, quality]
+    try:
+        ok, encoded = cv2.imencode(FORMATS[fmt], pixels, params)
+    except cv2.error as e:
+        raise ValueError(f"OpenCV cannot write {fmt}: {e}") from e
+    if not ok:
+        raise ValueError(f"OpenCV cannot write {fmt}")
+    return encoded.tobytes()
+
+
+def _encode_pillow(pixels, fmt, options):
+    from PIL import Image
+
+    if pixels.dtype != np.uint8:
+        raise ValueError("the pillow backend only writes 8-bit images")
+    if pixels.ndim == 3:
+        pixels = cv2.cvtColor(pixels, cv2.COLOR_BGRA2RGBA if pixels.shape[2] == 4 else cv2.COLOR_BGR2RGB)
+    image = Image.fromarray(pixels)
+    name = {'jpeg': 'JPEG', 'png': 'PNG', 'webp': 'WEBP', 'avif': 'AVIF', 'tiff': 'TIFF', 'bmp': 'BMP'}[fmt]
+    Image.init()
+    if name not in Image.SAVE:
+        raise ValueError(f"this Pillow build cannot write {fmt}")
+
+    params = {}
+    if fmt in DEFAULT_QUALITY:
+        params['quality'] = options.quality or DEFAULT_QUALITY[fmt]
+    elif fmt == 'webp' and options.quality:
+        params['quality'] = options.quality
+    elif fmt == 'webp':
+        params['lossless'] = True
+    if fmt == 'jpeg':
+        params.update(progressive=options.progressive, optimize=options.optimize)
+        if options.subsampling:
+            params['subsampling'] = SUBSAMPLINGS.index(options.subsampling)  # 0 = 4:4:4, 1 = 4:2:2, 2 = 4:2:0
+    buffer = io.BytesIO()
+    image.save(buffer, format=name, **params)
+    return buffer.getvalue()
+
+
+def _encode_simplejpeg(pixels, fmt, options):
+    import simplejpeg
+
+    if fmt != 'jpeg':
+        raise ValueError("the simplejpeg backend only writes JPEG")
+    if pixels.dtype != np.uint8:
+        raise ValueError("the simplejpeg backend only writes 8-bit images")
+    if pixels.ndim == 2:
+        pixels = pixels[..., None]
+    colorspace = {1: 'GRAY', 3: 'BGR', 4: 'BGRA'}[pixels.shape[2]]
+    return simplejpeg.encode_jpeg(np.ascontiguousarray(pixels), quality=options.quality or DEFAULT_QUALITY[fmt],
+                                  colorspace=colorspace, colorsubsampling=options.subsampling or '444',
+                                  progressive=options.progressive)
+
+
+_ENCODERS = {'opencv': _encode_opencv, 'pillow': _encode_pillow, 'simplejpeg': _encode_simplejpeg}
+
+
+def encode(pixels, fmt, options):
+    """Encodes gray, BGR or BGRA ``pixels`` as ``fmt`` and returns the file's bytes."""
+    if fmt not in FORMATS:
+        raise ValueError(f"unsupported output format: {fmt}")
+    if options.backend not in available_backends():
+        raise ValueError(f"encoder backend not available: {options.backend}")
+    if fmt in _NO_ALPHA and pixels.ndim == 3 and pixels.shape[2] == 4:
+        pixels = pixels[..., :3]
+    return _ENCODERS[options.backend](np.ascontiguousarray(pixels), fmt, options)
+
+
+def write_image(path, pixels, options=None, metadata=None):
+    """Writes ``pixels`` to ``path``, formatted as its extension says; returns False on failure.
+
+    Without ``options`` or embeddable ``metadata`` (an ImageMetadata) this is
+    ``cv2.imwrite``. Otherwise encoder errors raise ValueError.
+    """
+    fmt = format_for(path)
+    if options is None and not (metadata and fmt in EMBED_FORMATS):
+        return cv2.imwrite(path, pixels)
+    data = embed_metadata(encode(pixels, fmt, options or EncodeOptions()), fmt, metadata)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return True
@@ -0,0 +1,566 @@
+"""Qt rendering and export of the desktop app's text watermark.
+
+The watermark settings are captured in a :class:`WatermarkTemplate` made of
+plain Python values, so a template can be handed to worker threads and
+copied freely. :func:`paint_watermark` only needs a QPainter and the target
+size, and it works on a QImage in any thread. :func:`text_stamp` renders the
+text on its own so it can be reused while only the opacity, rotation or
+position change. The tiled layout (``TILE_POSITION``) renders its rotated
+text once into a pattern (:func:`tile_image`) that is then repeated with a
+texture brush, so covering a whole photo costs one fill, not a text draw per
+copy. A template with a ``logo`` stamps that image instead of the text, scaled
+relative to the photo's width; scaled logos are cached per target width.
+
+:func:`export_file` and :func:`export_files` render and save whole files
+without any widget. They are used by the desktop app's export workers and by
+the command line (``batch.py --renderer qt``), so servers get exactly the
+GUI's look; without a display Qt runs on the ``offscreen`` platform. Given
+:class:`~watermark_core.encoders.EncodeOptions`, they hand the pixels to
+watermark_core.encoders instead of ``QImage.save``, or, for the ``qt``
+backend, set the quality and progressive mode on a QImageWriter. The
+source's EXIF, XMP and ICC metadata are read from the same bytes Qt decodes
+and spliced into the output (see watermark_core.metadata).
+"""
+import functools
+import hashlib
+import math
+import os
+
+import numpy as np
+from PyQt5.QtCore import QBuffer, QIODevice, QPoint, QPointF, QRect, QRectF, QSize, Qt
+from PyQt5.QtGui import (
+    QBrush, QColor, QColorSpace, QFont, QFontMetrics, QGuiApplication, QImage, QImageReader, QImageWriter,
+    QPainter, QPen, QTransform
+)
+
+from .encoders import FORMATS, EncodeOptions, format_for, write_image
+from .manifest import file_digest
+from .metadata import EMBED_FORMATS, embed_metadata, read_metadata
+from .pool import run_jobs
+from .streaming import open_region_source
+
+# Preset names as shown in the app's position combo box; the last one covers
+# the whole image with copies of the watermark.
+TILE_POSITION = "平铺"
+PRESET_POSITIONS = ["左上", "中上", "右上", "左中", "中", "右中", "左下", "中下", "右下", TILE_POSITION]
+
+# export_file results besides "" (success); the messages are shown in the app.
+CANCELLED = "cancelled"
+READ_ERROR = "无法读取图片"
+SAVE_ERROR = "无法保存文件"
+TOO_LARGE_ERROR = "图片过大，超出内存上限"
+LOGO_ERROR = "无法读取Logo图片"
+
+# EncodeOptions.backend value that saves with Qt's own image writers.
+QT_BACKEND = "qt"
+
+# QImage formats for the 8-bit gray, BGR and BGRA patches of the region path.
+_PATCH_FORMATS = {1: QImage.Format_Grayscale8, 3: QImage.Format_BGR888, 4: QImage.Format_ARGB32}
+
+_app = None
+
+
+class WatermarkTemplate:
+    """Everything needed to draw the watermark, independent of any widget."""
+
+    def __init__(self, text="", font="Arial,30,-1,5,50,0,0,0,0,0", color="#ffffffff", opacity=1.0,
+                 rotation=0, position="中", position_mode="preset", pos=(0, 0), logo="", logo_scale=0.2):
+        self.text = text
+        self.font = font                    # QFont.toString()
+        self.color = color                  # QColor.name(QColor.HexArgb)
+        self.opacity = opacity              # 0.0 - 1.0
+        self.rotation = rotation            # degrees
+        self.position = position            # one of PRESET_POSITIONS
+        self.position_mode = position_mode  # "preset" or "manual"
+        self.pos = tuple(pos)               # baseline origin (logo: top-left corner) used in manual mode
+        self.logo = logo                    # image file drawn instead of the text, or ""
+        self.logo_scale = logo_scale        # logo width as a fraction of the image width
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Reads the keys the desktop app's save_settings writes, e.g. from a template .ini.
+
+        Missing or unreadable values get the app's defaults. Reading the font
+        needs a QGuiApplication (see :func:`ensure_app`).
+        """
+        font = settings.value("watermark_font", None)
+        if isinstance(font, str):  # hand-written templates may use QFont.toString()
+            font_string, font = font, QFont()
+            font.fromString(font_string)
+        elif not isinstance(font, QFont):
+            font = QFont("Arial", 30)
+        color = settings.value("watermark_color", None)
+        color = QColor(color) if isinstance(color, (QColor, str)) else QColor("white")
+        if not color.isValid():
+            color = QColor("white")
+
+        position = settings.value("watermark_position", "中")
+        if position not in PRESET_POSITIONS:
+            position = "中"
+        return cls(
+            text=settings.value("watermark_text", "请输入水印文本"),
+            font=font.toString(),
+            color=color.name(QColor.HexArgb),
+            opacity=float(settings.value("watermark_opacity", 0.5)),
+            rotation=int(settings.value("watermark_rotation", 0)),
+            position=position,
+            position_mode="manual" if settings.value("watermark_position_mode") == "manual" else "preset",
+            pos=(int(settings.value("watermark_pos_x", 0)), int(settings.value("watermark_pos_y", 0))),
+            logo=settings.value("watermark_logo", "") or "",
+            logo_scale=float(settings.value("watermark_logo_scale", 0.2)),
+        )
+
+    def as_dict(self):
+        """The settings that affect the rendered image; ``pos`` only counts in manual mode.
+
+        With a logo, the logo file's size and modification time count too, so
+        replacing the logo invalidates earlier exports.
+        """
+        values = dict(vars(self))
+        if self.position_mode != "manual":
+            del values["pos"]
+        if self.logo:
+            try:
+                stat = os.stat(self.logo)
+                values["logo_file"] = [stat.st_size, stat.st_mtime_ns]
+            except OSError:
+                values["logo_file"] = None
+        else:
+            del values["logo"], values["logo_scale"]
+        return values
+
+    @property
+    def tiled(self):
+        return self.position_mode != "manual" and self.position == TILE_POSITION
+
+    def qfont(self):
+        font = QFont()
+        font.fromString(self.font)
+        return font
+
+    def qcolor(self):
+        return QColor(self.color)
+
+
+def watermark_origin(width, height, template, font_metrics):
+    """Returns the text baseline origin for an image of the given size."""
+    if template.position_mode == "manual":
+        return QPoint(*template.pos)
+
+    text_width = font_metrics.width(template.text)
+    text_height = font_metrics.height()
+    positions = {
+        "左上": (10, font_metrics.ascent() + 10),
+        "右上": (width - text_width - 10, font_metrics.ascent() + 10),
+        "左下": (10, height - font_metrics.descent() - 10),
+        "右下": (width - text_width - 10, height - font_metrics.descent() - 10),
+        "中": ((width - text_width) / 2, (height + text_height) / 2 - font_metrics.descent()),
+        "中上": ((width - text_width) / 2, font_metrics.ascent() + 10),
+        "左中": (10, (height + text_height) / 2 - font_metrics.descent()),
+        "右中": (width - text_width - 10, (height + text_height) / 2 - font_metrics.descent()),
+        "中下": ((width - text_width) / 2, height - font_metrics.descent() - 10),
+        # Nominal origin of the tiled layout, where a switch to manual mode puts the text.
+        TILE_POSITION: ((width - text_width) / 2, (height + text_height) / 2 - font_metrics.descent()),
+    }
+    x, y = positions.get(template.position, (10, 10))  # Default to top-left
+    return QPoint(int(x), int(y))
+
+
+def logo_origin(width, height, template, size):
+    """Returns the top-left corner of a logo of ``size`` on an image of the given size."""
+    if template.position_mode == "manual":
+        return QPoint(*template.pos)
+
+    # (column, row) in the 3 x 3 grid; the tiled layout's nominal origin is the centre.
+    anchors = {"左上": (0, 0), "中上": (1, 0), "右上": (2, 0), "左中": (0, 1), "中": (1, 1), "右中": (2, 1),
+               "左下": (0, 2), "中下": (1, 2), "右下": (2, 2), TILE_POSITION: (1, 1)}
+    column, row = anchors.get(template.position, (0, 0))
+    return QPoint(int(10 + (width - size.width() - 20) * column / 2),
+                  int(10 + (height - size.height() - 20) * row / 2))
+
+
+def logo_transform(origin, size, template):
+    """Rotation of the logo about its centre."""
+    center_x, center_y = origin.x() + size.width() / 2, origin.y() + size.height() / 2
+    transform = QTransform()
+    transform.translate(center_x, center_y)
+    transform.rotate(template.rotation)
+    transform.translate(-center_x, -center_y)
+    return transform
+
+
+def watermark_transform(origin, font_metrics, template):
+    """Rotation of the watermark about the centre of its text box."""
+    center_x = origin.x() + font_metrics.width(template.text) / 2
+    center_y = origin.y() - font_metrics.height() / 2
+    transform = QTransform()
+    transform.translate(center_x, center_y)
+    transform.rotate(template.rotation)
+    transform.translate(-center_x, -center_y)
+    return transform
+
+
+def paint_watermark(painter, width, height, template):
+    """Draws the watermark for a ``width`` x ``height`` image and returns its baseline origin.
+
+    For a logo the origin is the logo's top-left corner. Nothing is drawn if
+    the logo cannot be read.
+    """
+    if template.logo:
+        return _paint_logo(painter, width, height, template)
+
+    font = template.qfont()
+    font_metrics = QFontMetrics(font)
+    origin = watermark_origin(width, height, template, font_metrics)
+
+    painter.setOpacity(template.opacity)
+    if template.tiled:
+        painter.fillRect(QRect(0, 0, width, height), QBrush(tile_image(template)))
+        return origin
+    if template.rotation != 0:
+        painter.setTransform(watermark_transform(origin, font_metrics, template), True)
+
+    painter.setFont(font)
+    painter.setPen(QPen(template.qcolor()))
+    painter.drawText(origin, template.text)
+    return origin
+
+
+def _paint_logo(painter, width, height, template):
+    logo = logo_image(template, width)
+    if logo is None:
+        return QPoint(0, 0)
+    origin = logo_origin(width, height, template, logo.size())
+
+    painter.setOpacity(template.opacity)
+    if template.tiled:
+        painter.fillRect(QRect(0, 0, width, height), QBrush(tile_image(template, width)))
+        return origin
+    if template.rotation != 0:
+        painter.setTransform(logo_transform(origin, logo.size(), template), True)
+        painter.setRenderHint(QPainter.SmoothPixmapTransform)
+    painter.drawImage(origin, logo)
+    return origin
+
+
+def logo_image(template, image_width):
+    """The template's logo scaled for an image ``image_width`` pixels wide, or None if it cannot be read.
+
+    Scaled logos are premultiplied, so smooth scaling does not darken their
+    edges, and cached by file, modification time and width: a batch with a few
+    distinct image sizes scales the logo once per size.
+    """
+    key = _logo_key(template, image_width)
+    return None if key is None else _logo_image(*key)
+
+
+def _logo_key(template, image_width):
+    """``(path, mtime_ns, width)`` identifying the scaled logo, or None if the file is missing."""
+    try:
+        mtime_ns = os.stat(template.logo).st_mtime_ns
+    except OSError:
+        return None
+    return template.logo, mtime_ns, max(1, round(image_width * template.logo_scale))
+
+
+@functools.lru_cache(maxsize=8)
+def _load_logo(path, mtime_ns):
+    logo = QImage(path)
+    return None if logo.isNull() else logo.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+
+
+@functools.lru_cache(maxsize=64)
+def _logo_image(path, mtime_ns, width):
+    logo = _load_logo(path, mtime_ns)
+    return None if logo is None else logo.scaledToWidth(width, Qt.SmoothTransformation)
+
+
+def _text_rect(font_metrics, text):
+    """The area the text covers relative to its baseline origin, including overhangs."""
+    rect = QRect(0, -font_metrics.ascent(), font_metrics.width(text), font_metrics.height())
+    return rect.united(font_metrics.boundingRect(text))
+
+
+def text_stamp(template, scale=1.0):
+    """Renders the watermark text, opaque and unrotated, at ``scale`` times its size.
+
+    Returns ``(image, rect)``: ``rect`` is the area the image covers at full
+    size, relative to the text baseline origin. Drawing the image into
+    ``rect`` with the watermark's opacity and transform gives the same result
+    as :func:`paint_watermark`, but the text only has to be laid out once.
+    """
+    font = template.qfont()
+    font_metrics = QFontMetrics(font)
+    rect = _text_rect(font_metrics, template.text)
+
+    image = QImage(max(1, math.ceil(rect.width() * scale)), max(1, math.ceil(rect.height() * scale)),
+                   QImage.Format_ARGB32_Premultiplied)
+    image.fill(Qt.transparent)
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.Antialiasing)
+    painter.setRenderHint(QPainter.TextAntialiasing)
+    painter.scale(scale, scale)
+    painter.setFont(font)
+    painter.setPen(QPen(template.qcolor()))
+    painter.drawText(-rect.x(), -rect.y(), template.text)
+    painter.end()
+    return image, rect
+
+
+def tile_image(template, image_width=None):
+    """The repeating pattern of the tiled layout, opaque, with the rotation baked in.
+
+    The pattern is two rows high; the second row is offset by half a tile, so
+    the copies form diagonal lines. Patterns are cached per text, font, color
+    and rotation (for a logo: per file, size and rotation), and can be shared
+    between threads. A logo's size depends on ``image_width``.
+    """
+    if template.logo:
+        key = _logo_key(template, image_width)
+        return None if key is None else _logo_tile(*key, template.rotation)
+    return _text_tile(template.text, template.font, template.color, template.rotation)
+
+
+@functools.lru_cache(maxsize=16)
+def _text_tile(text, font_string, color, rotation):
+    font = QFont()
+    font.fromString(font_string)
+    font_metrics = QFontMetrics(font)
+
+    def draw(painter):
+        painter.setFont(font)
+        painter.setPen(QPen(QColor(color)))
+        painter.drawText(QPointF(0, 0), text)
+
+    return _tile_pattern(QRectF(_text_rect(font_metrics, text)), rotation, font_metrics.height(), draw)
+
+
+@functools.lru_cache(maxsize=16)
+def _logo_tile(path, mtime_ns, width, rotation):
+    logo = _logo_image(path, mtime_ns, width)
+    if logo is None:
+        return None
+    return _tile_pattern(QRectF(logo.rect()), rotation, logo.height() // 2,
+                         lambda painter: painter.drawImage(QPointF(0, 0), logo))
+
+
+def _tile_pattern(rect, rotation, gap, draw):
+    """Two staggered rows of ``draw``, which paints into ``rect``, turned by ``rotation``."""
+    bounds = QTransform().rotate(rotation).mapRect(rect)
+    cell_width, cell_height = math.ceil(bounds.width()) + gap, math.ceil(bounds.height()) + gap
+
+    image = QImage(cell_width, 2 * cell_height, QImage.Format_ARGB32_Premultiplied)
+    image.fill(Qt.transparent)
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.Antialiasing)
+    painter.setRenderHint(QPainter.TextAntialiasing)
+    painter.setRenderHint(QPainter.SmoothPixmapTransform)
+    # The offset copy in the second row is split across the tile's left and right edges.
+    for center in (QPointF(cell_width / 2, cell_height / 2), QPointF(0, cell_height * 1.5),
+                   QPointF(cell_width, cell_height * 1.5)):
+        painter.save()
+        painter.translate(center)
+        painter.rotate(rotation)
+        painter.translate(-rect.center())
+        draw(painter)
+        painter.restore()
+    painter.end()
+    return image
+
+
+def ensure_app():
+    """Creates a QGuiApplication if there is none yet; Qt cannot lay out text without one.
+
+    Without a display the ``offscreen`` platform is used, unless
+    ``QT_QPA_PLATFORM`` says otherwise.
+    """
+    global _app
+    if QGuiApplication.instance() is None:
+        if not os.environ.get('DISPLAY') and not os.environ.get('WAYLAND_DISPLAY') and os.name != 'nt':
+            os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        _app = QGuiApplication([])
+    return QGuiApplication.instance()
+
+
+def watermark_box(width, height, template, margin=2):
+    """``(x0, y0, x1, y1)`` the watermark covers on a ``width`` x ``height`` image."""
+    if template.logo:
+        logo = logo_image(template, width)
+        size = logo.size() if logo is not None else QSize(0, 0)
+        origin = logo_origin(width, height, template, size)
+        rect = QRect(origin, size)
+        if template.rotation != 0:
+            rect = logo_transform(origin, size, template).mapRect(rect)
+        return rect.left() - margin, rect.top() - margin, rect.right() + 1 + margin, rect.bottom() + 1 + margin
+
+    font_metrics = QFontMetrics(template.qfont())
+    origin = watermark_origin(width, height, template, font_metrics)
+    rect = _text_rect(font_metrics, template.text).translated(origin)
+    if template.rotation != 0:
+        rect = watermark_transform(origin, font_metrics, template).mapRect(rect)
+    return rect.left() - margin, rect.top() - margin, rect.right() + 1 + margin, rect.bottom() + 1 + margin
+
+
+def _export_region(source, destination, template):
+    """Paints only the area under the watermark (see streaming); returns False if that is not possible."""
+    if template.tiled:  # covers the whole image, nothing to gain
+        return False
+    if format_for(destination) != format_for(source):  # the region path keeps the source's encoding
+        return False
+    region = open_region_source(source)
+    if region is None or region.bits != 8:
+        return False
+
+    def draw(patch, x0, y0):
+        channels = 1 if patch.ndim == 2 else patch.shape[2]
+        height, width = patch.shape[:2]
+        pixels = np.ascontiguousarray(patch)
+        image = QImage(pixels.data, width, height, pixels.strides[0], _PATCH_FORMATS[channels])
+        painter = QPainter(image)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.translate(-x0, -y0)
+        paint_watermark(painter, region.width, region.height, template)
+        painter.end()
+        bits = image.constBits()
+        bits.setsize(image.sizeInBytes())
+        rows = np.frombuffer(bits, dtype=np.uint8).reshape(height, image.bytesPerLine())
+        patch[...] = rows[:, :width * channels].reshape(patch.shape)
+
+    return region.rewrite(destination, watermark_box(region.width, region.height, template), draw)
+
+
+def _image_pixels(image):
+    """The pixels of a 32-bit QImage as a BGR, or BGRA if it has alpha, NumPy array."""
+    if image.hasAlphaChannel():
+        image = image.convertToFormat(QImage.Format_ARGB32)  # straight alpha
+    bits = image.constBits()
+    bits.setsize(image.sizeInBytes())
+    rows = np.frombuffer(bits, dtype=np.uint8).reshape(image.height(), image.bytesPerLine())
+    pixels = rows[:, :image.width() * 4].reshape(image.height(), image.width(), 4)  # B, G, R, A in memory
+    return np.array(pixels if image.hasAlphaChannel() else pixels[..., :3])
+
+
+def _save_with_qt(image, destination, options, metadata=None):
+    """Saves through QImageWriter with ``options``' quality and progressive mode; returns an error or ""."""
+    if options.subsampling:
+        return f"{SAVE_ERROR}: Qt 无法设置色度采样"
+    fmt = format_for(destination)
+    embed = bool(metadata) and fmt in EMBED_FORMATS
+    if embed:  # encode in memory, so the metadata can be spliced in before writing
+        buffer = QBuffer()
+        buffer.open(QIODevice.WriteOnly)
+        writer = QImageWriter(buffer, FORMATS[fmt][1:].encode())
+    else:
+        writer = QImageWriter(destination)
+    if options.quality:
+        writer.setQuality(options.quality)
+    writer.setProgressiveScanWrite(options.progressive)
+    writer.setOptimizedWrite(options.optimize)
+    if not writer.write(image):
+        return f"{SAVE_ERROR}: {writer.errorString()}"
+    if embed:
+        try:
+            with open(destination, 'wb') as f:
+                f.write(embed_metadata(bytes(buffer.data()), fmt, metadata))
+        except OSError as e:
+            return f"{SAVE_ERROR}: {e}"
+    return ""
+
+
+def export_file(source, destination, template, cancel_event=None, memory_budget=None, encode_options=None):
+    """Draws the watermark on ``source`` and saves it as ``destination``; see :func:`export_file_with_digest`."""
+    return export_file_with_digest(source, destination, template, cancel_event, memory_budget, encode_options)[0]
+
+
+def export_file_with_digest(source, destination, template, cancel_event=None, memory_budget=None,
+                            encode_options=None):
+    """Draws the watermark on ``source`` and saves it as ``destination``; returns ``(error, sha1)``.
+
+    ``error`` is "" on success, :data:`READ_ERROR` or :data:`SAVE_ERROR`, or
+    :data:`CANCELLED` if ``cancel_event`` was set before the load, paint or
+    save step. ``sha1`` is the hex SHA-1 of the source for the export
+    manifest, taken from the bytes already read for decoding, or None if the
+    export failed. Safe to call from any thread once :func:`ensure_app` has run
+    in the main thread.
+
+    Images whose decoded size would exceed ``memory_budget`` bytes are
+    streamed through the region path when their format allows it, and fail
+    with :data:`TOO_LARGE_ERROR` otherwise. ``encode_options`` choose the
+    encoder (see watermark_core.encoders, plus :data:`QT_BACKEND`, the
+    default); the format follows ``destination``. The source's metadata is
+    copied into JPEG, PNG and WebP outputs.
+    """
+    def cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    if cancelled():
+        return CANCELLED, None
+    if memory_budget:
+        size = QImageReader(source).size()  # header only
+        if size.width() * size.height() * 4 > memory_budget:
+            if not _export_region(source, destination, template):
+                return TOO_LARGE_ERROR, None
+            return "", file_digest(source)  # the region path never reads the whole file
+
+    # One read serves the decoder, the metadata reader and the manifest hash.
+    try:
+        with open(source, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return READ_ERROR, None
+    image = QImage.fromData(data)
+    if image.isNull():
+        return READ_ERROR, None
+    metadata = read_metadata(data)
+    sha1 = hashlib.sha1(data).hexdigest()
+    del data
+    if image.format() not in (QImage.Format_RGB32, QImage.Format_ARGB32, QImage.Format_ARGB32_Premultiplied):
+        # e.g. palette PNGs, which QPainter cannot draw on
+        image = image.convertToFormat(
+            QImage.Format_ARGB32_Premultiplied if image.hasAlphaChannel() else QImage.Format_RGB32)
+    if bytes(image.colorSpace().iccProfile())[16:20] not in (b'', b'RGB '):
+        # Qt would save a gray or CMYK source's profile with the RGB pixels.
+        image.setColorSpace(QColorSpace())
+    if template.logo and logo_image(template, image.width()) is None:
+        return LOGO_ERROR, None
+    if cancelled():
+        return CANCELLED, None
+
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.Antialiasing)
+    paint_watermark(painter, image.width(), image.height(), template)
+    painter.end()
+    if cancelled():
+        return CANCELLED, None
+
+    os.makedirs(os.path.dirname(destination) or '.', exist_ok=True)
+    encode_options = encode_options or EncodeOptions(backend=QT_BACKEND)
+    if encode_options.backend == QT_BACKEND:
+        error = _save_with_qt(image, destination, encode_options, metadata)
+        return error, None if error else sha1
+    try:
+        write_image(destination, _image_pixels(image), encode_options, metadata)
+    except (OSError, ValueError) as e:
+        return f"{SAVE_ERROR}: {e}", None
+    return "", sha1
+
+
+def _export_in_worker(source, destination, template, memory_budget=None, encode_options=None):
+    ensure_app()
+    return export_file_with_digest(source, destination, template, memory_budget=memory_budget,
+                                   encode_options=encode_options)
+
+
+def export_files(jobs, workers=None, max_in_flight=None):
+    """Exports ``(source, destination, template[, memory_budget[, encode_options]])`` jobs in a process pool.
+
+    Yields ``(job, error, sha1)`` as jobs finish, where ``error`` is "" on
+    success and ``sha1`` is the source's hash for the export manifest (None
+    on failure). Each worker process starts its own offscreen Qt, so this needs neither a
+    display nor a running app.
+    """
+    for job, result, error in run_jobs(jobs, _export_in_worker, workers, max_in_flight):
+        if error is not None:
+            yield job, str(error) or type(error).__name__, None
+        else:
+            yield job, result[0], result[1]
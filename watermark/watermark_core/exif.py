@@ -0,0 +1,290 @@
+"""Header-only EXIF reader.
+
+PIL's ``_getexif()`` loads the whole APP1 segment and turns every tag into a
+dict entry. We only ever need a handful of tags, so this reader walks the
+container structure with seeks and reads just the IFD tables on the path to
+the tag, which keeps a typical JPEG in the first few KB of the file.
+
+Supported containers:
+    - JPEG (APP1 "Exif" segment)
+    - TIFF (the file itself is the EXIF structure)
+    - PNG (eXIf chunk)
+    - WebP (EXIF chunk)
+    - anything else that embeds an ``Exif\\0\\0`` + TIFF block near the start of
+      the file, e.g. HEIC/AVIF.
+"""
+import os
+import struct
+import sys
+
+TAG_ORIENTATION = 0x0112
+TAG_THUMBNAIL_OFFSET = 0x0201
+TAG_THUMBNAIL_LENGTH = 0x0202
+TAG_EXIF_IFD = 0x8769
+TAG_DATETIME_ORIGINAL = 0x9003
+
+_TYPE_ASCII = 2
+_TYPE_SHORT = 3
+_TYPE_LONG = 4
+_MAX_IFD_ENTRIES = 1024
+_SCAN_LIMIT = 64 * 1024
+
+
+class _CountingReader:
+    """Wraps a binary file object and counts the bytes actually read from it."""
+
+    def __init__(self, fileobj):
+        self._f = fileobj
+        self.bytes_read = 0
+
+    def read(self, size):
+        data = self._f.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def read_exact(self, size):
+        data = self.read(size)
+        if len(data) != size:
+            raise ValueError("unexpected end of file")
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self._f.seek(offset, whence)
+
+    def tell(self):
+        return self._f.tell()
+
+
+def _find_tiff_base(reader):
+    """Returns the file offset of the TIFF header holding the EXIF data, or None."""
+    reader.seek(0)
+    head = reader.read(8)
+    if head[:2] == b'\xff\xd8':
+        return _find_jpeg_tiff_base(reader)
+    if head[:4] in (b'II*\x00', b'MM\x00*'):
+        return 0
+    if head == b'\x89PNG\r\n\x1a\n':
+        return _find_png_tiff_base(reader)
+    if head[:4] == b'RIFF' and reader.read(4) == b'WEBP':
+        return _find_webp_tiff_base(reader)
+    return _scan_tiff_base(reader)
+
+
+def _find_jpeg_tiff_base(reader):
+    reader.seek(2)
+    while True:
+        marker = reader.read_exact(2)
+        if marker[0] != 0xFF:
+            return None
+        while marker[1] == 0xFF:  # fill bytes
+            marker = marker[1:] + reader.read_exact(1)
+        code = marker[1]
+        if code in (0xD9, 0xDA):  # EOI / SOS: metadata always comes before the scan
+            return None
+        if 0xD0 <= code <= 0xD7 or code == 0x01:  # markers without a length field
+            continue
+
+        length = struct.unpack('>H', reader.read_exact(2))[0]
+        if code == 0xE1 and length >= 8:
+            if reader.read_exact(6) == b'Exif\x00\x00':
+                return reader.tell()
+            reader.seek(length - 8, os.SEEK_CUR)
+        else:
+            reader.seek(length - 2, os.SEEK_CUR)
+
+
+def _find_png_tiff_base(reader):
+    reader.seek(8)
+    while True:
+        length, chunk_type = struct.unpack('>I4s', reader.read_exact(8))
+        if chunk_type == b'eXIf':
+            return reader.tell()
+        if chunk_type in (b'IDAT', b'IEND'):
+            return None
+        reader.seek(length + 4, os.SEEK_CUR)  # data + CRC
+
+
+def _find_webp_tiff_base(reader):
+    reader.seek(12)
+    while True:
+        chunk_type, length = struct.unpack('<4sI', reader.read_exact(8))
+        if chunk_type == b'EXIF':
+            # Some writers keep the JPEG-style "Exif\0\0" prefix in the chunk.
+            if reader.read_exact(6) == b'Exif\x00\x00':
+                return reader.tell()
+            return reader.tell() - 6
+        reader.seek(length + (length & 1), os.SEEK_CUR)  # chunks are padded to even size
+
+
+def _scan_tiff_base(reader):
+    reader.seek(0)
+    data = reader.read(_SCAN_LIMIT)
+    start = 0
+    while True:
+        index = data.find(b'Exif\x00\x00', start)
+        if index < 0:
+            return None
+        if data[index + 6:index + 10] in (b'II*\x00', b'MM\x00*'):
+            return index + 6
+        start = index + 1
+
+
+def _read_ifd_table(reader, base, endian, ifd_offset):
+    reader.seek(base + ifd_offset)
+    count = struct.unpack(endian + 'H', reader.read_exact(2))[0]
+    if count > _MAX_IFD_ENTRIES:
+        return None
+    return reader.read_exact(count * 12)
+
+
+def _find_ifd_entry(reader, base, endian, ifd_offset, tag, table=None):
+    """Returns ``(type, count, raw_value)`` for ``tag`` in the IFD, or None.
+
+    The whole table is scanned: some writers emit IFD entries out of tag order.
+    """
+    if table is None:
+        table = _read_ifd_table(reader, base, endian, ifd_offset)
+        if table is None:
+            return None
+    for i in range(0, len(table), 12):
+        entry_tag = struct.unpack_from(endian + 'H', table, i)[0]
+        if entry_tag == tag:
+            entry_type, entry_count = struct.unpack_from(endian + 'HI', table, i + 2)
+            return entry_type, entry_count, table[i + 8:i + 12]
+    return None
+
+
+def _read_ascii(reader, base, endian, entry):
+    entry_type, count, raw = entry
+    if entry_type != _TYPE_ASCII or count > 64:
+        return None
+    if count <= 4:
+        data = raw[:count]
+    else:
+        reader.seek(base + struct.unpack(endian + 'I', raw)[0])
+        data = reader.read_exact(count)
+    return data.split(b'\x00', 1)[0].decode('ascii', 'replace').strip() or None
+
+
+def _read_tiff_header(reader):
+    """Returns ``(base, endian, ifd0_offset)`` of the EXIF block, or None."""
+    base = _find_tiff_base(reader)
+    if base is None:
+        return None
+
+    reader.seek(base)
+    header = reader.read_exact(8)
+    endian = '<' if header[:2] == b'II' else '>'
+    return base, endian, struct.unpack(endian + 'I', header[4:])[0]
+
+
+def _read_date_time_original(reader):
+    tiff = _read_tiff_header(reader)
+    if tiff is None:
+        return None
+    base, endian, ifd0 = tiff
+
+    exif_pointer = _find_ifd_entry(reader, base, endian, ifd0, TAG_EXIF_IFD)
+    if exif_pointer is None:
+        return None
+    exif_ifd = struct.unpack(endian + 'I', exif_pointer[2])[0]
+
+    entry = _find_ifd_entry(reader, base, endian, exif_ifd, TAG_DATETIME_ORIGINAL)
+    if entry is None:
+        return None
+    return _read_ascii(reader, base, endian, entry)
+
+
+def _read_orientation(reader):
+    tiff = _read_tiff_header(reader)
+    if tiff is None:
+        return 1
+    base, endian, ifd0 = tiff
+
+    entry = _find_ifd_entry(reader, base, endian, ifd0, TAG_ORIENTATION)
+    if entry is None or entry[0] != _TYPE_SHORT:
+        return 1
+    value = struct.unpack(endian + 'H', entry[2][:2])[0]
+    return value if 1 <= value <= 8 else 1
+
+
+def _read_integer(endian, entry):
+    entry_type, _, raw = entry
+    if entry_type == _TYPE_SHORT:
+        return struct.unpack(endian + 'H', raw[:2])[0]
+    if entry_type == _TYPE_LONG:
+        return struct.unpack(endian + 'I', raw)[0]
+    return None
+
+
+def _read_thumbnail(reader):
+    tiff = _read_tiff_header(reader)
+    if tiff is None:
+        return None
+    base, endian, ifd0 = tiff
+
+    # IFD1, which describes the embedded thumbnail, follows IFD0's entry table.
+    ifd0_table = _read_ifd_table(reader, base, endian, ifd0)
+    if ifd0_table is None:
+        return None
+    ifd1 = struct.unpack(endian + 'I', reader.read_exact(4))[0]
+    if ifd1 == 0:
+        return None
+
+    table = _read_ifd_table(reader, base, endian, ifd1)
+    if table is None:
+        return None
+    offset_entry = _find_ifd_entry(reader, base, endian, ifd1, TAG_THUMBNAIL_OFFSET, table)
+    length_entry = _find_ifd_entry(reader, base, endian, ifd1, TAG_THUMBNAIL_LENGTH, table)
+    if offset_entry is None or length_entry is None:
+        return None
+    offset = _read_integer(endian, offset_entry)
+    length = _read_integer(endian, length_entry)
+    if not offset or not length or length > 1024 * 1024:
+        return None
+
+    reader.seek(base + offset)
+    data = reader.read_exact(length)
+    return data if data[:2] == b'\xff\xd8' else None
+
+
+def _read_with(source, parse, default):
+    """Runs ``parse(reader)`` on a path or file object; returns ``(value, bytes_read)``."""
+    if isinstance(source, (str, os.PathLike)):
+        # Unbuffered, so bytes_read reflects what was really fetched from disk.
+        with open(source, 'rb', buffering=0) as f:
+            return _read_with(f, parse, default)
+
+    reader = _CountingReader(source)
+    try:
+        value = parse(reader)
+    except (ValueError, struct.error):
+        value = default
+    return value, reader.bytes_read
+
+
+def read_exif_date(source):
+    """Reads the EXIF DateTimeOriginal value without decoding the image.
+
+    ``source`` is a path or a seekable binary file object. Returns a tuple
+    ``(value, bytes_read)`` where ``value`` is the raw ``"YYYY:MM:DD HH:MM:SS"``
+    string (or None when the file has no such tag) and ``bytes_read`` is how
+    much of the file had to be read to find out.
+    """
+    return _read_with(source, _read_date_time_original, None)
+
+
+def read_exif_orientation(source):
+    """Returns the EXIF Orientation (1-8) of a path or file object; 1 when absent."""
+    return _read_with(source, _read_orientation, 1)[0]
+
+
+def read_exif_thumbnail(source):
+    """Returns the embedded EXIF thumbnail of a path or file object as JPEG bytes, or None."""
+    return _read_with(source, _read_thumbnail, None)[0]
+
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        value, bytes_read = read_exif_date(path)
+        print(f"{path}: {value or 'no DateTimeOriginal'} ({bytes_read} bytes read)")
@@ -0,0 +1,175 @@
+"""Lossless-region JPEG watermarking.
+
+Instead of decoding and re-encoding the whole photo, only the iMCU blocks
+covered by the watermark are touched:
+
+    1. ``jpegtran -crop`` cuts the iMCU-aligned box out of the source losslessly,
+    2. the small crop is decoded, the watermark is drawn on it and it is encoded
+       again with the source's chroma subsampling,
+    3. ``jpegtran -drop`` pastes it back. jpegtran requantizes the patch to the
+       source tables and copies every other DCT block of the source verbatim.
+
+This needs a jpegtran build with ``-drop`` (IJG libjpeg 9 or newer). When it
+is missing, or the file is not a plain YCbCr/grayscale JPEG, the functions
+return False and callers fall back to a full re-encode.
+"""
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+
+import cv2
+import numpy as np
+
+from .exif import read_exif_orientation
+
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_PROGRESSIVE_SOF_MARKERS = {0xC2, 0xC6, 0xCA, 0xCE}
+_SAMPLING_FACTORS = {
+    (2, 2): cv2.IMWRITE_JPEG_SAMPLING_FACTOR_420,
+    (2, 1): cv2.IMWRITE_JPEG_SAMPLING_FACTOR_422,
+    (1, 2): cv2.IMWRITE_JPEG_SAMPLING_FACTOR_440,
+    (1, 1): cv2.IMWRITE_JPEG_SAMPLING_FACTOR_444,
+    (4, 1): cv2.IMWRITE_JPEG_SAMPLING_FACTOR_411,
+}
+_PATCH_QUALITY = 95
+
+_jpegtran = None
+
+
+class JpegFrame:
+    """Geometry of a JPEG as declared in its SOF segment."""
+
+    def __init__(self, width, height, sampling, progressive):
+        self.width = width
+        self.height = height
+        self.sampling = sampling          # [(h, v), ...] per component
+        self.progressive = progressive
+
+    @property
+    def mcu_size(self):
+        """Width and height of one iMCU in pixels."""
+        return 8 * max(h for h, _ in self.sampling), 8 * max(v for _, v in self.sampling)
+
+
+def read_jpeg_frame(source):
+    """Parses the SOF segment of a JPEG path or file object; returns a :class:`JpegFrame` or None."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return read_jpeg_frame(f)
+
+    f = source
+    f.seek(0)
+    if f.read(2) != b'\xff\xd8':
+        return None
+    while True:
+        marker = f.read(2)
+        if len(marker) != 2 or marker[0] != 0xFF:
+            return None
+        while marker[1] == 0xFF:
+            marker = marker[1:] + f.read(1)
+        code = marker[1]
+        if code in (0xD9, 0xDA):
+            return None
+        if 0xD0 <= code <= 0xD7 or code == 0x01:
+            continue
+
+        length = struct.unpack('>H', f.read(2))[0]
+        if code in _SOF_MARKERS:
+            segment = f.read(length - 2)
+            height, width, count = struct.unpack_from('>HHB', segment, 1)
+            sampling = [(segment[7 + 3 * i] >> 4, segment[7 + 3 * i] & 0x0F) for i in range(count)]
+            return JpegFrame(width, height, sampling, code in _PROGRESSIVE_SOF_MARKERS)
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def find_jpegtran():
+    """Returns the path of a jpegtran that supports ``-drop``, or None."""
+    global _jpegtran
+    if _jpegtran is None:
+        _jpegtran = ''
+        path = shutil.which('jpegtran')
+        if path:
+            try:
+                result = subprocess.run([path, '-help'], capture_output=True, text=True, timeout=10)
+                if '-drop' in result.stdout + result.stderr:
+                    _jpegtran = path
+            except (OSError, subprocess.SubprocessError):
+                pass
+    return _jpegtran or None
+
+
+def align_to_mcu(box, frame):
+    """Grows ``(x0, y0, x1, y1)`` to iMCU boundaries, clipped to the image."""
+    mcu_w, mcu_h = frame.mcu_size
+    x0, y0, x1, y1 = box
+    x0 = max(0, x0) // mcu_w * mcu_w
+    y0 = max(0, y0) // mcu_h * mcu_h
+    x1 = min(frame.width, -(-x1 // mcu_w) * mcu_w)
+    y1 = min(frame.height, -(-y1 // mcu_h) * mcu_h)
+    return x0, y0, x1, y1
+
+
+def rewrite_jpeg_region(src, dst, frame, box, draw):
+    """Re-encodes only the part of ``src`` inside ``box`` and writes ``dst``.
+
+    ``frame`` is the :class:`JpegFrame` of ``src`` and ``box`` is
+    ``(x0, y0, x1, y1)`` in stored (not EXIF-rotated) pixel coordinates.
+    ``draw(patch, x0, y0)`` paints onto the decoded BGR patch, whose top-left
+    corner sits at ``(x0, y0)`` in the full image.
+
+    Returns True on success and False when the region path does not apply.
+    """
+    jpegtran = find_jpegtran()
+    if jpegtran is None or len(frame.sampling) not in (1, 3):
+        return False
+    if read_exif_orientation(src) != 1:
+        return False  # the box is computed for the upright image
+
+    x0, y0, x1, y1 = align_to_mcu(box, frame)
+    if x1 <= x0 or y1 <= y0:
+        return False
+
+    luma_h, luma_v = frame.sampling[0]
+    factor = _SAMPLING_FACTORS.get((luma_h, luma_v)) if len(frame.sampling) == 3 else None
+    if len(frame.sampling) == 3 and (factor is None or any(s != (1, 1) for s in frame.sampling[1:])):
+        return False
+
+    try:
+        crop = subprocess.run(
+            [jpegtran, '-copy', 'none', '-crop', f'{x1 - x0}x{y1 - y0}+{x0}+{y0}', src],
+            capture_output=True, check=True,
+        ).stdout
+    except subprocess.CalledProcessError:
+        return False
+
+    grayscale = len(frame.sampling) == 1
+    patch = cv2.imdecode(np.frombuffer(crop, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if patch is None:
+        return False
+    draw(patch, x0, y0)
+
+    params = [cv2.IMWRITE_JPEG_QUALITY, _PATCH_QUALITY]
+    if grayscale:
+        patch = cv2.cvtColor(patch, cv2.COLOR_BGR2GRAY)
+    else:
+        params += [cv2.IMWRITE_JPEG_SAMPLING_FACTOR, factor]
+    ok, encoded = cv2.imencode('.jpg', patch, params)
+    if not ok:
+        return False
+
+    os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        patch_path = os.path.join(tmp, 'patch.jpg')
+        with open(patch_path, 'wb') as f:
+            f.write(encoded.tobytes())
+        command = [jpegtran, '-copy', 'all']
+        if frame.progressive:
+            command.append('-progressive')
+        command += ['-drop', f'+{x0}+{y0}', patch_path, '-outfile', dst, src]
+        try:
+            subprocess.run(command, capture_output=True, check=True)
+        except subprocess.CalledProcessError:
+            return False
+    return True
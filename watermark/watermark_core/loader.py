@@ -0,0 +1,141 @@
+"""Single-read image loading.
+
+The file is memory-mapped once; the EXIF header reader, the metadata reader
+(see metadata) and the OpenCV decoder all work on that same mapping, so every
+photo is read from disk and decoded exactly once.
+
+:func:`load_thumbnail` is the reduced-resolution variant for list icons and
+previews: it uses the embedded EXIF thumbnail or libjpeg's DCT scaling
+(1/2, 1/4, 1/8) instead of decoding the full frame.
+"""
+import hashlib
+import mmap
+import os
+
+import cv2
+import numpy as np
+
+from .exif import read_exif_date, read_exif_orientation, read_exif_thumbnail
+from .jpeg_region import read_jpeg_frame
+from .metadata import ImageMetadata, read_metadata
+
+_REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+class LoadedImage:
+    """Decoded pixels and metadata of one image file."""
+
+    def __init__(self, path, pixels, exif_date, file_size, exif_bytes_read=0, metadata=None, sha1=None):
+        self.path = path
+        self.pixels = pixels                    # BGR ndarray, or None if the file could not be decoded
+        self.exif_date = exif_date              # raw EXIF DateTimeOriginal string, or None
+        self.file_size = file_size
+        self.exif_bytes_read = exif_bytes_read  # header bytes the EXIF reader touched
+        self.metadata = metadata or ImageMetadata()  # EXIF/XMP/ICC to carry into the output
+        self.sha1 = sha1                        # hex SHA-1 of the file, if load_image was asked for it
+
+
+def load_image(path, flags=cv2.IMREAD_COLOR, digest=False):
+    """Reads ``path`` once and returns a :class:`LoadedImage`.
+
+    Raises OSError if the file cannot be opened. A file that opens but does
+    not decode yields ``pixels=None``, like ``cv2.imread``. With ``digest``
+    the SHA-1 of the file (for the export manifest) is taken from the same
+    mapping.
+    """
+    with open(path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        if file_size == 0:
+            return LoadedImage(path, None, None, 0, sha1=hashlib.sha1().hexdigest() if digest else None)
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            exif_date, exif_bytes_read = read_exif_date(mm)
+            metadata = read_metadata(mm)
+            sha1 = hashlib.sha1(mm).hexdigest() if digest else None
+            buffer = np.frombuffer(mm, dtype=np.uint8)
+            pixels = cv2.imdecode(buffer, flags)
+            del buffer  # release the export so the mapping can be closed
+
+    return LoadedImage(path, pixels, exif_date, file_size, exif_bytes_read, metadata, sha1)
+
+
+def apply_orientation(img, orientation):
+    """Rotates/flips ``img`` so that an image with the given EXIF Orientation is upright."""
+    if orientation == 2:
+        return cv2.flip(img, 1)
+    if orientation == 3:
+        return cv2.rotate(img, cv2.ROTATE_180)
+    if orientation == 4:
+        return cv2.flip(img, 0)
+    if orientation == 5:
+        return cv2.transpose(img)
+    if orientation == 6:
+        return cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
+    if orientation == 7:
+        return cv2.flip(cv2.transpose(img), -1)
+    if orientation == 8:
+        return cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    return img
+
+
+def fit_size(width, height, max_width, max_height):
+    """Returns the size of ``width`` x ``height`` scaled down to fit the box, keeping the aspect ratio."""
+    scale = min(max_width / width, max_height / height, 1.0)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _decode_jpeg_reduced(mm, frame, max_width, max_height):
+    """Decodes a JPEG at the smallest size that still covers the box, in stored orientation."""
+    orientation = read_exif_orientation(mm)
+    if orientation >= 5:  # stored sideways; the box applies to the rotated image
+        max_width, max_height = max_height, max_width
+    factor = max(frame.width / max_width, frame.height / max_height)
+
+    thumbnail = read_exif_thumbnail(mm)
+    if thumbnail is not None:
+        img = cv2.imdecode(np.frombuffer(thumbnail, dtype=np.uint8), cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
+        # Only use it when it is big enough and not letterboxed to a different aspect ratio.
+        if (img is not None and img.shape[1] * factor >= frame.width and img.shape[0] * factor >= frame.height
+                and abs(img.shape[1] / img.shape[0] - frame.width / frame.height) < 0.02 * frame.width / frame.height):
+            return apply_orientation(img, orientation)
+
+    flags = cv2.IMREAD_COLOR
+    for reduction, reduced_flags in _REDUCED_FLAGS:
+        if reduction <= factor:
+            flags = reduced_flags
+            break
+    buffer = np.frombuffer(mm, dtype=np.uint8)
+    img = cv2.imdecode(buffer, flags | cv2.IMREAD_IGNORE_ORIENTATION)
+    del buffer
+    return None if img is None else apply_orientation(img, orientation)
+
+
+def load_thumbnail(path, max_width, max_height):
+    """Loads ``path`` scaled down to fit inside ``max_width`` x ``max_height``.
+
+    JPEGs are served from the EXIF thumbnail when it is large enough and
+    otherwise decoded with DCT scaling; other formats are decoded in full and
+    resized. EXIF orientation is applied. Returns a uint8 BGR, BGRA or
+    grayscale ndarray (PNG transparency is kept), or None if the file cannot
+    be decoded.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            frame = read_jpeg_frame(mm)
+            if frame is not None:
+                img = _decode_jpeg_reduced(mm, frame, max_width, max_height)
+            else:
+                buffer = np.frombuffer(mm, dtype=np.uint8)
+                img = cv2.imdecode(buffer, cv2.IMREAD_UNCHANGED)
+                del buffer
+
+    if img is None:
+        return None
+    if img.dtype == np.uint16:
+        img = (img >> 8).astype(np.uint8)
+    size = fit_size(img.shape[1], img.shape[0], max_width, max_height)
+    if size != (img.shape[1], img.shape[0]):
+        img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+    return img
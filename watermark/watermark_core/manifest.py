@@ -0,0 +1,137 @@
+"""Export manifest: remembers what an output folder already contains.
+
+Every finished export appends one JSON line to ``.watermark-manifest.jsonl``
+in the output folder. It holds the source's path, size, mtime and SHA-1,
+a fingerprint of the watermark settings, and the output's path and size.
+A later run skips a source when all of these still match. Because lines
+are appended as files finish, a crashed or cancelled run resumes where it
+stopped.
+
+A source whose mtime changed but whose content did not (a copy or a
+``touch``) is recognised by its hash and is not rendered again.
+"""
+import hashlib
+import json
+import os
+import threading
+
+MANIFEST_NAME = '.watermark-manifest.jsonl'
+_HASH_CHUNK = 1024 * 1024
+
+
+def fingerprint(*values):
+    """Short stable hash of the settings an output depends on."""
+    data = json.dumps(values, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()[:16]
+
+
+def file_digest(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+class ExportManifest:
+    """The manifest of one output folder. Thread-safe; entries are keyed by absolute source path."""
+
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._file = None
+
+        lines = 0
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        entry = json.loads(line)
+                        self._entries[entry['source']] = entry
+                    except (ValueError, KeyError, TypeError):
+                        continue  # e.g. a line cut short by a crash
+        except FileNotFoundError:
+            pass
+        if lines > 2 * len(self._entries) + 100:
+            self._compact()
+
+    def _compact(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in self._entries.values():
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.path)
+
+    def destination(self, source):
+        """Where ``source`` was last exported to, or None."""
+        entry = self._entries.get(os.path.abspath(source))
+        return entry['destination'] if entry else None
+
+    def is_current(self, source, settings, destination=None):
+        """True if ``source`` was exported with ``settings`` and neither file changed since.
+
+        ``settings`` is a :func:`fingerprint`. When ``destination`` is given
+        the recorded output must also be that path.
+        """
+        source = os.path.abspath(source)
+        with self._lock:
+            entry = self._entries.get(source)
+        if entry is None or entry['settings'] != settings:
+            return False
+        if destination is not None and os.path.abspath(destination) != entry['destination']:
+            return False
+        try:
+            st = os.stat(source)
+            if os.path.getsize(entry['destination']) != entry['output_size']:
+                return False
+        except OSError:
+            return False
+        if st.st_size != entry['size']:
+            return False
+        if st.st_mtime_ns == entry['mtime_ns']:
+            return True
+        try:
+            if file_digest(source) != entry['sha1']:
+                return False
+        except OSError:
+            return False
+        # Same content with a new mtime: remember it so the next run needs no hash.
+        try:
+            self.record(source, entry['destination'], settings, entry['sha1'])
+        except OSError:
+            pass
+        return True
+
+    def record(self, source, destination, settings, sha1=None):
+        """Appends an entry for a finished export of ``source`` to ``destination``.
+
+        Pass the ``sha1`` the exporter computed from the bytes it read; without
+        it the source is read again here to hash it.
+        """
+        source = os.path.abspath(source)
+        destination = os.path.abspath(destination)
+        st = os.stat(source)
+        entry = {
+            'source': source,
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'sha1': sha1 or file_digest(source),
+            'settings': settings,
+            'destination': destination,
+            'output_size': os.path.getsize(destination),
+        }
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line)
+            self._file.flush()
+            self._entries[source] = entry
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,281 @@
+"""EXIF, XMP and ICC metadata carried from the source file into the output.
+
+``cv2.imwrite`` and ``QImage.save`` write bare pixels. :func:`read_metadata`
+picks the raw metadata blocks out of the source bytes the loader already
+holds (JPEG APP1/APP2 segments, PNG eXIf/iTXt/iCCP chunks, WebP EXIF/XMP/ICCP
+chunks), and :func:`embed_metadata` splices them into the encoded output as
+that container's own segments or chunks. The source is not opened again and
+nothing is decoded or re-serialized.
+
+Both front ends write the pixels the way they show them (OpenCV applies the
+EXIF Orientation on decode; the desktop app draws on the stored pixels and
+shows them as stored), so the copied EXIF gets Orientation 1. They also
+always write RGB, so only RGB ICC profiles are kept. Metadata is
+embedded in JPEG, PNG and WebP outputs; TIFF sources and AVIF, TIFF and BMP
+outputs go without.
+"""
+import struct
+import zlib
+
+from .exif import TAG_ORIENTATION
+
+EMBED_FORMATS = ('jpeg', 'png', 'webp')
+
+_JPEG_XMP = b'http://ns.adobe.com/xap/1.0/\x00'
+_JPEG_ICC = b'ICC_PROFILE\x00'
+_JPEG_MAX_PAYLOAD = 0xFFFF - 2
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+_PNG_XMP_KEYWORD = b'XML:com.adobe.xmp'
+_WEBP_ICC, _WEBP_EXIF, _WEBP_XMP = 0x20, 0x08, 0x04  # VP8X flags
+
+
+class ImageMetadata:
+    """Raw metadata blocks of one image; any of them may be None."""
+
+    def __init__(self, exif=None, xmp=None, icc=None):
+        self.exif = exif    # TIFF-structured EXIF, without the JPEG "Exif\0\0" prefix
+        self.xmp = xmp      # XMP packet, UTF-8 XML
+        self.icc = icc      # ICC color profile
+
+    def __bool__(self):
+        return bool(self.exif or self.xmp or self.icc)
+
+
+def _reset_orientation(exif):
+    """``exif`` with IFD0's Orientation set to 1 (top-left); unchanged if it has none."""
+    try:
+        endian = '<' if exif[:2] == b'II' else '>'
+        ifd0 = struct.unpack_from(endian + 'I', exif, 4)[0]
+        count = struct.unpack_from(endian + 'H', exif, ifd0)[0]
+        for entry in range(ifd0 + 2, ifd0 + 2 + 12 * count, 12):
+            tag, entry_type = struct.unpack_from(endian + 'HH', exif, entry)
+            if tag == TAG_ORIENTATION and entry_type == 3:  # SHORT
+                patched = bytearray(exif)
+                struct.pack_into(endian + 'H', patched, entry + 8, 1)
+                return bytes(patched)
+    except struct.error:
+        pass
+    return exif
+
+
+def _read_jpeg(data):
+    exif = xmp = None
+    icc_chunks = {}
+    pos = 2
+    while pos + 4 <= len(data) and data[pos] == 0xFF:
+        code = data[pos + 1]
+        if code == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if code in (0xD9, 0xDA):  # metadata always comes before the scan
+            break
+        if 0xD0 <= code <= 0xD7 or code == 0x01:
+            pos += 2
+            continue
+        length = struct.unpack_from('>H', data, pos + 2)[0]
+        if code in (0xE1, 0xE2):
+            body = data[pos + 4:pos + 2 + length]
+            if code == 0xE1 and body.startswith(b'Exif\x00\x00') and exif is None:
+                exif = body[6:]
+            elif code == 0xE1 and body.startswith(_JPEG_XMP) and xmp is None:
+                xmp = body[len(_JPEG_XMP):]
+            elif code == 0xE2 and body.startswith(_JPEG_ICC) and len(body) > 14:
+                icc_chunks[body[12]] = body[14:]  # sequence number, chunk count, data
+        pos += 2 + length
+    icc = b''.join(icc_chunks[number] for number in sorted(icc_chunks)) or None
+    return ImageMetadata(exif, xmp, icc)
+
+
+def _read_png(data):
+    metadata = ImageMetadata()
+    pos = 8
+    while pos + 8 <= len(data):
+        length, chunk_type = struct.unpack_from('>I4s', data, pos)
+        if chunk_type in (b'IDAT', b'IEND'):
+            break
+        body = data[pos + 8:pos + 8 + length]
+        if chunk_type == b'eXIf':
+            metadata.exif = body
+        elif chunk_type == b'iCCP':
+            name_end = body.find(b'\x00')
+            try:
+                metadata.icc = zlib.decompress(body[name_end + 2:])  # name, NUL, compression method
+            except zlib.error:
+                pass
+        elif chunk_type == b'iTXt' and body.startswith(_PNG_XMP_KEYWORD + b'\x00'):
+            # keyword NUL, compression flag, method, language NUL, translated keyword NUL, text
+            compressed = body[len(_PNG_XMP_KEYWORD) + 1]
+            language_end = body.find(b'\x00', len(_PNG_XMP_KEYWORD) + 3)
+            text_start = body.find(b'\x00', language_end + 1) + 1
+            try:
+                metadata.xmp = zlib.decompress(body[text_start:]) if compressed else body[text_start:]
+            except zlib.error:
+                pass
+        pos += 12 + length  # length, type, data, CRC
+    return metadata
+
+
+def _read_webp(data):
+    metadata = ImageMetadata()
+    pos = 12
+    while pos + 8 <= len(data):
+        chunk_type, length = struct.unpack_from('<4sI', data, pos)
+        body = data[pos + 8:pos + 8 + length]
+        if chunk_type == b'EXIF':
+            # Some writers keep the JPEG-style "Exif\0\0" prefix in the chunk.
+            metadata.exif = body[6:] if body.startswith(b'Exif\x00\x00') else body
+        elif chunk_type == b'XMP ':
+            metadata.xmp = body
+        elif chunk_type == b'ICCP':
+            metadata.icc = body
+        pos += 8 + length + (length & 1)  # chunks are padded to even size
+    return metadata
+
+
+def read_metadata(data):
+    """Returns the :class:`ImageMetadata` of a JPEG, PNG or WebP file's bytes.
+
+    ``data`` may be ``bytes`` or an ``mmap``; only the header segments (for
+    WebP, the chunk headers and the metadata chunks) are touched. Unknown or
+    damaged files give empty metadata.
+    """
+    try:
+        if data[:2] == b'\xff\xd8':
+            metadata = _read_jpeg(data)
+        elif data[:8] == _PNG_SIGNATURE:
+            metadata = _read_png(data)
+        elif data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+            metadata = _read_webp(data)
+        else:
+            return ImageMetadata()
+    except (IndexError, struct.error, zlib.error):
+        return ImageMetadata()
+    if metadata.exif:
+        metadata.exif = _reset_orientation(metadata.exif)
+    if metadata.icc and metadata.icc[16:20] != b'RGB ':
+        # The data color space field. Both renderers write RGB pixels, so a gray or
+        # CMYK profile would describe the wrong channels.
+        metadata.icc = None
+    return metadata
+
+
+def _jpeg_segment(code, payload):
+    return struct.pack('>BBH', 0xFF, code, len(payload) + 2) + payload
+
+
+def _embed_jpeg(data, metadata):
+    segments = []
+    if metadata.exif and len(metadata.exif) + 6 <= _JPEG_MAX_PAYLOAD:
+        segments.append(_jpeg_segment(0xE1, b'Exif\x00\x00' + metadata.exif))
+    if metadata.xmp and len(_JPEG_XMP) + len(metadata.xmp) <= _JPEG_MAX_PAYLOAD:
+        segments.append(_jpeg_segment(0xE1, _JPEG_XMP + metadata.xmp))
+    if metadata.icc:
+        size = _JPEG_MAX_PAYLOAD - len(_JPEG_ICC) - 2
+        chunks = [metadata.icc[i:i + size] for i in range(0, len(metadata.icc), size)]
+        if len(chunks) <= 255:
+            segments += [_jpeg_segment(0xE2, _JPEG_ICC + bytes((number, len(chunks))) + chunk)
+                         for number, chunk in enumerate(chunks, 1)]
+
+    # Keep the encoder's JFIF/Adobe segments and tables; drop any EXIF, XMP or
+    # ICC segment it wrote itself (Qt writes the ICC profile of the QImage).
+    head, kept = [], []
+    pos = 2
+    while data[pos] == 0xFF and data[pos + 1] not in (0xD9, 0xDA):
+        code = data[pos + 1]
+        length = struct.unpack_from('>H', data, pos + 2)[0]
+        segment = data[pos:pos + 2 + length]
+        body = segment[4:]
+        replaced = ((code == 0xE1 and (body.startswith(b'Exif\x00\x00') or body.startswith(_JPEG_XMP)))
+                    or (code == 0xE2 and body.startswith(_JPEG_ICC)))
+        if not replaced:
+            (head if code == 0xE0 else kept).append(segment)
+        pos += 2 + length
+    return b''.join([data[:2], *head, *segments, *kept, data[pos:]])
+
+
+def _png_chunk(chunk_type, body):
+    return struct.pack('>I4s', len(body), chunk_type) + body + struct.pack('>I', zlib.crc32(chunk_type + body))
+
+
+def _embed_png(data, metadata):
+    chunks = []
+    dropped = set()
+    if metadata.icc:
+        chunks.append(_png_chunk(b'iCCP', b'ICC Profile\x00\x00' + zlib.compress(metadata.icc)))
+        dropped |= {b'iCCP', b'sRGB'}  # a PNG has one or the other
+    if metadata.exif:
+        chunks.append(_png_chunk(b'eXIf', metadata.exif))
+        dropped.add(b'eXIf')
+    if metadata.xmp:
+        chunks.append(_png_chunk(b'iTXt', _PNG_XMP_KEYWORD + b'\x00\x00\x00\x00\x00' + metadata.xmp))
+
+    ihdr_end = 8 + 12 + struct.unpack_from('>I', data, 8)[0]
+    kept = []
+    pos = ihdr_end
+    while True:
+        length, chunk_type = struct.unpack_from('>I4s', data, pos)
+        if chunk_type in (b'IDAT', b'IEND'):
+            break
+        chunk = data[pos:pos + 12 + length]
+        xmp = chunk_type == b'iTXt' and metadata.xmp and chunk[8:].startswith(_PNG_XMP_KEYWORD + b'\x00')
+        if chunk_type not in dropped and not xmp:
+            kept.append(chunk)
+        pos += 12 + length
+    # iCCP has to come before PLTE, so the new chunks go right after IHDR.
+    return b''.join([data[:ihdr_end], *chunks, *kept, data[pos:]])
+
+
+def _webp_canvas(chunk_type, body):
+    """``(width, height, has_alpha)`` of a simple-format WebP's VP8 or VP8L bitstream."""
+    if chunk_type == b'VP8L':
+        bits = struct.unpack_from('<I', body, 1)[0]
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1, bool(bits >> 28 & 1)
+    width, height = struct.unpack_from('<HH', body, 6)
+    return width & 0x3FFF, height & 0x3FFF, False
+
+
+def _embed_webp(data, metadata):
+    chunks = []
+    pos = 12
+    while pos + 8 <= len(data):
+        chunk_type, length = struct.unpack_from('<4sI', data, pos)
+        chunks.append((chunk_type, data[pos + 8:pos + 8 + length]))
+        pos += 8 + length + (length & 1)
+
+    flags = ((_WEBP_ICC if metadata.icc else 0) | (_WEBP_EXIF if metadata.exif else 0)
+             | (_WEBP_XMP if metadata.xmp else 0))
+    if chunks[0][0] == b'VP8X':
+        header = bytearray(chunks.pop(0)[1])
+        header[0] |= flags
+    else:  # simple format: metadata needs the extended VP8X header
+        width, height, alpha = _webp_canvas(*chunks[0])
+        header = bytearray(10)
+        header[0] = flags | (0x10 if alpha else 0)
+        header[4:7] = (width - 1).to_bytes(3, 'little')
+        header[7:10] = (height - 1).to_bytes(3, 'little')
+
+    replaced = {b'ICCP' if metadata.icc else None, b'EXIF' if metadata.exif else None,
+                b'XMP ' if metadata.xmp else None}
+    chunks = [chunk for chunk in chunks if chunk[0] not in replaced]
+    # Chunk order: VP8X, ICCP, image data, EXIF, XMP.
+    leading = [(b'VP8X', bytes(header))] + ([(b'ICCP', metadata.icc)] if metadata.icc else [])
+    trailing = [(chunk_type, block) for chunk_type, block in ((b'EXIF', metadata.exif), (b'XMP ', metadata.xmp))
+                if block]
+    chunks = leading + chunks + trailing
+    body = b''.join(struct.pack('<4sI', chunk_type, len(chunk)) + chunk + b'\x00' * (len(chunk) & 1)
+                    for chunk_type, chunk in chunks)
+    return b'RIFF' + struct.pack('<I', len(body) + 4) + b'WEBP' + body
+
+
+_EMBEDDERS = {'jpeg': _embed_jpeg, 'png': _embed_png, 'webp': _embed_webp}
+
+
+def embed_metadata(data, fmt, metadata):
+    """Returns the encoded ``fmt`` file ``data`` with ``metadata`` spliced in.
+
+    Formats other than :data:`EMBED_FORMATS`, and empty metadata, leave
+    ``data`` as it is.
+    """
+    if not metadata or fmt not in _EMBEDDERS:
+        return data
+    return _EMBEDDERS[fmt](bytes(data), metadata)
@@ -0,0 +1,93 @@
+"""Bounded process pool used by the batch front ends."""
+import bisect
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+
+class _BudgetQueue:
+    """Jobs ordered largest-first, handed out only while their total cost fits a budget."""
+
+    def __init__(self, jobs, cost, budget):
+        # Ascending by cost, so the largest job is taken from the end in O(1). Equal-cost
+        # jobs are reversed first, so they still come out in input order.
+        items = [(cost(job) or 0, job) for job in jobs]
+        self._jobs = sorted(reversed(items), key=lambda item: item[0])
+        self._costs = [item[0] for item in self._jobs]  # for bisect
+        self.budget = budget
+        self.in_use = 0
+
+    def __bool__(self):
+        return bool(self._jobs)
+
+    def take(self, idle):
+        """Returns ``(cost, job)`` for the largest job that still fits, or None.
+
+        When the pool is ``idle`` the largest job is admitted even if it alone
+        exceeds the budget, so nothing waits forever.
+        """
+        if not self._jobs:
+            return None
+        index = len(self._jobs) - 1 if idle else bisect.bisect_right(self._costs, self.budget - self.in_use) - 1
+        if index < 0:
+            return None
+        del self._costs[index]
+        item = self._jobs.pop(index)
+        self.in_use += item[0]
+        return item
+
+    def release(self, cost):
+        self.in_use -= cost
+
+
+def run_jobs(jobs, worker, workers=None, max_in_flight=None, cost=None, memory_budget=None):
+    """Runs ``worker(*job)`` in a process pool and yields ``(job, result, error)`` as jobs finish.
+
+    At most ``max_in_flight`` jobs are submitted at a time, so ``jobs`` can be a
+    lazy iterator over a very large input set.
+
+    With ``memory_budget``, ``cost(job)`` estimates each job's peak memory in
+    bytes. The jobs are then read up front and started largest-first, so big
+    images do not end up as the tail of the run, and a job only starts while
+    the costs of the running jobs plus its own stay within the budget; smaller
+    jobs fill the room a waiting large one cannot use.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max(max_in_flight or workers * 2, 1)
+    if memory_budget and cost is not None:
+        queue = _BudgetQueue(jobs, cost, memory_budget)
+        # Queued jobs would count against the budget without running, so only
+        # as many are submitted as there are workers.
+        max_in_flight = min(max_in_flight, workers)
+    else:
+        queue = None
+        jobs = iter(jobs)
+    pending = {}
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < max_in_flight:
+                if queue is not None:
+                    item = queue.take(idle=not pending)
+                    if item is None:
+                        exhausted = not queue
+                        break
+                    job_cost, job = item
+                else:
+                    job_cost, job = 0, next(jobs, None)
+                    if job is None:
+                        exhausted = True
+                        break
+                pending[executor.submit(worker, *job)] = job, job_cost
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                job, job_cost = pending.pop(future)
+                if queue is not None:
+                    queue.release(job_cost)
+                try:
+                    yield job, future.result(), None
+                except Exception as e:
+                    yield job, None, e
@@ -0,0 +1,188 @@
+"""Pre-rendered stamps for the OpenCV watermark.
+
+The text is rasterized once into a coverage mask, and opacity and rotation
+are baked in. Logos are decoded once, premultiplied by their own alpha and
+scaled once per target width. Stamps are cached by their parameters. Drawing
+a stamp is a NumPy alpha blend over the stamp's bounding box only, so the
+per-image cost depends on the watermark's size, not on the photo's. The tiled
+layout blends a whole row of copies per band instead of drawing each copy.
+"""
+import functools
+import os
+
+import cv2
+import numpy as np
+
+_LUMA = np.array([0.114, 0.587, 0.299], dtype=np.float32)  # B, G, R weights, for grayscale images
+
+
+class Stamp:
+    """A rasterized watermark: per-pixel alpha plus the color premultiplied by it."""
+
+    def __init__(self, alpha, premultiplied, offset):
+        self.alpha = alpha                  # float32 (h, w, 1), opacity already applied
+        self.premultiplied = premultiplied  # float32 (h, w, 3), B,G,R from 0 to 255 times alpha
+        self.offset = offset                # position of the origin (text baseline) inside the stamp
+        for array in (self.alpha, self.premultiplied):
+            array.flags.writeable = False   # stamps are cached and shared
+
+    @property
+    def size(self):
+        return self.alpha.shape[1], self.alpha.shape[0]
+
+    def box(self, origin):
+        """``(x0, y0, x1, y1)`` the stamp covers when its origin is at ``origin``."""
+        x0, y0 = origin[0] - self.offset[0], origin[1] - self.offset[1]
+        return x0, y0, x0 + self.size[0], y0 + self.size[1]
+
+
+def _rotated(image, rotation):
+    """``image`` turned ``rotation`` degrees clockwise about its centre, on a canvas that fits it."""
+    height, width = image.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), -rotation, 1.0)
+    cos, sin = abs(matrix[0, 0]), abs(matrix[0, 1])
+    new_width = int(np.ceil(width * cos + height * sin))
+    new_height = int(np.ceil(width * sin + height * cos))
+    matrix[0, 2] += (new_width - width) / 2
+    matrix[1, 2] += (new_height - height) / 2
+    return cv2.warpAffine(image, matrix, (new_width, new_height), flags=cv2.INTER_LINEAR)
+
+
+@functools.lru_cache(maxsize=256)
+def text_stamp(text, font_scale, color, opacity=1.0, rotation=0, font=cv2.FONT_HERSHEY_SIMPLEX, thickness=2):
+    """Renders ``text`` like ``cv2.putText`` and returns a cached :class:`Stamp`.
+
+    ``color`` is a B,G,R tuple, ``opacity`` runs from 0 to 1 and ``rotation`` is
+    in degrees clockwise about the centre of the text box, as in the desktop app.
+    """
+    (text_w, text_h), baseline = cv2.getTextSize(text, font, font_scale, thickness)
+    pad = thickness + 1
+    width, height = text_w + 2 * pad, text_h + baseline + 2 * pad
+    origin = (pad, pad + text_h)
+
+    mask = np.zeros((height, width), dtype=np.uint8)
+    cv2.putText(mask, text, origin, font, font_scale, 255, thickness, cv2.LINE_AA)
+
+    offset = origin
+    if rotation % 360:
+        mask = _rotated(mask, rotation)
+        # The text origin keeps its place relative to the centre of rotation.
+        offset = (round(origin[0] - width / 2 + mask.shape[1] / 2), round(origin[1] - height / 2 + mask.shape[0] / 2))
+
+    alpha = mask.astype(np.float32)[..., None] * (opacity / 255.0)
+    return Stamp(alpha, alpha * np.asarray(color, dtype=np.float32), offset)
+
+
+@functools.lru_cache(maxsize=8)
+def _load_logo(path, mtime_ns):
+    """The logo as float32 (h, w, 4): B,G,R premultiplied by alpha (0-255), then alpha (0-1)."""
+    image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        raise ValueError(f"could not read logo {path}")
+    image = image.astype(np.float32) * (255.0 / np.iinfo(image.dtype).max)
+    if image.ndim == 2:
+        image = image[..., None]
+    if image.shape[2] in (1, 3):
+        image = np.concatenate((np.broadcast_to(image, image.shape[:2] + (3,)),
+                                np.full(image.shape[:2] + (1,), 255.0, dtype=np.float32)), axis=2)
+    alpha = image[..., 3:4] / 255.0
+    return np.concatenate((image[..., :3] * alpha, alpha), axis=2)
+
+
+@functools.lru_cache(maxsize=64)
+def _logo_stamp(path, mtime_ns, width, opacity, rotation):
+    logo = _load_logo(path, mtime_ns)
+    height = max(1, round(logo.shape[0] * width / logo.shape[1]))
+    # Scaling premultiplied pixels keeps transparent edges from bleeding dark fringes.
+    interpolation = cv2.INTER_AREA if width < logo.shape[1] else cv2.INTER_LINEAR
+    scaled = cv2.resize(logo, (width, height), interpolation=interpolation)
+    if rotation % 360:
+        scaled = _rotated(scaled, rotation)
+    scaled *= opacity
+    return Stamp(np.ascontiguousarray(scaled[..., 3:]), np.ascontiguousarray(scaled[..., :3]), (0, 0))
+
+
+def logo_stamp(path, width, opacity=1.0, rotation=0):
+    """Returns the image at ``path`` as a :class:`Stamp` ``width`` pixels wide.
+
+    The origin of a logo stamp is its top-left corner. The decoded logo and
+    every scaled variant are cached (keyed on the file's modification time
+    too), so a batch with a few distinct image sizes resizes the logo once
+    per size.
+    """
+    return _logo_stamp(path, os.stat(path).st_mtime_ns, width, opacity, rotation)
+
+
+def _blend(pixels, alpha, premultiplied):
+    """Returns ``pixels`` (..., C) with the stamp's ``alpha`` (..., 1) and ``premultiplied`` color over them."""
+    limit = np.iinfo(pixels.dtype).max
+    scale = limit / 255.0
+    if pixels.ndim == alpha.ndim - 1:  # grayscale
+        blended = pixels * (1.0 - alpha[..., 0]) + (premultiplied @ _LUMA) * scale
+    elif pixels.shape[-1] == 3:
+        blended = pixels * (1.0 - alpha) + premultiplied * scale
+    else:
+        # Porter-Duff "over" with straight alpha, so text on transparent areas keeps its color.
+        below = pixels[..., 3:4] * ((1.0 - alpha) / limit)
+        out_alpha = alpha + below
+        color = (premultiplied * scale + pixels[..., :3] * below) / np.maximum(out_alpha, 1e-6)
+        blended = np.concatenate((color, out_alpha * limit), axis=-1)
+    return np.clip(blended + 0.5, 0, limit).astype(pixels.dtype)
+
+
+def composite(img, stamp, origin):
+    """Alpha-blends ``stamp`` into ``img`` in place with the stamp's origin at ``origin``.
+
+    ``img`` may be grayscale, BGR or BGRA with 8 or 16 bits per channel. Only
+    the part of the stamp inside the image is touched.
+    """
+    height, width = img.shape[:2]
+    x0, y0, x1, y1 = stamp.box(origin)
+    cx0, cy0, cx1, cy1 = max(x0, 0), max(y0, 0), min(x1, width), min(y1, height)
+    if cx1 <= cx0 or cy1 <= cy0:
+        return img
+
+    crop = (slice(cy0 - y0, cy1 - y0), slice(cx0 - x0, cx1 - x0))
+    roi = img[cy0:cy1, cx0:cx1]
+    roi[...] = _blend(roi, stamp.alpha[crop], stamp.premultiplied[crop])
+    return img
+
+
+@functools.lru_cache(maxsize=16)
+def _coverage(stamp):
+    """``(ys, xs)`` of the pixels ``stamp`` covers, in the stamp's own coordinates."""
+    ys, xs = np.nonzero(stamp.alpha[..., 0])
+    return ys, xs
+
+
+def composite_tiled(img, stamp, gap):
+    """Repeats ``stamp`` over all of ``img`` in place, ``gap`` pixels apart.
+
+    Every other row of copies is shifted by half a copy, so with a rotated
+    stamp the copies line up diagonally. Only the stamp's own covered pixels
+    are cached; each row of copies offsets them arithmetically and costs one
+    blend of the covered pixels, whatever the number of copies. Only the
+    copies cut off by an edge need a bounds mask.
+    """
+    height, width = img.shape[:2]
+    stamp_width, stamp_height = stamp.size
+    cell_width, cell_height = stamp_width + gap, stamp_height + gap
+    ys, xs = _coverage(stamp)
+    alpha, premultiplied = stamp.alpha[ys, xs], stamp.premultiplied[ys, xs]
+    for index, y in enumerate(range(gap // 2, height, cell_height)):
+        lefts = np.arange(gap // 2 - (index % 2) * (cell_width // 2), width, cell_width)
+        fits = (lefts >= 0) & (lefts + stamp_width <= width) & (y + stamp_height <= height)
+        for copies, clipped in ((lefts[fits], False), (lefts[~fits], True)):
+            if not len(copies):
+                continue
+            row_ys = np.tile(ys + y, len(copies))
+            row_xs = (copies[:, None] + xs).ravel()
+            if clipped:
+                inside = np.flatnonzero((row_xs >= 0) & (row_xs < width) & (row_ys < height))
+                pixel = inside % len(ys)
+                row_ys, row_xs = row_ys[inside], row_xs[inside]
+                row_alpha, row_premultiplied = alpha[pixel], premultiplied[pixel]
+            else:
+                row_alpha, row_premultiplied = np.tile(alpha, (len(copies), 1)), np.tile(premultiplied, (len(copies), 1))
+            img[row_ys, row_xs] = _blend(img[row_ys, row_xs], row_alpha, row_premultiplied)
+    return img
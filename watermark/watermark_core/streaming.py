@@ -0,0 +1,80 @@
+"""Memory-bounded watermarking of very large images.
+
+A 100 MP panorama takes 300-400 MB once decoded, and several of them in
+parallel exhaust memory. :func:`estimate_decoded_bytes` predicts that cost
+from the file header alone. :func:`open_region_source` gives access to the
+formats that can be watermarked without decoding the full frame:
+
+    - JPEG, through jpegtran's lossless crop and drop (see jpeg_region),
+    - uncompressed strip TIFF, by rewriting only the rows under the watermark
+      (see tiff_region).
+
+For these, peak memory is bounded by the watermark's area, or by the
+image's width for TIFF. Everything else has to be decoded in full.
+"""
+import struct
+
+from .jpeg_region import read_jpeg_frame, rewrite_jpeg_region
+from .tiff_region import read_tiff_layout, read_tiff_size, rewrite_tiff_region
+
+# Decoded pixels are counted as 4 bytes: OpenCV's BGR frame plus its encode
+# buffer, or Qt's 32-bit QImage.
+_BYTES_PER_PIXEL = 4
+
+
+def image_size(path):
+    """Returns ``(width, height)`` from the header of a JPEG, PNG, BMP or TIFF, or None."""
+    with open(path, 'rb') as f:
+        head = f.read(26)
+        if head[:2] == b'\xff\xd8':
+            frame = read_jpeg_frame(f)
+            return (frame.width, frame.height) if frame else None
+    if head[:8] == b'\x89PNG\r\n\x1a\n' and head[12:16] == b'IHDR':
+        return struct.unpack('>II', head[16:24])
+    if head[:2] == b'BM' and len(head) == 26:
+        width, height = struct.unpack('<ii', head[18:26])  # negative height: top-down rows
+        return abs(width), abs(height)
+    if head[:4] in (b'II*\x00', b'MM\x00*'):
+        return read_tiff_size(path)
+    return None
+
+
+def estimate_decoded_bytes(path):
+    """Approximate memory needed to decode and re-encode ``path`` in full, or None if unknown."""
+    size = image_size(path)
+    return size[0] * size[1] * _BYTES_PER_PIXEL if size else None
+
+
+class RegionSource:
+    """An image that can be watermarked by rewriting only the region under the watermark."""
+
+    def __init__(self, path, width, height, bits, rewrite):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.bits = bits          # per sample of the patches handed to ``draw``
+        self._rewrite = rewrite
+
+    def rewrite(self, dst, box, draw):
+        """Writes ``dst`` with ``draw(patch, x0, y0)`` applied to the area ``box``.
+
+        Returns False when the region path turns out not to apply and nothing
+        useful was written.
+        """
+        return self._rewrite(self.path, dst, box, draw)
+
+
+def open_region_source(path):
+    """Returns a :class:`RegionSource` for ``path``, or None if it has to be decoded in full."""
+    frame = read_jpeg_frame(path)
+    if frame is not None:
+        return RegionSource(path, frame.width, frame.height, 8,
+                            lambda src, dst, box, draw: rewrite_jpeg_region(src, dst, frame, box, draw))
+    try:
+        layout = read_tiff_layout(path)
+    except (OSError, ValueError):
+        layout = None
+    if layout is not None:
+        return RegionSource(path, layout.width, layout.height, layout.bits,
+                            lambda src, dst, box, draw: rewrite_tiff_region(src, dst, layout, box, draw))
+    return None
@@ -0,0 +1,110 @@
+"""Persistent on-disk thumbnail cache.
+
+Entries are keyed by the source's absolute path, modification time and size
+plus the thumbnail box, so an edited or replaced file simply misses and gets
+a new entry. The cache is capped in bytes and evicts least recently used
+entries; recency survives restarts because hits touch the entry's mtime.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from .loader import load_thumbnail
+
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+_SUFFIX = '.png'
+
+
+class ThumbnailCache:
+    """Thread-safe LRU cache of thumbnails stored as PNG files in ``cache_dir``."""
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> file size, least recently used first
+        self._total_bytes = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        existing = []
+        for entry in os.scandir(cache_dir):
+            if entry.is_file() and entry.name.endswith(_SUFFIX):
+                st = entry.stat()
+                existing.append((st.st_mtime_ns, entry.name[:-len(_SUFFIX)], st.st_size))
+        for _, key, size in sorted(existing):
+            self._entries[key] = size
+            self._total_bytes += size
+        with self._lock:
+            self._evict()
+
+    @staticmethod
+    def _key(path, st, max_width, max_height):
+        ident = f"{os.path.abspath(path)}\0{st.st_mtime_ns}\0{st.st_size}\0{max_width}x{max_height}"
+        return hashlib.sha1(ident.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + _SUFFIX)
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._entry_path(key))
+            except OSError:
+                pass
+
+    def get(self, path, max_width, max_height):
+        """Returns the cached thumbnail for the current version of ``path``, or None."""
+        key = self._key(path, os.stat(path), max_width, max_height)
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+        entry_path = self._entry_path(key)
+        try:
+            img = cv2.imdecode(np.fromfile(entry_path, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+            os.utime(entry_path)
+        except OSError:
+            img = None
+        with self._lock:
+            if img is None:
+                self.misses += 1
+                self._total_bytes -= self._entries.pop(key, 0)
+            else:
+                self.hits += 1
+        return img
+
+    def put(self, path, max_width, max_height, img):
+        """Stores ``img`` as the thumbnail for the current version of ``path``."""
+        key = self._key(path, os.stat(path), max_width, max_height)
+        ok, encoded = cv2.imencode(_SUFFIX, img)
+        if not ok:
+            return
+        entry_path = self._entry_path(key)
+        tmp_path = f"{entry_path}.{threading.get_ident()}.tmp"
+        try:
+            encoded.tofile(tmp_path)
+            os.replace(tmp_path, entry_path)
+        except OSError:
+            return
+        with self._lock:
+            self._total_bytes += encoded.size - self._entries.pop(key, 0)
+            self._entries[key] = encoded.size
+            self._evict()
+
+    def load(self, path, max_width, max_height):
+        """Returns the thumbnail of ``path`` from the cache, decoding and caching it on a miss."""
+        img = self.get(path, max_width, max_height)
+        if img is None:
+            img = load_thumbnail(path, max_width, max_height)
+            if img is not None:
+                self.put(path, max_width, max_height, img)
+        return img
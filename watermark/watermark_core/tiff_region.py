@@ -0,0 +1,183 @@
+"""Strip-wise TIFF watermarking.
+
+Uncompressed, strip-organized TIFFs (the usual layout of scanner output) are
+watermarked without decoding the image: the output starts as a byte copy of
+the source and then only the rows under the watermark are read, drawn on
+and written back in place, a band of at most ``BAND_ROWS`` rows at a time.
+Memory use depends on the image width, not on its size, and every other
+byte, metadata included, stays as it was.
+
+Compressed, tiled or planar TIFFs make :func:`read_tiff_layout` return None,
+and callers fall back to a full decode.
+"""
+import os
+import shutil
+import struct
+
+import numpy as np
+
+TAG_IMAGE_WIDTH = 256
+TAG_IMAGE_LENGTH = 257
+TAG_BITS_PER_SAMPLE = 258
+TAG_COMPRESSION = 259
+TAG_PHOTOMETRIC = 262
+TAG_STRIP_OFFSETS = 273
+TAG_ORIENTATION = 274
+TAG_SAMPLES_PER_PIXEL = 277
+TAG_ROWS_PER_STRIP = 278
+TAG_STRIP_BYTE_COUNTS = 279
+TAG_PLANAR_CONFIG = 284
+TAG_TILE_WIDTH = 322
+TAG_SAMPLE_FORMAT = 339
+
+_TYPE_SIZES = {1: 1, 3: 2, 4: 4}  # BYTE, SHORT, LONG
+_TYPE_CODES = {1: 'B', 3: 'H', 4: 'I'}
+_MAX_IFD_ENTRIES = 1024
+_PHOTOMETRIC_MIN_IS_BLACK = 1
+_PHOTOMETRIC_RGB = 2
+BAND_ROWS = 256
+
+
+class TiffLayout:
+    """Where the pixel rows of a plain strip TIFF live in the file."""
+
+    def __init__(self, width, height, samples, bits, endian, rows_per_strip, strip_offsets):
+        self.width = width
+        self.height = height
+        self.samples = samples                # 1 (gray), 3 (RGB) or 4 (RGBA)
+        self.bits = bits                      # 8 or 16 per sample
+        self.endian = endian
+        self.rows_per_strip = rows_per_strip
+        self.strip_offsets = strip_offsets
+
+    @property
+    def dtype(self):
+        return np.dtype(self.endian + ('u1' if self.bits == 8 else 'u2'))
+
+    @property
+    def row_bytes(self):
+        return self.width * self.samples * self.bits // 8
+
+
+def _read_ifd(f, endian, offset):
+    """Returns ``{tag: [values]}`` for the IFD at ``offset``."""
+    f.seek(offset)
+    count = struct.unpack(endian + 'H', f.read(2))[0]
+    if count > _MAX_IFD_ENTRIES:
+        return None
+    table = f.read(count * 12)
+    entries = {}
+    for i in range(0, len(table) - 11, 12):
+        tag, entry_type, value_count = struct.unpack_from(endian + 'HHI', table, i)
+        size = _TYPE_SIZES.get(entry_type)
+        if size is None:
+            continue
+        raw = table[i + 8:i + 12]
+        if size * value_count > 4:
+            f.seek(struct.unpack(endian + 'I', raw)[0])
+            raw = f.read(size * value_count)
+        entries[tag] = list(struct.unpack(f"{endian}{value_count}{_TYPE_CODES[entry_type]}",
+                                          raw[:size * value_count]))
+    return entries
+
+
+def _read_first_ifd(path):
+    """Returns ``(endian, {tag: [values]}, file_size)`` for the first IFD of a TIFF, or None."""
+    with open(path, 'rb') as f:
+        header = f.read(8)
+        if header[:4] not in (b'II*\x00', b'MM\x00*'):
+            return None
+        endian = '<' if header[:2] == b'II' else '>'
+        try:
+            ifd = _read_ifd(f, endian, struct.unpack(endian + 'I', header[4:])[0])
+        except struct.error:
+            return None
+        return (endian, ifd, os.fstat(f.fileno()).st_size) if ifd is not None else None
+
+
+def read_tiff_size(path):
+    """Returns ``(width, height)`` of any TIFF, compressed or not, or None."""
+    parsed = _read_first_ifd(path)
+    if parsed is None:
+        return None
+    ifd = parsed[1]
+    if TAG_IMAGE_WIDTH not in ifd or TAG_IMAGE_LENGTH not in ifd:
+        return None
+    return ifd[TAG_IMAGE_WIDTH][0], ifd[TAG_IMAGE_LENGTH][0]
+
+
+def read_tiff_layout(path):
+    """Parses the first IFD of a TIFF; returns a :class:`TiffLayout` or None if unsupported."""
+    parsed = _read_first_ifd(path)
+    if parsed is None:
+        return None
+    endian, ifd, file_size = parsed
+
+    def value(tag, default=None):
+        return ifd.get(tag, [default])[0]
+
+    width, height = value(TAG_IMAGE_WIDTH), value(TAG_IMAGE_LENGTH)
+    samples = value(TAG_SAMPLES_PER_PIXEL, 1)
+    bits = set(ifd.get(TAG_BITS_PER_SAMPLE, [1]))
+    photometric = value(TAG_PHOTOMETRIC)
+    if (not width or not height or value(TAG_COMPRESSION, 1) != 1 or value(TAG_PLANAR_CONFIG, 1) != 1
+            or TAG_TILE_WIDTH in ifd or value(TAG_SAMPLE_FORMAT, 1) != 1 or value(TAG_ORIENTATION, 1) != 1
+            or len(bits) != 1 or bits - {8, 16}):
+        return None
+    if not ((photometric == _PHOTOMETRIC_MIN_IS_BLACK and samples == 1)
+            or (photometric == _PHOTOMETRIC_RGB and samples in (3, 4))):
+        return None
+
+    rows_per_strip = min(value(TAG_ROWS_PER_STRIP, height), height)
+    offsets = ifd.get(TAG_STRIP_OFFSETS, [])
+    counts = ifd.get(TAG_STRIP_BYTE_COUNTS, [])
+    layout = TiffLayout(width, height, samples, bits.pop(), endian, rows_per_strip, offsets)
+    strips = -(-height // rows_per_strip)
+    if len(offsets) != strips or len(counts) != strips:
+        return None
+    for index, (offset, count) in enumerate(zip(offsets, counts)):
+        rows = min(rows_per_strip, height - index * rows_per_strip)
+        if count < rows * layout.row_bytes or offset + rows * layout.row_bytes > file_size:
+            return None
+    return layout
+
+
+def rewrite_tiff_region(src, dst, layout, box, draw):
+    """Copies ``src`` to ``dst`` and redraws only the rows that intersect ``box``.
+
+    ``draw(patch, x0, y0)`` paints onto a gray, BGR or BGRA patch (8 or 16
+    bits, like ``cv2.IMREAD_UNCHANGED``) whose top-left corner sits at
+    ``(x0, y0)`` in the full image. Returns False if ``box`` misses the image.
+    """
+    x0, y0 = max(0, box[0]), max(0, box[1])
+    x1, y1 = min(layout.width, box[2]), min(layout.height, box[3])
+    if x1 <= x0 or y1 <= y0:
+        return False
+
+    os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+    shutil.copyfile(src, dst)
+    native = layout.dtype.newbyteorder('=')
+    order = [2, 1, 0, 3][:layout.samples] if layout.samples >= 3 else [0]  # RGB(A) <-> BGR(A)
+
+    with open(dst, 'r+b') as f:
+        band_y0 = y0
+        while band_y0 < y1:
+            # Rows are contiguous within a strip, so a band never crosses a strip boundary.
+            strip, strip_row = divmod(band_y0, layout.rows_per_strip)
+            band_y1 = min(y1, band_y0 + BAND_ROWS, band_y0 - strip_row + layout.rows_per_strip)
+            rows = band_y1 - band_y0
+            offset = layout.strip_offsets[strip] + strip_row * layout.row_bytes
+
+            f.seek(offset)
+            pixels = np.frombuffer(bytearray(f.read(rows * layout.row_bytes)), dtype=layout.dtype)
+            pixels = pixels.reshape(rows, layout.width, layout.samples)
+            patch = pixels[:, x0:x1, order].astype(native)
+            if layout.samples == 1:
+                patch = patch[..., 0]
+            draw(patch, x0, band_y0)
+            pixels[:, x0:x1, order] = patch.reshape(rows, x1 - x0, layout.samples)
+
+            f.seek(offset)
+            f.write(pixels.tobytes())
+            band_y0 = band_y1
+    return True